@@ -1,7 +1,8 @@
 from django.contrib import admin
-from .models import Battle, Vote
+from .models import Battle, BattleVerdict, Vote
 
 # Register your models here.
 
 admin.site.register(Battle)
-admin.site.register(Vote)
\ No newline at end of file
+admin.site.register(Vote)
+admin.site.register(BattleVerdict)
\ No newline at end of file
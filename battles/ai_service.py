@@ -1,9 +1,7 @@
 import json
-import os
 import logging
-from django.conf import settings
-from django.db import models
-from groq import Groq
+
+from thoughty.llm import CircuitOpen, get_gateway
 
 logger = logging.getLogger(__name__)
 
@@ -11,11 +9,11 @@ class BattleAIJudge:
     """AI service to provide intelligent verdicts on battles between pods"""
 
     def __init__(self):
-        # Get API key from settings
-        self.api_key = getattr(settings, 'GROQ_API_KEY', os.environ.get('GROQ_API_KEY'))
+        # Shared, pooled client; see thoughty.llm
+        self.llm = get_gateway()
+        self.api_key = self.llm.api_key
         if not self.api_key:
             logger.warning("GROQ API key not configured!")
-        self.client = Groq(api_key=self.api_key)
     
     def generate_verdict(self, battle):
         """
@@ -33,11 +31,8 @@ class BattleAIJudge:
         
         try:
             # Get vote counts
-            from .models import Vote
-            votes = Vote.objects.filter(battle=battle).values('choice').annotate(count=models.Count('id'))
-            vote_counts = {v['choice']: v['count'] for v in votes}
-            a_votes = vote_counts.get(battle.pod_a.id, 0)
-            b_votes = vote_counts.get(battle.pod_b.id, 0)
+            a_votes = battle.pod_a_votes
+            b_votes = battle.pod_b_votes
             
             # Prepare battle context
             battle_context = self._prepare_battle_context(battle, a_votes, b_votes)
@@ -45,7 +40,7 @@ class BattleAIJudge:
             # Get AI analysis
             system_prompt = self._get_system_prompt()
             
-            response = self.client.chat.completions.create(
+            content = self.llm.complete(
                 model="llama-3.3-70b-versatile",
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -53,11 +48,12 @@ class BattleAIJudge:
                 ],
                 max_tokens=800,
                 temperature=0.7,
-                response_format={"type": "json_object"}
+                response_format={"type": "json_object"},
+                cache=True,
             )
             
             # Parse AI response
-            ai_verdict = json.loads(response.choices[0].message.content)
+            ai_verdict = json.loads(content)
             
             # Determine winner based on AI analysis and votes
             winner_pod = self._determine_winner(battle, ai_verdict, a_votes, b_votes)
@@ -69,9 +65,13 @@ class BattleAIJudge:
                 "analysis": ai_verdict.get("analysis", ""),
                 "key_factors": ai_verdict.get("key_factors", []),
                 "vote_summary": f"Pod A: {a_votes} votes, Pod B: {b_votes} votes",
-                "ai_confidence": ai_verdict.get("confidence", "medium")
+                "ai_confidence": ai_verdict.get("confidence", "medium"),
+                "ai_powered": True
             }
             
+        except CircuitOpen:
+            logger.warning("LLM circuit open, skipping AI call")
+            return self._fallback_verdict(battle)
         except Exception as e:
             logger.error(f"Error generating AI verdict: {str(e)}")
             return self._fallback_verdict(battle)
@@ -181,13 +181,8 @@ Respond ONLY with JSON in this exact format:
     def _fallback_verdict(self, battle):
         """Fallback verdict when AI service is unavailable"""
         
-        from .models import Vote
-        from django.db import models
-        
-        votes = Vote.objects.filter(battle=battle).values('choice').annotate(count=models.Count('id'))
-        vote_counts = {v['choice']: v['count'] for v in votes}
-        a_votes = vote_counts.get(battle.pod_a.id, 0)
-        b_votes = vote_counts.get(battle.pod_b.id, 0)
+        a_votes = battle.pod_a_votes
+        b_votes = battle.pod_b_votes
         
         if a_votes > b_votes:
             winner = battle.pod_a
@@ -207,5 +202,6 @@ Respond ONLY with JSON in this exact format:
             "analysis": "Basic vote-based analysis",
             "key_factors": ["Community voting patterns"],
             "vote_summary": f"Pod A: {a_votes} votes, Pod B: {b_votes} votes",
-            "ai_confidence": "n/a"
+            "ai_confidence": "n/a",
+            "ai_powered": False
         }
\ No newline at end of file
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Now
+
+from battles.models import Battle, Vote
+
+
+def _vote_count(**filters):
+    """Correlated COUNT(*) of votes for the outer battle"""
+    votes = (
+        Vote.objects.filter(battle=OuterRef('pk'), **filters)
+        .order_by()
+        .values('battle')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    return Coalesce(Subquery(votes, output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized vote counters on battles from the Vote table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'battle_ids', nargs='*', type=int,
+            help='Only reconcile these battles (default: all battles)',
+        )
+
+    def handle(self, *args, **options):
+        battles = Battle.objects.all()
+        if options['battle_ids']:
+            battles = battles.filter(pk__in=options['battle_ids'])
+
+        updated = battles.update(
+            pod_a_votes=_vote_count(choice=OuterRef('pod_a')),
+            pod_b_votes=_vote_count(choice=OuterRef('pod_b')),
+            total_votes=_vote_count(),
+            timestamp=Now(), # Counts may have moved: clients must not keep revalidating old ones
+        )
+        self.stdout.write(self.style.SUCCESS(f"Reconciled vote counters for {updated} battles"))
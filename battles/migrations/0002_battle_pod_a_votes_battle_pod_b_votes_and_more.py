@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:23
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_vote_counters(apps, schema_editor):
+    Battle = apps.get_model('battles', 'Battle')
+    Vote = apps.get_model('battles', 'Vote')
+
+    def vote_count(**filters):
+        votes = (
+            Vote.objects.filter(battle=OuterRef('pk'), **filters)
+            .order_by()
+            .values('battle')
+            .annotate(count=Count('id'))
+            .values('count')
+        )
+        return Coalesce(Subquery(votes, output_field=IntegerField()), 0)
+
+    Battle.objects.update(
+        pod_a_votes=vote_count(choice=OuterRef('pod_a')),
+        pod_b_votes=vote_count(choice=OuterRef('pod_b')),
+        total_votes=vote_count(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battles', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='battle',
+            name='pod_a_votes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='battle',
+            name='pod_b_votes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='battle',
+            name='total_votes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_vote_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:30
+
+import rest_framework.utils.encoders
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battles', '0002_battle_pod_a_votes_battle_pod_b_votes_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='battle',
+            name='ai_verdict',
+            field=models.JSONField(blank=True, encoder=rest_framework.utils.encoders.JSONEncoder, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:31
+
+import django.db.models.deletion
+import rest_framework.utils.encoders
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battles', '0003_battle_ai_verdict'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BattleVerdict',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('total_votes', models.PositiveIntegerField(default=0)),
+                ('result', models.JSONField(blank=True, encoder=rest_framework.utils.encoders.JSONEncoder, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('battle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='verdicts', to='battles.battle')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['battle', 'status', '-created_at'], name='verdict_battle_status_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'running'])), fields=('battle',), name='one_active_verdict_per_battle')],
+            },
+        ),
+    ]
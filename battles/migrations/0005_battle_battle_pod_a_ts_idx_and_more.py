@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battles', '0004_battleverdict'),
+        ('pods', '0005_podstagehistory_pod_history_pod_ts_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='battle',
+            index=models.Index(fields=['pod_a', 'created_at', 'id'], name='battle_pod_a_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='battle',
+            index=models.Index(fields=['pod_b', 'created_at', 'id'], name='battle_pod_b_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['voted_by', 'voted_at', 'id'], name='vote_user_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_owners(apps, schema_editor):
+    Pod    = apps.get_model('pods', 'Pod')
+    Battle = apps.get_model('battles', 'Battle')
+    Battle.objects.update(
+        pod_a_user=Subquery(Pod.objects.filter(pk=OuterRef('pod_a')).values('user')[:1]),
+        pod_b_user=Subquery(Pod.objects.filter(pk=OuterRef('pod_b')).values('user')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battles', '0005_battle_battle_pod_a_ts_idx_and_more'),
+        ('pods', '0008_podstagehistory_user'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='battle',
+            name='pod_a_user',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='battle',
+            name='pod_b_user',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(copy_owners, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='battle',
+            name='pod_a_user',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='battle',
+            name='pod_b_user',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RemoveIndex(
+            model_name='battle',
+            name='battle_pod_a_ts_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='battle',
+            name='battle_pod_b_ts_idx',
+        ),
+        migrations.AddIndex(
+            model_name='battle',
+            index=models.Index(fields=['pod_a_user', 'created_at', 'id'], name='battle_pod_a_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='battle',
+            index=models.Index(fields=['pod_b_user', 'created_at', 'id'], name='battle_pod_b_user_ts_idx'),
+        ),
+    ]
@@ -1,6 +1,11 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Q, When
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
 
+from outbox.events import publish
 from pods.models import Pod
 
 # Create your models here.
@@ -12,15 +17,92 @@ class Battle(models.Model):
     created_at      = models.DateTimeField(auto_now_add=True)
     timestamp       = models.DateTimeField(auto_now=True)
     winner          = models.ForeignKey(Pod, related_name='won_battles', on_delete=models.SET_NULL, null=True, blank=True)
+    # Owners of the two pods, so a user's battles are read from an index of their own (pods.timeline)
+    pod_a_user      = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', on_delete=models.CASCADE, editable=False)
+    pod_b_user      = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', on_delete=models.CASCADE, editable=False)
     vote_threshold  = models.PositiveIntegerField(default=3)
     closes_at       = models.DateTimeField(null=True, blank=True)
 
+    # Denormalized tallies, kept in step with Vote inserts (see record_vote)
+    pod_a_votes     = models.PositiveIntegerField(default=0)
+    pod_b_votes     = models.PositiveIntegerField(default=0)
+    total_votes     = models.PositiveIntegerField(default=0)
+
+    # Final AI verdict, stored once the battle is closed and can no longer change
+    ai_verdict      = models.JSONField(null=True, blank=True, encoder=JSONEncoder)
+
+    class Meta:
+        indexes = [
+            # Battles of a user's pods newest first, one side each (pods.timeline)
+            models.Index(fields=['pod_a_user', 'created_at', 'id'], name='battle_pod_a_user_ts_idx'),
+            models.Index(fields=['pod_b_user', 'created_at', 'id'], name='battle_pod_b_user_ts_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # The event commits or rolls back with the battle (see outbox)
+        created = self._state.adding
+        if self.pod_a_user_id is None:
+            self.pod_a_user_id = self.pod_a.user_id
+        if self.pod_b_user_id is None:
+            self.pod_b_user_id = self.pod_b.user_id
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if created:
+                publish('battle.created', battle_id=self.pk, user_id=self.created_by_id)
+
+    @property
+    def is_closed(self):
+        return self.winner_id is not None or bool(self.closes_at and timezone.now() >= self.closes_at)
+
+    def record_vote(self, choice_id):
+        """
+        Count one vote for `choice_id` with a single conditional UPDATE.
+        Must run in the same transaction as the Vote insert. A choice that is
+        neither pod counts for nothing (see Vote.clean).
+        """
+        Battle.objects.filter(Q(pod_a_id=choice_id) | Q(pod_b_id=choice_id), pk=self.pk).update(
+            timestamp=timezone.now(),
+            pod_a_votes=Case(
+                When(pod_a_id=choice_id, then=F('pod_a_votes') + 1),
+                default=F('pod_a_votes'),
+                output_field=models.PositiveIntegerField(),
+            ),
+            pod_b_votes=Case(
+                When(pod_b_id=choice_id, then=F('pod_b_votes') + 1),
+                default=F('pod_b_votes'),
+                output_field=models.PositiveIntegerField(),
+            ),
+            total_votes=F('total_votes') + 1,
+        )
+        self.refresh_from_db(fields=['pod_a_votes', 'pod_b_votes', 'total_votes', 'timestamp'])
+
+    def vote_counts(self):
+        """Map of pod id -> votes received, read from the counters"""
+        return {self.pod_a_id: self.pod_a_votes, self.pod_b_id: self.pod_b_votes}
+
+    def close(self, winner):
+        """
+        Record `winner` and announce the result, unless the battle already
+        has one. True if this call closed it; a battle nobody voted on
+        (no `winner`) is left without one.
+        """
+        if winner is None:
+            return False
+        with transaction.atomic():
+            # Locked: two votes crossing the threshold together must close it once
+            current = Battle.objects.select_for_update().filter(pk=self.pk).values_list('winner_id', flat=True).get()
+            if current is not None:
+                self.winner_id = current
+                return False
+            self.winner = winner
+            self.save(update_fields=['winner', 'timestamp'])
+            publish('battle.closed', battle_id=self.pk, winner_id=winner.pk)
+        return True
+
     def determine_winner(self):
-        votes = self.votes.values('choice').annotate(count=models.Count('id'))
-        if not votes:
+        if not self.total_votes:
             return None
-        top = max(votes, key=lambda x: x['count'])
-        return Pod.objects.get(pk=top['choice'])
+        return self.pod_a if self.pod_a_votes >= self.pod_b_votes else self.pod_b
 
 class Vote(models.Model):
     battle   = models.ForeignKey(Battle, related_name='votes', on_delete=models.CASCADE)
@@ -29,4 +111,57 @@ class Vote(models.Model):
     voted_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ('battle', 'voted_by')
\ No newline at end of file
+        unique_together = ('battle', 'voted_by')
+        indexes = [
+            # A user's votes newest first (pods.timeline)
+            models.Index(fields=['voted_by', 'voted_at', 'id'], name='vote_user_ts_idx'),
+        ]
+
+    def clean(self):
+        if self.battle_id and self.choice_id and self.choice_id not in (self.battle.pod_a_id, self.battle.pod_b_id):
+            raise ValidationError({'choice': "Vote for one of the battle's two pods."})
+
+    def save(self, *args, **kwargs):
+        # post_save bumps the battle counters; keep it and the event in the insert's transaction
+        created = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if created:
+                publish('battle.voted', battle_id=self.battle_id, vote_id=self.pk, user_id=self.voted_by_id)
+
+
+class BattleVerdict(models.Model):
+    """A background AI verdict job for a battle; see battles.verdicts"""
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        RUNNING = 'running', 'Running'
+        DONE    = 'done', 'Done'
+        FAILED  = 'failed', 'Failed'
+
+    ACTIVE = [Status.PENDING, Status.RUNNING]
+
+    battle      = models.ForeignKey(Battle, related_name='verdicts', on_delete=models.CASCADE)
+    status      = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    total_votes = models.PositiveIntegerField(default=0) # Battle.total_votes when requested
+    result      = models.JSONField(null=True, blank=True, encoder=JSONEncoder)
+    error       = models.TextField(blank=True)
+    created_at  = models.DateTimeField(auto_now_add=True)
+    started_at  = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Concurrent requests for one battle share a single in-flight job
+            models.UniqueConstraint(
+                fields=['battle'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='one_active_verdict_per_battle',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['battle', 'status', '-created_at'], name='verdict_battle_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Verdict {self.pk} for battle {self.battle_id} ({self.status})"
@@ -1,13 +1,20 @@
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 from django.utils import timezone
 
-from .models import Battle, Vote
+from thoughty.sparse import SparseFieldsMixin
+from .models import Battle, BattleVerdict, Vote
 
-class BattleSerializer(serializers.ModelSerializer):
+class BattleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """The stored AI verdict is sizeable and only sent with ?expand=ai_verdict"""
     class Meta:
         model  = Battle
-        fields = '__all__'
-        read_only_fields = ['created_by', 'winner']
+        fields = [
+            'id', 'pod_a', 'pod_b', 'created_by', 'created_at', 'timestamp', 'winner',
+            'vote_threshold', 'closes_at', 'pod_a_votes', 'pod_b_votes', 'total_votes', 'ai_verdict',
+        ]
+        read_only_fields = ['created_by', 'winner', 'pod_a_votes', 'pod_b_votes', 'total_votes', 'ai_verdict']
+        expandable_fields = ['ai_verdict']
 
     def validate(self, data):
         if data['pod_a'] == data['pod_b']:
@@ -31,6 +38,9 @@ class VoteSerializer(serializers.ModelSerializer):
 
         if battle.closes_at and battle.closes_at < timezone.now():
             raise serializers.ValidationError("Voting has ended for this battle.")
+
+        if data['choice'].pk not in (battle.pod_a_id, battle.pod_b_id):
+            raise serializers.ValidationError({'choice': "Vote for one of the battle's two pods."})
         
         if Vote.objects.filter(battle=battle, voted_by=request_user).exists():
             raise serializers.ValidationError("You have already voted in this battle.")
@@ -39,4 +49,20 @@ class VoteSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         validated_data['voted_by'] = self.context['request'].user
-        return super().create(validated_data)
\ No newline at end of file
+        return super().create(validated_data)
+
+class BattleVerdictSerializer(serializers.ModelSerializer):
+    status_url = serializers.SerializerMethodField()
+    result_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model  = BattleVerdict
+        fields = ['id', 'battle', 'status', 'error', 'created_at', 'started_at', 'finished_at',
+                  'status_url', 'result_url']
+        read_only_fields = fields
+
+    def get_status_url(self, obj):
+        return reverse('verdict-detail', args=[obj.pk], request=self.context.get('request'))
+
+    def get_result_url(self, obj):
+        return reverse('verdict-result', args=[obj.pk], request=self.context.get('request'))
@@ -1,34 +1,79 @@
-from django.db.models.signals import post_save, pre_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 from .models import Battle, Vote
 from django.conf import settings
+from gamification.ledger import ledger
+from thoughty.cache import invalidate_on_commit
+from thoughty.realtime import battle_channel, hub
 
 @receiver(post_save, sender=Vote)
 def check_battle_closure(sender, instance, created, **kwargs):
     """
     Whenever a vote is cast:
-    - Count votes.
+    - Bump the battle's vote counters (same transaction as the insert).
     - If vote count ≥ vote_threshold or closes_at passed -> determine winner.
     - Award tokens to battle.winner.user.
     """
 
     battle = instance.battle
+    if created:
+        battle.record_vote(instance.choice_id)
+        push_votes(battle)
+
     if battle.winner:
         return  # already closed
     
-    total_votes     = battle.votes.count()
+    total_votes     = battle.total_votes
     deadline_passed = battle.closes_at and timezone.now() >= battle.closes_at
 
     if total_votes >= battle.vote_threshold or deadline_passed:
         # Determine and set winner
         winner_pod = battle.determine_winner()
-        battle.winner = winner_pod
-        battle.save(update_fields=['winner'])
+        if not battle.close(winner_pod):
+            return  # no votes to decide it, or closed meanwhile by a concurrent vote or verdict
+
+        # Award tokens (atomic increment through the ledger)
+        ledger.credit(winner_pod.user_id, 50, "Battle Win", reference=f"battle:{battle.pk}:win")
+
+@receiver(post_save, sender=Battle)
+def push_battle_closed(sender, instance, update_fields=None, **kwargs):
+    if instance.winner_id is None or update_fields is None or 'winner' not in update_fields:
+        return
+    message = {
+        'type': 'closed',
+        'battle_id': instance.pk,
+        'winner_pod': instance.winner_id,
+        'winner_title': instance.winner.title,
+        'votes': instance.vote_counts(),
+        'total_votes': instance.total_votes,
+    }
+    transaction.on_commit(lambda: hub.publish(battle_channel(instance.pk), message))
+
 
-        # Award tokens
-        winner_user = winner_pod.user
+def push_votes(battle):
+    """Send the battle's tallies to live viewers once the vote commits (coalesced, see thoughty.realtime)"""
+    message = {
+        'type': 'votes',
+        'battle_id': battle.pk,
+        'votes': battle.vote_counts(),
+        'total_votes': battle.total_votes,
+    }
+    transaction.on_commit(
+        lambda: hub.publish(battle_channel(battle.pk), message, coalesce=True, seq=message['total_votes'])
+    )
 
-        # Adjust token amount as you see fit:
-        winner_user.tokens += 50
-        winner_user.save(update_fields=['tokens'])
\ No newline at end of file
+
+@receiver(post_save, sender=Battle)
+@receiver(post_delete, sender=Battle)
+def invalidate_battle(sender, instance, **kwargs):
+    """Cached responses showing the battle or any battle list (see thoughty.cache)"""
+    invalidate_on_commit(f'battle:{instance.pk}', 'battles')
+
+
+@receiver(post_save, sender=Vote)
+@receiver(post_delete, sender=Vote)
+def invalidate_battle_votes(sender, instance, **kwargs):
+    # Tallies are bumped with an UPDATE (Battle.record_vote), which sends no signal of its own
+    invalidate_on_commit(f'battle:{instance.battle_id}', 'battles')
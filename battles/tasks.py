@@ -0,0 +1,6 @@
+from celery import shared_task
+
+@shared_task
+def generate_battle_verdict(verdict_id):
+    from .verdicts import run_verdict
+    run_verdict(verdict_id)
@@ -1,3 +1,149 @@
+import asyncio
+import json
+from unittest import mock
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from outbox.models import OutboxEvent
+from pods.models import Pod
+from thoughty.realtime import Hub, LocalBroker, battle_channel
+from users.models import User
+from .models import Battle, BattleVerdict, Vote
+from .verdicts import request_verdict, run_verdict
+
+
+class VoteCounterTests(TestCase):
+    """The denormalized tallies follow every vote and decide the winner"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner  = User.objects.create_user(username='battle_owner', email='battle_owner@thoughty.io', password='pw')
+        cls.voters = [User.objects.create_user(username=f'battle_voter{i}', email=f'battle_voter{i}@thoughty.io')
+                      for i in range(3)]
+        cls.pod_a  = Pod.objects.create(user=cls.owner, title='A', content='Content')
+        cls.pod_b  = Pod.objects.create(user=cls.voters[0], title='B', content='Content')
+
+    def setUp(self):
+        self.battle = Battle.objects.create(pod_a=self.pod_a, pod_b=self.pod_b, created_by=self.owner)
+        self.client = APIClient()
+
+    def vote(self, voter, pod):
+        self.client.force_authenticate(voter)
+        return self.client.post('/api/vote/', {'battle': self.battle.pk, 'choice': pod.pk}, format='json')
+
+    def test_votes_move_the_counters(self):
+        self.vote(self.voters[0], self.pod_a)
+        self.vote(self.voters[1], self.pod_b)
+        self.assertEqual(self.vote(self.voters[1], self.pod_a).status_code, 400) # Once per battle
+
+        self.battle.refresh_from_db()
+        self.assertEqual((self.battle.pod_a_votes, self.battle.pod_b_votes, self.battle.total_votes), (1, 1, 2))
+        results = self.client.get(f'/api/battles/{self.battle.pk}/results/').json()
+        self.assertEqual(results, {str(self.pod_a.pk): 1, str(self.pod_b.pk): 1})
+
+    def test_vote_for_another_pod_is_rejected(self):
+        outsider = Pod.objects.create(user=self.owner, title='Outsider', content='Content')
+        response = self.vote(self.voters[0], outsider)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('choice', response.json())
+        with self.assertRaises(ValidationError):
+            Vote(battle=self.battle, voted_by=self.voters[0], choice=outsider).full_clean()
+
+        # Counted for nothing even if such a vote is saved directly
+        Vote.objects.create(battle=self.battle, voted_by=self.voters[1], choice=outsider)
+        self.battle.refresh_from_db()
+        self.assertEqual((self.battle.pod_a_votes, self.battle.pod_b_votes, self.battle.total_votes), (0, 0, 0))
+
+    def test_threshold_closes_once(self):
+        tokens = User.objects.get(pk=self.owner.pk).tokens
+        for voter, pod in zip(self.voters, (self.pod_a, self.pod_b, self.pod_a)):
+            self.vote(voter, pod)
+        self.battle.refresh_from_db()
+        self.assertEqual(self.battle.winner, self.pod_a)
+        self.assertEqual(Vote.objects.filter(battle=self.battle).count(), self.battle.total_votes)
+        self.assertEqual(User.objects.get(pk=self.owner.pk).tokens, tokens + 50)
+
+    def test_deadline_without_votes_has_no_winner(self):
+        self.assertIsNone(self.battle.determine_winner())
+        self.assertFalse(self.battle.close(None))
+        self.assertIsNone(Battle.objects.get(pk=self.battle.pk).winner)
+        self.assertFalse(OutboxEvent.objects.filter(topic='battle.closed', payload__battle_id=self.battle.pk).exists())
+
+    def test_stale_instance_does_not_close_again(self):
+        stale = Battle.objects.get(pk=self.battle.pk) # Read before the other vote closed it
+        self.assertTrue(self.battle.close(self.pod_a))
+        self.assertFalse(stale.close(self.pod_b))
+        self.assertEqual(stale.winner_id, self.pod_a.pk)
+        self.assertEqual(Battle.objects.get(pk=self.battle.pk).winner, self.pod_a)
+        self.assertEqual(OutboxEvent.objects.filter(topic='battle.closed', payload__battle_id=self.battle.pk).count(), 1)
+
+
+class VerdictJobTests(TestCase):
+    """Verdict requests share one job per vote count, computed by a worker"""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner      = User.objects.create_user(username='verdict_owner', email='verdict_owner@thoughty.io', password='pw')
+        pod_a      = Pod.objects.create(user=owner, title='A', content='Content')
+        pod_b      = Pod.objects.create(user=owner, title='B', content='Content')
+        cls.battle = Battle.objects.create(pod_a=pod_a, pod_b=pod_b, created_by=owner)
+
+    @mock.patch('battles.verdicts.BattleAIJudge')
+    def test_one_job_per_state(self, judge):
+        judge.return_value.generate_verdict.return_value = {'winner_pod': None, 'reasoning': [], 'ai_powered': True}
+        job = request_verdict(self.battle)
+        self.assertEqual(request_verdict(self.battle), job) # Shared while in flight
+
+        run_verdict(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, BattleVerdict.Status.DONE)
+        self.assertEqual(job.result['battle_id'], self.battle.pk)
+        self.assertEqual(request_verdict(self.battle), job) # Reused while the votes don't change
+
+        self.battle.total_votes += 1
+        self.assertNotEqual(request_verdict(self.battle), job)
+        self.assertEqual(judge.return_value.generate_verdict.call_count, 1)
+
+    def test_lost_race_returns_the_winning_job(self):
+        def finished_meanwhile(battle):
+            # Another request queued a job after our check for a done one, and it has finished since
+            BattleVerdict(battle=battle, total_votes=battle.total_votes, status=BattleVerdict.Status.DONE, result={}).save()
+            return None
+
+        with mock.patch('battles.verdicts._active_job', finished_meanwhile), \
+                mock.patch.object(BattleVerdict.objects, 'create', side_effect=IntegrityError('one_active_verdict_per_battle')):
+            job = request_verdict(self.battle)
+        self.assertEqual(job.status, BattleVerdict.Status.DONE)
+        self.assertEqual(job.total_votes, self.battle.total_votes)
+
+
+class LiveTallyTests(TestCase):
+    """Vote tallies reach live viewers once committed, coalesced and in order"""
+
+    async def test_coalesced(self):
+        hub = Hub(broker=LocalBroker(), rate=20)
+        hub.broker.listen(hub._deliver)
+        subscription = hub.subscribe(battle_channel(1))
+        for total in (1, 2, 3, 2): # The last arrives late and is dropped
+            hub.publish(battle_channel(1), {'type': 'votes', 'total_votes': total}, coalesce=True, seq=total)
+
+        first    = await asyncio.wait_for(subscription.get(), 1)
+        trailing = await asyncio.wait_for(subscription.get(), 1)
+        self.assertEqual([json.loads(text)['total_votes'] for _, text in (first, trailing)], [1, 3])
+        self.assertTrue(subscription.queue.empty())
+        subscription.close()
 
-# Create your tests here.
+    def test_vote_pushes_tallies(self):
+        owner  = User.objects.create_user(username='live_owner', email='live_owner@thoughty.io', password='pw')
+        pod_a  = Pod.objects.create(user=owner, title='A', content='Content')
+        pod_b  = Pod.objects.create(user=owner, title='B', content='Content')
+        battle = Battle.objects.create(pod_a=pod_a, pod_b=pod_b, created_by=owner)
+        with mock.patch('battles.signals.hub') as hub:
+            with self.captureOnCommitCallbacks(execute=True):
+                Vote.objects.create(battle=battle, voted_by=owner, choice=pod_b)
+        hub.publish.assert_called_once_with(battle_channel(battle.pk), {
+            'type': 'votes', 'battle_id': battle.pk, 'votes': {pod_a.pk: 0, pod_b.pk: 1}, 'total_votes': 1,
+        }, coalesce=True, seq=1)
@@ -1,9 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import BattleViewSet, VoteCreateView
+from .views import BattleViewSet, BattleVerdictViewSet, VoteCreateView
 
 router = DefaultRouter()
 router.register('battles', BattleViewSet, basename='battle')
+router.register('verdicts', BattleVerdictViewSet, basename='verdict')
 
 
 urlpatterns = [
@@ -0,0 +1,160 @@
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from pods.models import Pod
+from thoughty.tasks import enqueue
+from .ai_service import BattleAIJudge
+from .models import Battle, BattleVerdict
+from .tasks import generate_battle_verdict
+
+logger = logging.getLogger(__name__)
+
+# A job still "active" after this long was lost (e.g. a local worker restarted)
+STALE_AFTER = timedelta(minutes=5)
+
+
+def request_verdict(battle):
+    """
+    Return the verdict job answering `battle` in its current state.
+
+    A finished job computed at the same vote count is reused as is; an
+    in-flight job is shared by every caller; otherwise a new job is
+    created and queued.
+    """
+    latest_done = (
+        battle.verdicts.filter(status=BattleVerdict.Status.DONE, total_votes=battle.total_votes)
+        .order_by('-created_at')
+        .first()
+    )
+    if latest_done is not None:
+        return latest_done
+
+    active = _active_job(battle)
+    if active is not None:
+        return active
+
+    try:
+        with transaction.atomic():
+            job = BattleVerdict.objects.create(battle=battle, total_votes=battle.total_votes)
+            enqueue(generate_battle_verdict, job.pk)
+    except IntegrityError:
+        # Lost the race: answer with the job that won it, even if it has finished (or failed) since
+        return (
+            battle.verdicts.filter(total_votes=battle.total_votes).order_by('-created_at').first()
+            or battle.verdicts.order_by('-created_at').first()
+        )
+    return job
+
+
+def _active_job(battle):
+    job = battle.verdicts.filter(status__in=BattleVerdict.ACTIVE).first()
+    if job is not None and job.created_at < timezone.now() - STALE_AFTER:
+        BattleVerdict.objects.filter(pk=job.pk, status__in=BattleVerdict.ACTIVE).update(
+            status=BattleVerdict.Status.FAILED,
+            error='Abandoned by worker',
+            finished_at=timezone.now(),
+        )
+        return None
+    return job
+
+
+def run_verdict(verdict_id):
+    """Worker side: claim a pending job, compute the verdict and store it"""
+    claimed = BattleVerdict.objects.filter(pk=verdict_id, status=BattleVerdict.Status.PENDING).update(
+        status=BattleVerdict.Status.RUNNING,
+        started_at=timezone.now(),
+    )
+    if not claimed:
+        return  # Already taken, finished or abandoned
+
+    job = BattleVerdict.objects.get(pk=verdict_id)
+    battle = Battle.objects.select_related('pod_a', 'pod_b').get(pk=job.battle_id)
+
+    try:
+        job.result = compute_verdict(battle)
+        job.status = BattleVerdict.Status.DONE
+    except Exception as e:
+        logger.exception(f"Verdict job {job.pk} for battle {battle.id} failed")
+        job.error  = str(e)
+        job.status = BattleVerdict.Status.FAILED
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['result', 'status', 'error', 'finished_at'])
+
+
+def compute_verdict(battle):
+    """
+    Generate the AI verdict for a battle, set its winner if still open, and
+    store the verdict permanently once the battle is closed.
+    Falls back to a vote-based analysis when the AI is unavailable.
+    """
+    try:
+        # Initialize AI judge
+        ai_judge = BattleAIJudge()
+
+        # Generate AI verdict
+        verdict = ai_judge.generate_verdict(battle)
+
+        # Update battle winner if not already set
+        if not battle.winner and verdict.get("winner_pod"):
+            try:
+                winner_pod = Pod.objects.get(id=verdict["winner_pod"])
+                battle.close(winner_pod)
+                logger.info(f"Battle {battle.id} winner set to Pod {winner_pod.id} by AI verdict")
+            except Pod.DoesNotExist:
+                logger.error(f"Winner pod {verdict['winner_pod']} not found for battle {battle.id}")
+
+        # Add additional context to the response
+        response_data = {
+            **verdict,
+            "battle_id": battle.id,
+            "battle_title": f"{battle.pod_a.title} vs {battle.pod_b.title}",
+            "created_at": battle.created_at,
+            "total_votes": battle.total_votes,
+            "ai_powered": verdict.get("ai_powered", True)
+        }
+
+        # Inputs of a closed battle are final, so is its verdict
+        if battle.is_closed and response_data["ai_powered"]:
+            battle.ai_verdict = response_data
+            battle.save(update_fields=['ai_verdict', 'timestamp'])
+
+        return response_data
+
+    except Exception as e:
+        logger.error(f"Error generating AI verdict for battle {battle.id}: {str(e)}")
+
+        # Fallback to basic vote-based analysis
+        a_votes = battle.pod_a_votes
+        b_votes = battle.pod_b_votes
+
+        # Determine winner based on votes
+        if a_votes > b_votes:
+            winner = battle.pod_a
+        elif b_votes > a_votes:
+            winner = battle.pod_b
+        else:
+            winner = None
+
+        # Update battle winner if not set
+        if not battle.winner and winner:
+            battle.close(winner)
+
+        return {
+            "winner_pod": winner.id if winner else None,
+            "winner_title": winner.title if winner else "Tie",
+            "reasoning": [
+                f"Pod A ({battle.pod_a.title}) received {a_votes} votes",
+                f"Pod B ({battle.pod_b.title}) received {b_votes} votes",
+                "Winner determined by community voting (AI analysis unavailable)"
+            ],
+            "analysis": "Vote-based analysis due to AI service error",
+            "vote_summary": f"Pod A: {a_votes} votes, Pod B: {b_votes} votes",
+            "battle_id": battle.id,
+            "battle_title": f"{battle.pod_a.title} vs {battle.pod_b.title}",
+            "ai_powered": False,
+            "error": "AI analysis unavailable"
+        }
@@ -1,22 +1,25 @@
 import json
-import os
 import logging
-from django.conf import settings
-from groq import Groq
+import re
+
+from thoughty.llm import CircuitOpen, get_gateway
 
 logger = logging.getLogger(__name__)
 
+# Leading "1.", "2)", "-" or "*" a model may put on a line despite instructions
+LIST_MARKER = re.compile(r'^\s*(?:\d+[.)]|[-*\u2022])\s*')
+
 class AIVariationGenerator:
     """Service to generate variations using AI models"""
 
     def __init__(self):
-        # Get API key from settings
-        self.api_key = getattr(settings, 'GROQ_API_KEY', os.environ.get('GROQ_API_KEY'))
+        # Shared, pooled client; see thoughty.llm
+        self.llm = get_gateway()
+        self.api_key = self.llm.api_key
         if not self.api_key:
             logger.warning("GROQ API key not configured!")
-        self.client = Groq(api_key=self.api_key,)
     
-    def generate_variations(self, prompt_text, prompt_type, count=3):
+    def generate_variations(self, prompt_text, prompt_type, count=3, cache=True):
         """
         Generate variations based on a prompt
         
@@ -24,6 +27,7 @@ class AIVariationGenerator:
             prompt_text: The original prompt text
             prompt_type: Type of prompt (idea, title, quote)
             count: Number of variations to generate
+            cache: Reuse the answer to an identical earlier request
             
         Returns:
             List of generated variations or empty list on error
@@ -35,7 +39,7 @@ class AIVariationGenerator:
         
         try:
             system_message = self._get_system_prompt(prompt_type)
-            response = self.client.chat.completions.create(
+            content = self.llm.complete(
                 model="llama-3.3-70b-versatile",
                 messages= [
                     {"role": "system", "content": system_message + 'Respond only with JSON using this format: \{"variations":["variation 1 content goes here as text", "variation 2 content goes here as text", "etc ..."]\}'},
@@ -44,17 +48,69 @@ class AIVariationGenerator:
                 max_tokens=500,
                 temperature=0.8,
                 n=1,
-                response_format={"type":"json_object"}
+                response_format={"type":"json_object"},
+                cache=cache,
             )
             # Parse the results - expecting a numbered list
-            variations = json.loads(response.choices[0].message.content)['variations']
+            variations = json.loads(content)['variations']
             
             return variations[:count] # Ensure we don't exceed requested count
 
+        except CircuitOpen:
+            logger.warning("LLM circuit open, skipping AI call")
+            return []
         except Exception as e:
             logger.error(f"Error generating variations: {str(e)}")
             return []
     
+    async def stream_variations(self, prompt_text, prompt_type, count=3):
+        """
+        Generate variations, yielding each one as soon as the model has
+        finished writing it.
+
+        The model is asked for one variation per line, so a variation is
+        complete at every newline. Raises CircuitOpen / LLMUnavailable when
+        the provider cannot be reached; the caller decides how to report it.
+        """
+        if not self.api_key:
+            logger.error("Cannot stream variations: No API key")
+            return
+
+        system_message = self._get_system_prompt(prompt_type)
+        deltas = self.llm.astream(
+            model="llama-3.3-70b-versatile",
+            messages=[
+                {"role": "system", "content": system_message + "Respond only with the variations, one per line, without numbering or any other text."},
+                {"role": "user", "content": f"Original prompt: {prompt_text}\n\nGenerate {count} creative variations."},
+            ],
+            max_tokens=500,
+            temperature=0.8,
+        )
+
+        emitted = 0
+        buffer  = ''
+        try:
+            async for delta in deltas:
+                buffer += delta
+                *lines, buffer = buffer.split('\n')
+                for line in lines:
+                    text = self._clean_line(line)
+                    if text:
+                        yield text
+                        emitted += 1
+                        if emitted >= count:
+                            return
+
+            text = self._clean_line(buffer)
+            if text:
+                yield text
+        finally:
+            # Stop the provider stream once we have enough
+            await deltas.aclose()
+
+    def _clean_line(self, line):
+        return LIST_MARKER.sub('', line).strip().strip('"')
+
     def _get_system_prompt(self, prompt_type):
         """Get the appropriate system prompt based on prompt type"""
 
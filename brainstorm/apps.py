@@ -4,3 +4,5 @@ from django.apps import AppConfig
 class BrainstormConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'brainstorm'
+    def ready(self):
+        import brainstorm.signals  # noqa
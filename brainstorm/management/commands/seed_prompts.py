@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from brainstorm.models import Prompt
+from brainstorm.roulette import selector
 import logging
 
 # Configure logging
@@ -143,6 +144,8 @@ class Command(BaseCommand):
 
         with transaction.atomic():
             Prompt.objects.bulk_create(prompts_to_create)
+        # bulk_create skips post_save, so drop the roulette id cache by hand
+        selector.invalidate()
 
         total = len(prompts_to_create)
         logger.info(f"Successfully seeded {total} prompts:")
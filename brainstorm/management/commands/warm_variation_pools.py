@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from brainstorm.pool import variation_pool
+
+
+class Command(BaseCommand):
+    help = "Queue variation pool refills for the most spun prompts (run periodically, e.g. from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100, help='Number of popular prompts to warm')
+        parser.add_argument('--days', type=int, default=7, help='Popularity window in days')
+        parser.add_argument('--sync', action='store_true', help='Refill in this process instead of queueing')
+
+    def handle(self, *args, **options):
+        warmed = variation_pool.warm(limit=options['limit'], days=options['days'], sync=options['sync'])
+        self.stdout.write(self.style.SUCCESS(f"Warmed variation pools for {warmed} prompts"))
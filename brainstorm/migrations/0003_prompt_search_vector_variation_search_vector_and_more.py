@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:25
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('brainstorm', '0002_prompt_difficulty_prompt_tags_variation_user_and_more'),
+        ('pods', '0004_pod_search_vector_pod_pod_search_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prompt',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.SearchVector('text', config='english', weight='A'), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddField(
+            model_name='variation',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.SearchVector('text', config='english', weight='A'), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='prompt',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='prompt_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='variation',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='variation_search_idx'),
+        ),
+    ]
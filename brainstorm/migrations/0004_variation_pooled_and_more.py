@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('brainstorm', '0003_prompt_search_vector_variation_search_vector_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='variation',
+            name='pooled',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='variation',
+            index=models.Index(fields=['prompt', 'pooled'], name='variation_prompt_pooled_idx'),
+        ),
+    ]
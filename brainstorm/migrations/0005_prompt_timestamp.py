@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('brainstorm', '0004_variation_pooled_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prompt',
+            name='timestamp',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+
+from search.fields import SearchVectorDeferringManager, search_vector_field
 
 # Create your models here.
 
@@ -22,10 +25,20 @@ class Prompt(models.Model):
         ('advanced', 'Advanced')
     ], default='intermediate')
     tags = models.ManyToManyField('pods.Tag', blank=True)
+    timestamp   = models.DateTimeField(auto_now=True)
+
+    search_vector = search_vector_field(('text', 'A'))
+
+    objects = SearchVectorDeferringManager()
 
     def __str__(self):
         return f"[{self.get_type_display()}] {self.text}"
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='prompt_search_idx'),
+        ]
+
 class RouletteSpin(models.Model):
     user      = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     prompt    = models.ForeignKey(Prompt, on_delete=models.CASCADE)
@@ -36,3 +49,14 @@ class Variation(models.Model):
     text          = models.TextField()
     user          = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
     created_by_ai = models.BooleanField(default=True)
+    pooled        = models.BooleanField(default=False) # Pre-generated, not handed out yet (see brainstorm.pool)
+
+    search_vector = search_vector_field(('text', 'A'))
+
+    objects = SearchVectorDeferringManager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='variation_search_idx'),
+            models.Index(fields=['prompt', 'pooled'], name='variation_prompt_pooled_idx'),
+        ]
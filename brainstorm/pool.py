@@ -0,0 +1,141 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from thoughty.tasks import enqueue
+from .ai_service import AIVariationGenerator
+from .models import Prompt, RouletteSpin, Variation
+
+logger = logging.getLogger(__name__)
+
+REFILL_LOCK_TIMEOUT = 120
+STATS_KEYS = ('hits', 'partial', 'misses')
+
+
+class VariationPool:
+    """
+    Warm pool of pre-generated AI variations per prompt.
+
+    Pooled rows are ordinary Variation rows with `pooled=True`; they stay out
+    of every listing until `take()` hands them to a user. Whenever a prompt
+    drops below the low-water mark a background refill tops it back up, and
+    `warm()` fills the pools of the most spun prompts ahead of demand.
+    """
+
+    def __init__(self, size=None, low_water=None):
+        self.size      = size or settings.VARIATION_POOL_SIZE
+        self.low_water = low_water or settings.VARIATION_POOL_LOW_WATER
+
+    def take(self, prompt, count):
+        """
+        Hand out up to `count` pooled variations of `prompt`, or [] when the
+        pool is empty. Concurrent callers never receive the same rows.
+        """
+        with transaction.atomic():
+            ids = list(
+                Variation.objects.select_for_update(skip_locked=True)
+                .filter(prompt=prompt, pooled=True)
+                .order_by('id')
+                .values_list('id', flat=True)[:count]
+            )
+            if ids:
+                Variation.objects.filter(pk__in=ids).update(pooled=False)
+
+        self.record('hits' if len(ids) == count else 'partial' if ids else 'misses')
+        self.schedule_refill(prompt.pk)
+        return list(Variation.objects.filter(pk__in=ids).select_related('prompt').order_by('id'))
+
+    def available(self, prompt_id):
+        return Variation.objects.filter(prompt_id=prompt_id, pooled=True).count()
+
+    def schedule_refill(self, prompt_id, below=None):
+        """Queue a refill if the pool holds fewer than `below` (default: low-water mark); True if queued"""
+        if self.available(prompt_id) >= (below or self.low_water):
+            return False
+        # One refill per prompt at a time
+        if not cache.add(self.lock_key(prompt_id), 1, REFILL_LOCK_TIMEOUT):
+            return False
+
+        from .tasks import refill_variation_pool
+        enqueue(refill_variation_pool, prompt_id)
+        return True
+
+    def refill(self, prompt_id):
+        """Generate enough variations to bring the pool of `prompt_id` back to full size"""
+        try:
+            prompt = Prompt.objects.filter(pk=prompt_id).first()
+            if prompt is None:
+                return 0
+
+            missing = self.size - self.available(prompt_id)
+            if missing <= 0:
+                return 0
+
+            # Bypass the response cache: the pool needs fresh variations, not a replay
+            texts = AIVariationGenerator().generate_variations(
+                prompt_text=prompt.text,
+                prompt_type=prompt.type,
+                count=missing,
+                cache=False,
+            )
+            Variation.objects.bulk_create(
+                Variation(prompt=prompt, text=text, created_by_ai=True, pooled=True)
+                for text in texts
+            )
+            logger.info(f"Refilled variation pool for prompt {prompt_id} with {len(texts)} variations")
+            return len(texts)
+        finally:
+            cache.delete(self.lock_key(prompt_id))
+
+    def warm(self, limit=100, days=7, sync=False):
+        """
+        Refill the pools of the `limit` most spun prompts of the last `days`
+        days, queued unless `sync`. Returns how many prompts needed it.
+        """
+        since = timezone.now() - timedelta(days=days)
+        popular = (
+            RouletteSpin.objects.filter(timestamp__gte=since)
+            .values('prompt')
+            .annotate(spins=Count('id'))
+            .order_by('-spins')
+            .values_list('prompt', flat=True)[:limit]
+        )
+        warmed = 0
+        for prompt_id in popular:
+            if sync:
+                if self.available(prompt_id) < self.size:
+                    self.refill(prompt_id)
+                    warmed += 1
+            elif self.schedule_refill(prompt_id, below=self.size):
+                warmed += 1
+        return warmed
+
+    def lock_key(self, prompt_id):
+        return f'variation_pool:refill:{prompt_id}'
+
+    def record(self, outcome):
+        key = f'variation_pool:stats:{outcome}'
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+    def stats(self):
+        counts = {outcome: cache.get(f'variation_pool:stats:{outcome}', 0) for outcome in STATS_KEYS}
+        requests = sum(counts.values())
+        served   = counts['hits'] + counts['partial']
+        return {
+            **counts,
+            'requests': requests,
+            'hit_rate': round(served / requests, 4) if requests else None,
+            'pooled_variations': Variation.objects.filter(pooled=True).count(),
+        }
+
+
+variation_pool = VariationPool()
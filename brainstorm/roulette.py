@@ -0,0 +1,249 @@
+import random
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from urllib.parse import quote
+
+from django.core.cache import cache
+
+from .models import Prompt, RouletteSpin
+
+VERSION_KEY    = 'roulette:version'
+FACET_TIMEOUT  = 60 * 60 * 24
+LOCAL_FACETS   = 64 # Decoded id arrays kept per process
+SEEN_TIMEOUT   = 60 * 60 * 24 * 7
+UNSEEN_TRIES   = 64 # Random probes before drawing from the user's complement
+SEEN_LOG_MAX   = 1024 # Pending marks before a bitmap is rebuilt from the table instead
+
+FILTERS = ('type', 'difficulty', 'tag')
+
+
+class SeenSet:
+    """Bitmap over prompt ids; bit n is set once the user has spun prompt n"""
+
+    def __init__(self, bits=b''):
+        self.bits = bytearray(bits)
+
+    def __contains__(self, prompt_id):
+        byte = prompt_id >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] >> (prompt_id & 7) & 1)
+
+    def add(self, prompt_id):
+        byte = prompt_id >> 3
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte - len(self.bits) + 1))
+        self.bits[byte] |= 1 << (prompt_id & 7)
+
+    def dumps(self):
+        return zlib.compress(bytes(self.bits), 1)
+
+    @classmethod
+    def loads(cls, blob):
+        return cls(zlib.decompress(blob))
+
+
+class SeenIndex:
+    """
+    Per-user seen-prompt bitmaps, zlib-compressed in the cache.
+
+    A bitmap is rebuilt lazily from RouletteSpin on a cache miss and then
+    kept current by marking each committed spin (see brainstorm.signals),
+    so spins never run an anti-join against the spin history.
+
+    Marks never rewrite the bitmap: each one takes a slot from an atomic
+    counter (``cache.incr``) and stores its prompt id there. Readers fold
+    the slots past the bitmap's watermark in and write the result back, so
+    concurrent spins can't overwrite each other's marks.
+    """
+
+    def key(self, user_id):
+        return f'roulette:seen:{user_id}'
+
+    def counter_key(self, user_id):
+        return f'roulette:seen:{user_id}:n'
+
+    def slot_key(self, user_id, n):
+        return f'roulette:seen:{user_id}:{n}'
+
+    def get(self, user_id):
+        cached = cache.get(self.key(user_id))
+        marked = cache.get(self.counter_key(user_id))
+        if cached is None or marked is None or marked - cached[0] > SEEN_LOG_MAX:
+            return self.rebuild(user_id)
+
+        watermark, blob = cached
+        seen = SeenSet.loads(blob)
+        if marked == watermark:
+            return seen
+
+        slots = [self.slot_key(user_id, n) for n in range(watermark + 1, marked + 1)]
+        found = cache.get_many(slots)
+        for key in slots:
+            if key in found:
+                seen.add(found[key])
+        # Only move past slots that were filled; one still being written is read again next time
+        for key in slots:
+            if key not in found:
+                break
+            watermark += 1
+        cache.set(self.key(user_id), (watermark, seen.dumps()), SEEN_TIMEOUT)
+        return seen
+
+    def rebuild(self, user_id):
+        # Take the watermark before reading the table: marks landing meanwhile are folded in later
+        cache.add(self.counter_key(user_id), 0, SEEN_TIMEOUT)
+        watermark = cache.get(self.counter_key(user_id), 0)
+
+        seen = SeenSet()
+        spun = RouletteSpin.objects.filter(user_id=user_id).values_list('prompt_id', flat=True)
+        for prompt_id in spun.order_by().distinct().iterator(chunk_size=10000):
+            seen.add(prompt_id)
+        cache.set(self.key(user_id), (watermark, seen.dumps()), SEEN_TIMEOUT)
+        return seen
+
+    def mark(self, user_id, prompt_id):
+        """Record a committed spin, but only for a cached bitmap; a miss rebuilds from the table anyway"""
+        try:
+            n = cache.incr(self.counter_key(user_id))
+        except ValueError:
+            return
+        cache.set(self.slot_key(user_id, n), prompt_id, SEEN_TIMEOUT)
+
+    def forget(self, user_id):
+        cache.delete_many([self.key(user_id), self.counter_key(user_id)])
+
+
+class PromptSelector:
+    """
+    Constant-time random prompt selection.
+
+    Prompt ids are kept as compact ``array('q')`` blobs in the cache, one per
+    facet (all prompts, ``type=idea``, ``type=idea|tag=space`` ...), built
+    lazily from a single ``values_list`` query. Every spin then costs one
+    cache lookup for the catalog version, an index into the array and one
+    primary-key fetch, regardless of how many prompts exist.
+
+    Any Prompt save/delete or tag change bumps the version, which orphans
+    every facet at once (see brainstorm.signals).
+
+    Given a user, prompts they have not spun yet are preferred: candidates
+    are drawn at random and rejected if set in the user's seen bitmap. When
+    the probes keep hitting, the user's complement of the facet is cached
+    and drawn from instead, dropping ids as they get spun. Once everything
+    matching has been seen, the whole facet is used again.
+    """
+
+    def __init__(self):
+        self._local = OrderedDict()
+        self._lock  = threading.Lock()
+        self.seen   = SeenIndex()
+
+    def pick_id(self, user=None, **filters):
+        """Random prompt id matching `filters`, or None if there is none"""
+        ids = self.get_ids(**filters)
+        if not ids:
+            return None
+        if user is not None and user.is_authenticated:
+            complement = f'roulette:{self.get_version()}:{self.facet_key(**filters)}:unseen:{user.pk}'
+            return self.pick_unseen_id(ids, self.seen.get(user.pk), complement)
+        return ids[random.randrange(len(ids))]
+
+    def pick_unseen_id(self, ids, seen, complement_key):
+        for _ in range(UNSEEN_TRIES):
+            prompt_id = ids[random.randrange(len(ids))]
+            if prompt_id not in seen:
+                return prompt_id
+
+        # Mostly seen already: draw from the user's unseen ids for this facet, built once per catalog version
+        blob = cache.get(complement_key)
+        if blob is None:
+            unseen = array('q', (prompt_id for prompt_id in ids if prompt_id not in seen))
+        else:
+            unseen = array('q')
+            unseen.frombytes(blob)
+
+        size = len(unseen)
+        prompt_id = None
+        while unseen:
+            i = random.randrange(len(unseen))
+            if unseen[i] not in seen:
+                prompt_id = unseen[i]
+                break
+            # Spun since the complement was built
+            unseen[i] = unseen[-1]
+            unseen.pop()
+        if blob is None or len(unseen) != size:
+            cache.set(complement_key, unseen.tobytes(), FACET_TIMEOUT)
+
+        if prompt_id is None:
+            return ids[random.randrange(len(ids))]
+        return prompt_id
+
+    def pick(self, user=None, **filters):
+        """Random Prompt matching `filters`, unseen by `user` when possible; None if there is none"""
+        for _ in range(2):
+            prompt_id = self.pick_id(user, **filters)
+            if prompt_id is None:
+                return None
+            prompt = Prompt.objects.filter(pk=prompt_id).first()
+            if prompt is not None:
+                return prompt
+            # Deleted behind our back (e.g. a queryset delete); start over
+            self.invalidate()
+        return None
+
+    def get_ids(self, **filters):
+        facet = self.facet_key(**filters)
+        key   = f'roulette:{self.get_version()}:{facet}'
+
+        with self._lock:
+            ids = self._local.get(key)
+            if ids is not None:
+                self._local.move_to_end(key)
+                return ids
+
+        blob = cache.get(key)
+        if blob is None:
+            ids = self.build(**filters)
+            cache.set(key, ids.tobytes(), FACET_TIMEOUT)
+        else:
+            ids = array('q')
+            ids.frombytes(blob)
+
+        with self._lock:
+            self._local[key] = ids
+            while len(self._local) > LOCAL_FACETS:
+                self._local.popitem(last=False)
+        return ids
+
+    def build(self, type=None, difficulty=None, tag=None):
+        """Load the ids for one facet from the database"""
+        prompts = Prompt.objects.all()
+        if type:
+            prompts = prompts.filter(type=type)
+        if difficulty:
+            prompts = prompts.filter(difficulty=difficulty)
+        if tag:
+            prompts = prompts.filter(tags__name=tag)
+        return array('q', prompts.order_by('id').values_list('id', flat=True).distinct())
+
+    def facet_key(self, **filters):
+        parts = [f'{name}={filters[name]}' for name in FILTERS if filters.get(name)]
+        return quote('|'.join(parts), safe='=|') or 'all'
+
+    def get_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            version = time.time_ns()
+            if not cache.add(VERSION_KEY, version, None):
+                version = cache.get(VERSION_KEY, version)
+        return version
+
+    def invalidate(self):
+        """Drop every cached facet by moving to a new catalog version"""
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+selector = PromptSelector()
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from thoughty.sparse import SparseFieldsMixin
 from .models import Prompt, RouletteSpin, Variation
 from pods.models import Pod
 
@@ -25,7 +26,7 @@ class RouletteSpinSerializer(serializers.ModelSerializer):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
 
-class VariationSerializer(serializers.ModelSerializer):
+class VariationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     prompt = PromptSerializer(read_only=True)
     prompt_id = serializers.PrimaryKeyRelatedField(
         queryset=Prompt.objects.all(),
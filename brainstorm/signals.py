@@ -0,0 +1,30 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from .models import Prompt, RouletteSpin
+from .roulette import selector
+from thoughty.cache import invalidate_on_commit
+
+@receiver(post_save, sender=Prompt)
+@receiver(post_delete, sender=Prompt)
+def invalidate_roulette(sender, instance, **kwargs):
+    """Any change to the catalog orphans the cached roulette id arrays."""
+    # After commit: a spin rebuilding the arrays before then wouldn't see the change
+    transaction.on_commit(selector.invalidate)
+    invalidate_on_commit(f'prompt:{instance.pk}', 'prompts')
+
+@receiver(m2m_changed, sender=Prompt.tags.through)
+def invalidate_roulette_tags(sender, instance, action, **kwargs):
+    """Tag facets change when a prompt's tags do."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(selector.invalidate)
+        invalidate_on_commit('prompts')
+
+@receiver(post_save, sender=RouletteSpin)
+def mark_prompt_seen(sender, instance, created, **kwargs):
+    """Keep the user's cached seen-prompt bitmap current."""
+    if created:
+        # After commit: a bitmap rebuilt from the table before then wouldn't include the spin
+        transaction.on_commit(partial(selector.seen.mark, instance.user_id, instance.prompt_id))
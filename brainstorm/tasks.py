@@ -0,0 +1,10 @@
+from celery import shared_task
+from .pool import variation_pool
+
+@shared_task
+def refill_variation_pool(prompt_id):
+    variation_pool.refill(prompt_id)
+
+@shared_task
+def warm_variation_pools(limit=100):
+    variation_pool.warm(limit=limit)
@@ -1,3 +1,288 @@
+import asyncio
+import time
+from unittest import mock
+
+import httpx
 from django.test import TestCase
+from groq import APIConnectionError
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from battles.serializers import BattleVerdictSerializer
+from pods.models import Tag
+from thoughty.fastpath import compile_serializer
+from thoughty.llm import CircuitBreaker, CircuitOpen, LLMGateway, LLMUnavailable
+from users.models import User
+from .ai_service import AIVariationGenerator
+from .models import Prompt, RouletteSpin, Variation
+from .pool import VariationPool
+from .roulette import selector
+from .views import PromptViewSet, VariationListCreateView
+
+
+class RouletteInvalidationTests(TestCase):
+    """The roulette catalog moves on when a prompt change commits, not before"""
+
+    def test_new_prompt_after_commit(self):
+        selector.get_ids(type='perspective') # Cached under the current version
+        with self.captureOnCommitCallbacks(execute=True):
+            prompt = Prompt.objects.create(text='Look at it sideways', type='perspective')
+            # A concurrent spin rebuilding now would cache a catalog without it
+            self.assertNotIn(prompt.pk, selector.get_ids(type='perspective'))
+        self.assertEqual(selector.pick(type='perspective'), prompt)
+
+    def test_tag_change_after_commit(self):
+        prompt = Prompt.objects.create(text='Tagged later', type='idea')
+        tag    = Tag.objects.create(name='roulette-tag')
+        self.assertEqual(list(selector.get_ids(tag='roulette-tag')), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            prompt.tags.add(tag)
+        self.assertEqual(list(selector.get_ids(tag='roulette-tag')), [prompt.pk])
+
+
+class UnseenRouletteTests(TestCase):
+    """Spins prefer prompts the user hasn't spun yet, then start over"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user    = User.objects.create_user(username='unseen', email='unseen@thoughty.io', password='pw')
+        cls.prompts = [Prompt.objects.create(text=f'Unseen {i}', type='question', difficulty='advanced') for i in range(5)]
+        for prompt in cls.prompts[:4]:
+            RouletteSpin.objects.create(user=cls.user, prompt=prompt)
+
+    def setUp(self):
+        # The cache outlives each test's rollback
+        selector.invalidate()
+        selector.seen.forget(self.user.pk)
+
+    def test_unseen_first(self):
+        for _ in range(20):
+            self.assertEqual(selector.pick(self.user, type='question', difficulty='advanced'), self.prompts[4])
+
+    def test_spins_mark_the_cached_bitmap(self):
+        selector.seen.get(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            RouletteSpin.objects.create(user=self.user, prompt=self.prompts[4])
+            self.assertNotIn(self.prompts[4].pk, selector.seen.get(self.user.pk))
+        with self.assertNumQueries(0):
+            seen = selector.seen.get(self.user.pk)
+        self.assertTrue(all(prompt.pk in seen for prompt in self.prompts))
+        # Everything seen: the whole facet is in play again
+        self.assertIn(selector.pick(self.user, type='question', difficulty='advanced'), self.prompts)
+
+
+    def test_concurrent_marks_are_kept(self):
+        other = Prompt.objects.create(text='Unseen extra', type='question')
+        selector.seen.get(self.user.pk)
+        # Two spins marking the same cached bitmap, neither seeing the other's write
+        selector.seen.mark(self.user.pk, self.prompts[4].pk)
+        selector.seen.mark(self.user.pk, other.pk)
+        seen = selector.seen.get(self.user.pk)
+        self.assertIn(self.prompts[4].pk, seen)
+        self.assertIn(other.pk, seen)
+
+    def test_mostly_seen_draws_from_the_complement(self):
+        with mock.patch('brainstorm.roulette.UNSEEN_TRIES', 0):
+            self.assertEqual(selector.pick(self.user, type='question', difficulty='advanced'), self.prompts[4])
+            with self.captureOnCommitCallbacks(execute=True):
+                RouletteSpin.objects.create(user=self.user, prompt=self.prompts[4])
+            # The cached complement drops the spun prompt and the whole facet is back in play
+            with self.assertNumQueries(1):
+                self.assertIn(selector.pick(self.user, type='question', difficulty='advanced'), self.prompts)
+
+def completion(content):
+    return mock.Mock(choices=[mock.Mock(message=mock.Mock(content=content))])
+
+
+def connection_error():
+    return APIConnectionError(request=httpx.Request('POST', 'https://api.groq.com/openai/v1/chat/completions'))
+
+
+class LLMGatewayTests(TestCase):
+    """Transient provider failures are retried; persistent ones open the circuit"""
+
+    def setUp(self):
+        self.gateway  = LLMGateway(api_key='test', backoff_base=0, breaker=CircuitBreaker(threshold=2))
+        self.create   = mock.Mock()
+        self.messages = [{'role': 'user', 'content': 'Hello'}]
+        self.gateway.client.chat.completions.create = self.create
+
+    def test_retries_transient_failures(self):
+        self.create.side_effect = [connection_error(), connection_error(), completion('Hi')]
+        self.assertEqual(self.gateway.complete(self.messages), 'Hi')
+        self.assertEqual(self.create.call_count, 3)
+        self.assertFalse(self.gateway.breaker.is_open)
+
+    def test_circuit_opens(self):
+        self.create.side_effect = connection_error()
+        for _ in range(2):
+            with self.assertRaises(LLMUnavailable):
+                self.gateway.complete(self.messages)
+        calls = self.create.call_count
+        with self.assertRaises(CircuitOpen):
+            self.gateway.complete(self.messages)
+        self.assertEqual(self.create.call_count, calls) # Short-circuited
+
+    def test_cancelled_trial_releases_the_circuit(self):
+        breaker = self.gateway.breaker
+        breaker.failures, breaker.opened_at = 2, time.monotonic() - breaker.reset_timeout - 1
+        started = asyncio.Event()
+
+        async def hang(**kwargs):
+            started.set()
+            await asyncio.sleep(60)
+
+        async def cancel_trial():
+            client = mock.Mock()
+            client.chat.completions.create = hang
+            with mock.patch.object(self.gateway, '_get_async_client', return_value=client):
+                task = asyncio.ensure_future(self.gateway.astream(self.messages).__anext__())
+                await started.wait()
+                self.assertFalse(breaker.allow()) # The trial is in flight
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+
+        asyncio.run(cancel_trial())
+        self.assertTrue(breaker.allow())
+
+
+class LLMResponseCacheTests(TestCase):
+    """Identical generation requests are answered once; pool refills always reach the provider"""
+
+    def setUp(self):
+        gateway = LLMGateway(api_key='test')
+        self.create = mock.Mock(return_value=completion('{"variations": ["One", "Two"]}'))
+        gateway.client.chat.completions.create = self.create
+        patcher = mock.patch('brainstorm.ai_service.get_gateway', return_value=gateway)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_repeat_is_cached(self):
+        generator = AIVariationGenerator()
+        for _ in range(2):
+            self.assertEqual(generator.generate_variations('A cached prompt', 'idea', count=2), ['One', 'Two'])
+        self.assertEqual(self.create.call_count, 1)
+
+        generator.generate_variations('A cached prompt', 'idea', count=2, cache=False)
+        self.assertEqual(self.create.call_count, 2)
+
+
+class VariationPoolTests(TestCase):
+    """Pooled variations are handed out once and topped back up in the background"""
+
+    def setUp(self):
+        self.pool   = VariationPool(size=3, low_water=2)
+        self.prompt = Prompt.objects.create(text='Pooled prompt', type='idea')
+        Variation.objects.bulk_create(Variation(prompt=self.prompt, text=f'Pooled {i}', pooled=True) for i in range(3))
+
+    def test_take_hands_out_once(self):
+        first  = self.pool.take(self.prompt, 2)
+        second = self.pool.take(self.prompt, 2)
+        self.assertEqual([len(first), len(second)], [2, 1])
+        self.assertFalse({v.pk for v in first} & {v.pk for v in second})
+        self.assertEqual(self.pool.take(self.prompt, 2), [])
+        self.assertFalse(Variation.objects.filter(prompt=self.prompt, pooled=True).exists())
+
+    @mock.patch('brainstorm.pool.AIVariationGenerator')
+    def test_refill_after_low_water(self, generator):
+        generator.return_value.generate_variations.return_value = ['Fresh 1', 'Fresh 2']
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.pool.take(self.prompt, 2)
+        self.assertEqual(len(callbacks), 1) # One refill queued
+
+        self.assertEqual(self.pool.refill(self.prompt.pk), 2)
+        generator.return_value.generate_variations.assert_called_once_with(
+            prompt_text='Pooled prompt', prompt_type='idea', count=2, cache=False,
+        )
+        self.assertEqual(self.pool.available(self.prompt.pk), 3)
+
+    def test_pooled_answer_after_repeated_spins(self):
+        user = User.objects.create_user(username='pooled', email='pooled@thoughty.io', password='pw')
+        RouletteSpin.objects.bulk_create(RouletteSpin(user=user, prompt=self.prompt) for _ in range(2))
+        client = APIClient()
+        client.force_authenticate(user)
+        with mock.patch('brainstorm.views.variation_pool', self.pool):
+            response = client.post(f'/api/brainstorm/prompts/{self.prompt.pk}/generate_variations/', {'count': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+        self.assertEqual(RouletteSpin.objects.filter(user=user, prompt=self.prompt).count(), 2)
+
+
+    @mock.patch('brainstorm.views.AIVariationGenerator')
+    def test_partial_pool_is_topped_up(self, generator):
+        generator.return_value.generate_variations.return_value = ['Fresh 1', 'Fresh 2']
+        user = User.objects.create_user(username='topped', email='topped@thoughty.io', password='pw')
+        self.pool.take(self.prompt, 2) # One left
+        client = APIClient()
+        client.force_authenticate(user)
+        with mock.patch('brainstorm.views.variation_pool', self.pool):
+            response = client.post(f'/api/brainstorm/prompts/{self.prompt.pk}/generate_variations/', {'count': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([v['text'] for v in response.json()], ['Pooled 2', 'Fresh 1', 'Fresh 2'])
+        generator.return_value.generate_variations.assert_called_once_with(
+            prompt_text='Pooled prompt', prompt_type='idea', count=2,
+        )
+
+
+class StreamVariationsTests(TestCase):
+    """The streaming endpoint records the spin without tripping over earlier ones"""
+
+    def test_prompt_spun_twice_before(self):
+        user   = User.objects.create_user(username='spinner', email='spinner@thoughty.io', password='pw')
+        prompt = Prompt.objects.create(text='Spun twice', type='idea')
+        RouletteSpin.objects.create(user=user, prompt=prompt)
+        RouletteSpin.objects.create(user=user, prompt=prompt)
+        token    = RefreshToken.for_user(user).access_token
+        response = self.client.get(f'/api/brainstorm/prompts/{prompt.pk}/generate_variations/stream/',
+                                   HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(RouletteSpin.objects.filter(user=user, prompt=prompt).count(), 2)
+
+
+class FastPathParityTests(TestCase):
+    """The fast list paths must answer byte for byte what the serializers do"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='writer', email='writer@thoughty.io', password='pw')
+        for i in range(12):
+            prompt = Prompt.objects.create(
+                text=f'Prompt {i} – "with" punctuation',
+                type=['idea', 'quote', 'question'][i % 3],
+                difficulty=['beginner', 'advanced'][i % 2],
+            )
+            for j in range(i % 4):
+                Variation.objects.create(
+                    prompt=prompt, text=f'Variation {j} of {i}',
+                    user=cls.user if j % 2 else None, created_by_ai=bool(j % 2),
+                )
+        Variation.objects.create(prompt=prompt, text='Still in the pool', pooled=True)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def assertParity(self, view, url):
+        # Both paths must run, not answer from the response cache
+        with mock.patch.object(view, 'cache_tags', {}, create=True):
+            fast = self.client.get(url)
+            with mock.patch.object(view, 'fast_list', False):
+                slow = self.client.get(url)
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, slow.content)
+        return fast
+
+    def test_prompts(self):
+        self.assertParity(PromptViewSet, '/api/brainstorm/prompts/')
+
+    def test_variations(self):
+        response = self.assertParity(VariationListCreateView, '/api/brainstorm/variations/')
+        self.assertNotIn('Still in the pool', response.content.decode())
+
+    def test_variations_sparse_and_filtered(self):
+        prompt = Prompt.objects.order_by('id').last()
+        self.assertParity(VariationListCreateView, '/api/brainstorm/variations/?fields=id,text')
+        self.assertParity(VariationListCreateView, f'/api/brainstorm/variations/?prompt_id={prompt.pk}')
 
-# Create your tests here.
+    def test_method_fields_use_the_serializer(self):
+        self.assertIsNone(compile_serializer(BattleVerdictSerializer()))
@@ -5,16 +5,20 @@ from .views import (
     spin_roulette, 
     VariationListCreateView, 
     VariationDetailView,
-    create_pod_from_variation
+    create_pod_from_variation,
+    variation_pool_stats,
+    stream_variations
 )
 
 router = DefaultRouter()
 router.register(r'prompts', PromptViewSet, basename='prompt')
 
 urlpatterns = [
+    path('prompts/<int:pk>/generate_variations/stream/', stream_variations, name='prompt-variations-stream'),
     path('', include(router.urls)),
     path('roulette/spin/', spin_roulette, name='spin-roulette'),
     path('variations/', VariationListCreateView.as_view(), name='variation-list'),
     path('variations/<int:pk>/', VariationDetailView.as_view(), name='variation-detail'),
     path('pods/from-variation/', create_pod_from_variation, name='pod-from-variation'),
+    path('variations/pool/stats/', variation_pool_stats, name='variation-pool-stats'),
 ]
\ No newline at end of file
@@ -1,24 +1,42 @@
-import random
+import json
+import logging
+
+from asgiref.sync import sync_to_async
 from rest_framework import viewsets, generics, permissions, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from django.utils import timezone
 from rest_framework.decorators import action
 from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
 
 from .models import Prompt, RouletteSpin, Variation
 from .serializers import PromptSerializer, RouletteSpinSerializer, VariationSerializer
 from pods.models import Pod
 from pods.serializers import PodSerializer
 from .ai_service import AIVariationGenerator
+from .roulette import selector
+from .pool import variation_pool
+from thoughty.llm import LLMUnavailable
 
+from thoughty.cache import CachedResponseMixin
+from thoughty.conditional import ConditionalMixin
+from thoughty.fastpath import FastListMixin
 from thoughty.permissions import IsOwnerOrReadOnly
+from thoughty.sparse import SparseQuerysetMixin
 from .permissions import IsPromptVariationCreator
 
+logger = logging.getLogger(__name__)
+
 # Create your views here.
 
-class PromptViewSet(viewsets.ReadOnlyModelViewSet):
+class PromptViewSet(CachedResponseMixin, ConditionalMixin, FastListMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint that allows prompts to be viewed.
     Prompts can only be created, updated or deleted by staff.
@@ -27,6 +45,7 @@ class PromptViewSet(viewsets.ReadOnlyModelViewSet):
     queryset           = Prompt.objects.all()
     serializer_class   = PromptSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    cache_tags         = {'list': ['prompts'], 'retrieve': ['prompt:{pk}']}
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def add_to_history(self, request, pk=None):
@@ -37,36 +56,42 @@ class PromptViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def generate_variations(self, request, pk=None):
-        """Generate AI variations for a prompt"""
+        """
+        Generate AI variations for a prompt.
+        Served from the prompt's pre-generated pool; the LLM is only called
+        inline for what the pool can't cover, so a partly drained pool
+        still answers `count` variations.
+        """
         prompt = self.get_object()
         
         # Get parameters
         count = int(request.data.get('count', 3))
         count = min(max(1, count), 5) # Limit between 1-5 variations
 
-        # Generate variations
-        ai_service = AIVariationGenerator()
-        variations_text = ai_service.generate_variations(
-            prompt_text=prompt.text,
-            prompt_type=prompt.type,
-            count=count
-        )
-
-        if not variations_text:
-            return Response(
-                {"detail": "Failed to generate variations"}, 
-                status=status.HTTP_503_SERVICE_UNAVAILABLE
+        pooled = variation_pool.take(prompt, count)
+        variations_text = []
+        if len(pooled) < count:
+            # Generate the missing variations
+            ai_service = AIVariationGenerator()
+            variations_text = ai_service.generate_variations(
+                prompt_text=prompt.text,
+                prompt_type=prompt.type,
+                count=count - len(pooled)
             )
+
+            if not variations_text and not pooled:
+                return Response(
+                    {"detail": "Failed to generate variations"}, 
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE
+                )
     
         # Save the variations
         variations = []
         with transaction.atomic():
             # Record that user has seen this prompt
-            RouletteSpin.objects.get_or_create(
-                user=request.user,
-                prompt=prompt,
-                defaults={'timestamp': timezone.now()}
-            )
+            # Spins aren't unique per (user, prompt) (spin_roulette adds one per spin): get_or_create could find several
+            if not RouletteSpin.objects.filter(user=request.user, prompt=prompt).exists():
+                RouletteSpin.objects.create(user=request.user, prompt=prompt)
 
             # Create variation objects
             for text in variations_text:
@@ -77,32 +102,38 @@ class PromptViewSet(viewsets.ReadOnlyModelViewSet):
                 )
                 variations.append(variation)
             
-        # Return the created variations
-        serializer = VariationSerializer(variations, many=True)
+        # Return the pooled and created variations (only the pooled ones if generation failed)
+        serializer = VariationSerializer([*pooled, *variations], many=True)
         return Response(serializer.data)
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def spin_roulette(request):
     """
-    Spin the roulette to get a random prompt.
+    Spin the roulette to get a random prompt, preferring ones the user
+    has not spun before. Optional filters: type, difficulty and tag (tag name).
     Requires authentication.
     """
-    prompts = list(Prompt.objects.all())
-    if not prompts:
+    params = request.data or request.query_params
+    prompt = selector.pick(
+        request.user,
+        type=params.get('type'),
+        difficulty=params.get('difficulty'),
+        tag=params.get('tag'),
+    )
+    if prompt is None:
         return Response({'detail': 'No prompts available.'}, status=status.HTTP_404_NOT_FOUND)
-    prompt = random.choice(prompts)
     spin   = RouletteSpin.objects.create(user=request.user, prompt=prompt)
     serializer = PromptSerializer(prompt)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
-class VariationListCreateView(generics.ListCreateAPIView):
+class VariationListCreateView(FastListMixin, SparseQuerysetMixin, generics.ListCreateAPIView):
     """
     API endpoint for listing and creating variations.
-    GET: List variations (public)
+    GET: List variations (public); ?fields=id,text skips the nested prompt
     POST: Create a new variation (authenticated only)
     """
-    queryset           = Variation.objects.all()
+    queryset           = Variation.objects.filter(pooled=False)
     serializer_class   = VariationSerializer
     permission_classes = [IsPromptVariationCreator]
 
@@ -121,14 +152,15 @@ class VariationListCreateView(generics.ListCreateAPIView):
         
         return queryset
 
-class VariationDetailView(generics.RetrieveUpdateDestroyAPIView):
+class VariationDetailView(SparseQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     API endpoint for a specific variation.
     Only the creator can update/delete a variation.
     """
-    queryset = Variation.objects.all()
+    queryset = Variation.objects.filter(pooled=False)
     serializer_class = VariationSerializer
     permission_classes = [IsOwnerOrReadOnly]
+    sparse_required = ['user']
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -142,16 +174,13 @@ def create_pod_from_variation(request):
         return Response({'detail': 'Variation ID is required.'}, 
                         status=status.HTTP_400_BAD_REQUEST)
     
-    variation = get_object_or_404(Variation, pk=variation_id)
+    variation = get_object_or_404(Variation, pk=variation_id, pooled=False)
     
     # Optionally check if user has access to this variation
     if request.user.is_authenticated:
         # Record that user interacted with this prompt
-        RouletteSpin.objects.get_or_create(
-            user=request.user, 
-            prompt=variation.prompt,
-            defaults={'timestamp': timezone.now()}
-        )
+        if not RouletteSpin.objects.filter(user=request.user, prompt=variation.prompt).exists():
+            RouletteSpin.objects.create(user=request.user, prompt=variation.prompt)
     
     pod = Pod.objects.create(
         user=request.user,
@@ -161,4 +190,86 @@ def create_pod_from_variation(request):
     )
     serializer = PodSerializer(pod)
 
-    return Response(serializer.data, status=status.HTTP_201_CREATED)
\ No newline at end of file
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def variation_pool_stats(request):
+    """Hit rate and size of the pre-generated variation pool (staff only)."""
+    return Response(variation_pool.stats())
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+async def stream_variations(request, pk):
+    """
+    Stream AI variations for a prompt as Server-Sent Events.
+
+    Pooled variations are sent first; the rest are generated and each one is
+    saved and sent as a `variation` event as soon as the model completes it.
+    The stream ends with a `done` event (or an `error` event).
+    Async view: under ASGI an open stream holds no worker thread.
+    """
+    user = await _authenticate(request)
+    if user is None or not user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    prompt = await Prompt.objects.filter(pk=pk).afirst()
+    if prompt is None:
+        return JsonResponse({'detail': 'No Prompt matches the given query.'}, status=404)
+
+    try:
+        count = int(request.GET.get('count') or request.POST.get('count') or 3)
+    except ValueError:
+        count = 3
+    count = min(max(1, count), 5) # Limit between 1-5 variations
+
+    # Spins aren't unique per (user, prompt) (spin_roulette adds one per spin): get_or_create could find several
+    if not await RouletteSpin.objects.filter(user=user, prompt=prompt).aexists():
+        await RouletteSpin.objects.acreate(user=user, prompt=prompt)
+
+    response = StreamingHttpResponse(_variation_events(prompt, count), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no' # Don't let a proxy hold events back
+    return response
+
+
+async def _authenticate(request):
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        return await sync_to_async(lambda: drf_request.user)()
+    except AuthenticationFailed:
+        return None
+
+
+async def _variation_events(prompt, count):
+    sent = 0
+    for variation in await sync_to_async(variation_pool.take)(prompt, count):
+        yield await _sse_variation(variation)
+        sent += 1
+
+    if sent < count:
+        ai_service = AIVariationGenerator()
+        try:
+            async for text in ai_service.stream_variations(prompt.text, prompt.type, count - sent):
+                variation = await Variation.objects.acreate(prompt=prompt, text=text, created_by_ai=True)
+                yield await _sse_variation(variation)
+                sent += 1
+        except LLMUnavailable as e:
+            logger.warning(f"Streaming variations for prompt {prompt.pk} failed: {e}")
+        except Exception:
+            logger.exception(f"Error streaming variations for prompt {prompt.pk}")
+
+        if sent == 0:
+            yield _sse('error', {'detail': 'Failed to generate variations'})
+
+    yield _sse('done', {'count': sent})
+
+
+async def _sse_variation(variation):
+    data = await sync_to_async(lambda: VariationSerializer(variation).data)()
+    return _sse('variation', data)
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=JSONEncoder)}\n\n"
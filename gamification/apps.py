@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class GamificationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gamification'
+
+    def ready(self):
+        import gamification.checks  # noqa
+        import gamification.signals  # noqa
@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from thoughty.cache import invalidate_on_commit
+
+from .models import AchievementLog, Badge
+from .rules import METRICS, Rule, RuleError
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+VERSION_KEY = 'badges:version'
+USER_CHUNK  = 2000 # Users per metrics query when evaluating in bulk
+
+
+class RuleBook:
+    """
+    Every badge's condition, compiled once per badge version.
+
+    The compiled set is kept per process and indexed by event. A shared
+    cache version, bumped whenever a badge changes (see
+    gamification.signals), tells each process to reload; only badges whose
+    version moved are recompiled.
+    """
+
+    def __init__(self):
+        self._lock     = threading.Lock()
+        self._version  = None
+        self._compiled = {} # badge id -> (badge version, Rule or None)
+        self._by_event = {}
+        self._all      = []
+
+    def rules(self, event=None):
+        """(badge_id, Rule) pairs depending on `event`, or all of them"""
+        version = self.get_version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._load()
+                    self._version = version
+        if event is None:
+            return self._all
+        return self._by_event.get(event, [])
+
+    def _load(self):
+        compiled = {}
+        for pk, version, source in Badge.objects.values_list('pk', 'version', 'condition_code'):
+            cached = self._compiled.get(pk)
+            if cached is not None and cached[0] == version:
+                compiled[pk] = cached
+                continue
+            try:
+                compiled[pk] = (version, Rule(source))
+            except RuleError as e:
+                logger.warning(f"Badge {pk} has an invalid condition and is skipped: {e}")
+                compiled[pk] = (version, None)
+
+        by_event = {}
+        rules    = []
+        for pk, (_, rule) in compiled.items():
+            if rule is None:
+                continue
+            rules.append((pk, rule))
+            for event in rule.events:
+                by_event.setdefault(event, []).append((pk, rule))
+
+        self._compiled, self._by_event, self._all = compiled, by_event, rules
+
+    def get_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            version = time.time_ns()
+            if not cache.add(VERSION_KEY, version, None):
+                version = cache.get(VERSION_KEY, version)
+        return version
+
+    def invalidate(self):
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+class BadgeEngine:
+    """Awards badges by running the relevant compiled rules against batched user metrics"""
+
+    def __init__(self):
+        self.rulebook = RuleBook()
+        self._sql     = {}
+
+    def evaluate(self, user, event=None):
+        """Award `user` the badges unlocked by `event` (all badges if None); returns how many were awarded"""
+        return self.evaluate_many([user.pk], event)
+
+    def evaluate_many(self, user_ids, event=None):
+        """Same as evaluate() for many users, USER_CHUNK users per round of queries"""
+        rules = self.rulebook.rules(event)
+        if not rules:
+            return 0
+
+        user_ids = list(user_ids)
+        metrics  = sorted(set().union(*(rule.metrics for _, rule in rules)))
+        awarded  = 0
+        for start in range(0, len(user_ids), USER_CHUNK):
+            chunk  = user_ids[start:start + USER_CHUNK]
+            values = self.fetch_metrics(chunk, metrics)
+            earned = set(AchievementLog.objects.filter(user_id__in=chunk).values_list('user_id', 'badge_id'))
+            logs = [
+                AchievementLog(user_id=user_id, badge_id=badge_id)
+                for user_id, user_values in values.items()
+                for badge_id, rule in rules
+                if (user_id, badge_id) not in earned and rule(user_values)
+            ]
+            if logs:
+                # A concurrent evaluation may have awarded some of these since `earned` was read
+                AchievementLog.objects.bulk_create(logs, batch_size=1000, ignore_conflicts=True)
+                # bulk_create sends no signals: the winners' badge lists change here
+                invalidate_on_commit(*{f'user:{log.user_id}:badges' for log in logs})
+            awarded += len(logs)
+        return awarded
+
+    def fetch_metrics(self, user_ids, metrics):
+        """{user_id: {metric: value}} for the given users, in a single query"""
+        with connection.cursor() as cursor:
+            sql, params = self.metrics_sql(tuple(metrics))
+            cursor.execute(sql, (*params, list(user_ids)))
+            return {row[0]: dict(zip(metrics, row[1:])) for row in cursor.fetchall()}
+
+    def metrics_sql(self, metrics):
+        """
+        SQL selecting `metrics` for the users in its last parameter (an id
+        array). Building the subqueries costs more than running them for a
+        single user, so it is done once per metric set.
+        """
+        query = self._sql.get(metrics)
+        if query is None:
+            rows = (
+                User.objects.annotate(**{f'metric_{name}': METRICS[name].expression() for name in metrics})
+                .values_list(User._meta.pk.attname, *(f'metric_{name}' for name in metrics))
+            )
+            sql, params = rows.query.sql_with_params()
+            # Filtered outside: the compiled query may already end in WHERE, GROUP BY or ORDER BY
+            pk_column   = connection.ops.quote_name(User._meta.pk.attname)
+            query = self._sql[metrics] = (f'SELECT * FROM ({sql}) AS metrics WHERE metrics.{pk_column} = ANY(%s)', params)
+        return query
+
+badge_engine = BadgeEngine()
@@ -0,0 +1,33 @@
+from django.core.checks import Tags, Warning, register
+from django.db import DatabaseError
+
+from .models import Badge
+from .rules import Rule, RuleError
+
+
+@register(Tags.database)
+def check_badge_conditions(app_configs, databases=None, **kwargs):
+    """
+    Badges whose condition doesn't compile are skipped by the badge engine
+    and never awarded. Conditions used to be eval'd Python, so flag any
+    that the rule language rejects; runs on migrate and check --database.
+    """
+    if not databases:
+        return []
+    try:
+        badges = list(Badge.objects.values_list('pk', 'name', 'condition_code'))
+    except DatabaseError: # Not migrated yet
+        return []
+
+    warnings = []
+    for pk, name, source in badges:
+        try:
+            Rule(source)
+        except RuleError as e:
+            warnings.append(Warning(
+                f"Badge {pk} ({name}) has an invalid condition and is no longer awarded: {e}",
+                hint="Rewrite its condition_code in the admin, e.g. 'pods >= 10 and battles_won >= 3'.",
+                obj=f'Badge {pk}',
+                id='gamification.W001',
+            ))
+    return warnings
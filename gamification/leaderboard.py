@@ -0,0 +1,534 @@
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, time as dt_time, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import TokenTransaction
+
+User = get_user_model()
+
+WINDOWS      = ('all', 'week', 'day')
+WINDOW_TTL   = {'day': 60 * 60 * 24 * 2, 'week': 60 * 60 * 24 * 8} # Keep the previous window around briefly
+MAX_LEVEL    = 32
+LEVEL_P      = 0.25
+LOADED_KEY   = 'leaderboard:loaded' # Set once a rebuild has filled the store; gone when it is flushed
+REBUILDING   = 'leaderboard:rebuilding' # Set while a rebuild runs; token changes are queued meanwhile
+PENDING_KEY  = 'leaderboard:pending'
+REBUILD_TTL  = 60 * 10 # A crashed rebuild stops deferring changes after this
+REBUILD_LOCK = 'leaderboard:rebuild-lock' # Held by the one rebuild running; expires with REBUILD_TTL
+
+# Check the flag and push in one step, so nothing is queued once a rebuild has drained
+PUSH_WHILE = """
+if redis.call('exists', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('rpush', KEYS[2], unpack(ARGV))
+return 1
+"""
+
+
+@contextmanager
+def _snapshot():
+    """
+    A transaction that reads from one snapshot throughout, so the rebuild's
+    sums and its replay check see the same committed ledger. SQLite
+    transactions already do, and so does MySQL's default level; inside an
+    outer transaction it is the caller's isolation level that applies.
+    """
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        if outermost and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        yield
+
+
+class _Node:
+    __slots__ = ('key', 'forward', 'span')
+
+    def __init__(self, key, level):
+        self.key     = key
+        self.forward = [None] * level
+        self.span    = [0] * level
+
+
+class SkipList:
+    """
+    Ordered keys with O(log n) insert, delete, rank and rank lookup.
+
+    Each forward pointer records how many nodes it skips (its span), so the
+    rank of a key is the sum of spans along its search path, as in Redis
+    sorted sets.
+    """
+
+    def __init__(self):
+        self.head   = _Node(None, MAX_LEVEL)
+        self.level  = 1
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def insert(self, key):
+        update = [self.head] * MAX_LEVEL
+        rank   = [0] * MAX_LEVEL
+        node   = self.head
+        for i in range(self.level - 1, -1, -1):
+            rank[i] = 0 if i == self.level - 1 else rank[i + 1]
+            while node.forward[i] is not None and node.forward[i].key < key:
+                rank[i] += node.span[i]
+                node = node.forward[i]
+            update[i] = node
+
+        level = self._random_level()
+        if level > self.level:
+            for i in range(self.level, level):
+                rank[i]   = 0
+                update[i] = self.head
+                self.head.span[i] = self.length
+            self.level = level
+
+        node = _Node(key, level)
+        for i in range(level):
+            node.forward[i]      = update[i].forward[i]
+            update[i].forward[i] = node
+            node.span[i]         = update[i].span[i] - (rank[0] - rank[i])
+            update[i].span[i]    = rank[0] - rank[i] + 1
+        for i in range(level, self.level):
+            update[i].span[i] += 1
+        self.length += 1
+
+    def delete(self, key):
+        update = [self.head] * MAX_LEVEL
+        node   = self.head
+        for i in range(self.level - 1, -1, -1):
+            while node.forward[i] is not None and node.forward[i].key < key:
+                node = node.forward[i]
+            update[i] = node
+
+        node = node.forward[0]
+        if node is None or node.key != key:
+            return False
+
+        for i in range(self.level):
+            if update[i].forward[i] is node:
+                update[i].span[i]   += node.span[i] - 1
+                update[i].forward[i] = node.forward[i]
+            else:
+                update[i].span[i] -= 1
+        while self.level > 1 and self.head.forward[self.level - 1] is None:
+            self.level -= 1
+        self.length -= 1
+        return True
+
+    def rank(self, key):
+        """1-based position of `key`, or None if absent"""
+        rank = 0
+        node = self.head
+        for i in range(self.level - 1, -1, -1):
+            while node.forward[i] is not None and node.forward[i].key <= key:
+                rank += node.span[i]
+                node = node.forward[i]
+            if node is not self.head and node.key == key:
+                return rank
+        return None
+
+    def slice(self, start, stop):
+        """Keys at 0-based positions start..stop inclusive"""
+        start = max(start, 0)
+        stop  = min(stop, self.length - 1)
+        if start > stop:
+            return []
+
+        traversed = 0
+        node      = self.head
+        for i in range(self.level - 1, -1, -1):
+            while node.forward[i] is not None and traversed + node.span[i] <= start + 1:
+                traversed += node.span[i]
+                node = node.forward[i]
+
+        keys = []
+        while node is not None and len(keys) <= stop - start:
+            keys.append(node.key)
+            node = node.forward[0]
+        return keys
+
+    def _random_level(self):
+        level = 1
+        while level < MAX_LEVEL and random.random() < LEVEL_P:
+            level += 1
+        return level
+
+
+class LocalSortedSets:
+    """
+    In-process stand-in for Redis sorted sets, for tests and single-process
+    development. Members are ordered by score descending, ties by member.
+    """
+
+    def __init__(self):
+        self._sets  = {} # key -> (SkipList, {member: score}, expires_at)
+        self._flags = {} # key -> expires_at
+        self._lists = {}
+        self._lock  = threading.Lock()
+
+    def incr(self, key, member, amount):
+        with self._lock:
+            ordered, scores = self._get(key, create=True)
+            score = scores.get(member)
+            if score is not None:
+                ordered.delete((-score, member))
+            score = (score or 0) + amount
+            scores[member] = score
+            ordered.insert((-score, member))
+            return score
+
+    def score(self, key, member):
+        with self._lock:
+            _, scores = self._get(key)
+            return scores.get(member)
+
+    def rank(self, key, member):
+        """0-based rank of `member`, highest score first; None if absent"""
+        with self._lock:
+            ordered, scores = self._get(key)
+            score = scores.get(member)
+            if score is None:
+                return None
+            return ordered.rank((-score, member)) - 1
+
+    def range(self, key, start, stop):
+        """(member, score) pairs at ranks start..stop inclusive"""
+        with self._lock:
+            ordered, _ = self._get(key)
+            return [(member, -negated) for negated, member in ordered.slice(start, stop)]
+
+    def card(self, key):
+        with self._lock:
+            ordered, _ = self._get(key)
+            return len(ordered)
+
+    def expire(self, key, seconds):
+        with self._lock:
+            if key in self._sets:
+                ordered, scores, _ = self._sets[key]
+                self._sets[key] = (ordered, scores, time.monotonic() + seconds)
+
+    def flag(self, key):
+        with self._lock:
+            expires = self._flags.get(key, 0)
+            return expires is None or expires > time.monotonic()
+
+    def set_flag(self, key, timeout=None):
+        with self._lock:
+            self._flags[key] = time.monotonic() + timeout if timeout else None
+
+    def add_flag(self, key, timeout=None):
+        """Set `key` unless it is set; True if this call set it"""
+        with self._lock:
+            expires = self._flags.get(key, 0)
+            if expires is None or expires > time.monotonic():
+                return False
+            self._flags[key] = time.monotonic() + timeout if timeout else None
+            return True
+
+    def clear_flag(self, key):
+        with self._lock:
+            self._flags.pop(key, None)
+
+    def push_while(self, flag, key, values):
+        """Append `values` to `key` if `flag` is set, atomically with checking it; True if it was"""
+        with self._lock:
+            expires = self._flags.get(flag, 0)
+            if expires is not None and expires <= time.monotonic():
+                return False
+            self._lists.setdefault(key, []).extend(values)
+            return True
+
+    def clear_and_drain(self, flag, key):
+        """Clear `flag` and remove and return everything pushed to `key`, in one step"""
+        with self._lock:
+            self._flags.pop(flag, None)
+            return self._lists.pop(key, [])
+
+    def replace(self, key, scores, timeout=None):
+        ordered = SkipList()
+        for member, score in scores.items():
+            ordered.insert((-score, member))
+        expires = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            self._evict()
+            self._sets[key] = (ordered, dict(scores), expires)
+
+    def _get(self, key, create=False):
+        entry = self._sets.get(key)
+        if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+            del self._sets[key]
+            entry = None
+        if entry is None:
+            if not create:
+                return SkipList(), {}
+            self._evict()
+            entry = self._sets[key] = (SkipList(), {}, None)
+        return entry[0], entry[1]
+
+    def _evict(self):
+        # On every new set, e.g. each new day: past windows would otherwise stay for the process' lifetime
+        now = time.monotonic()
+        for key in [key for key, (_, _, expires) in self._sets.items() if expires is not None and expires <= now]:
+            del self._sets[key]
+
+
+class RedisSortedSets:
+    """The same operations on real Redis sorted sets, shared by every process"""
+
+    def __init__(self, url):
+        import redis
+        self.client      = redis.Redis.from_url(url)
+        self._push_while = None
+
+    def incr(self, key, member, amount):
+        return self.client.zincrby(key, amount, member)
+
+    def score(self, key, member):
+        score = self.client.zscore(key, member)
+        return None if score is None else int(score)
+
+    def rank(self, key, member):
+        return self.client.zrevrank(key, member)
+
+    def range(self, key, start, stop):
+        if start > stop:
+            return []
+        return [
+            (int(member), int(score))
+            for member, score in self.client.zrevrange(key, max(start, 0), stop, withscores=True)
+        ]
+
+    def card(self, key):
+        return self.client.zcard(key)
+
+    def expire(self, key, seconds):
+        self.client.expire(key, seconds)
+
+    def flag(self, key):
+        return bool(self.client.exists(key))
+
+    def set_flag(self, key, timeout=None):
+        self.client.set(key, 1, ex=timeout)
+
+    def add_flag(self, key, timeout=None):
+        return bool(self.client.set(key, 1, ex=timeout, nx=True))
+
+    def clear_flag(self, key):
+        self.client.delete(key)
+
+    def push_while(self, flag, key, values):
+        if self._push_while is None:
+            self._push_while = self.client.register_script(PUSH_WHILE)
+        values = [json.dumps(value) for value in values]
+        if not values:
+            return self.flag(flag)
+        return all([
+            self._push_while(keys=[flag, key], args=values[start:start + 1000])
+            for start in range(0, len(values), 1000)
+        ])
+
+    def clear_and_drain(self, flag, key):
+        pipe = self.client.pipeline() # MULTI: no push lands between the delete and the read
+        pipe.delete(flag)
+        pipe.lrange(key, 0, -1)
+        pipe.delete(key)
+        _, values, _ = pipe.execute()
+        return [json.loads(value) for value in values]
+
+    def replace(self, key, scores, timeout=None):
+        # Build aside and swap in, so readers never see a half-built ranking
+        staging = f'{key}:rebuild'
+        pipe = self.client.pipeline()
+        pipe.delete(staging)
+        items = list(scores.items())
+        for start in range(0, len(items), 10000):
+            pipe.zadd(staging, dict(items[start:start + 10000]))
+        if items:
+            pipe.rename(staging, key)
+            if timeout:
+                pipe.expire(key, timeout)
+        else:
+            pipe.delete(key)
+        pipe.execute()
+
+
+class Leaderboard:
+    """
+    Token rankings for all time and for the current week and day.
+
+    Every token transaction increments the user's score in each window's
+    sorted set (see gamification.signals), so top-N, a user's rank and the
+    users around them are all O(log n) reads instead of sorting balances.
+    Windowed sets are keyed by their period and expire on their own.
+    `rebuild()` repopulates everything from TokenTransaction.
+
+    A rebuild swaps whole sets in, which would drop increments made while
+    it ran. Token changes recorded during a rebuild are queued instead and
+    replayed once the new sets are in, except those whose transaction the
+    rebuild already summed (visible in the snapshot its sums were read from).
+    Only one rebuild runs at a time; readers of an unloaded store meanwhile
+    are answered from what it holds instead of starting another.
+    """
+
+    def __init__(self, store=None):
+        self._store = store
+
+    @property
+    def store(self):
+        if self._store is None:
+            if settings.LEADERBOARD_BACKEND == 'redis':
+                self._store = RedisSortedSets(settings.LEADERBOARD_REDIS_URL)
+            else:
+                self._store = LocalSortedSets()
+        return self._store
+
+    def key(self, window, at=None):
+        at = timezone.localtime(at or timezone.now())
+        if window == 'day':
+            return f'leaderboard:day:{at:%Y%m%d}'
+        if window == 'week':
+            year, week, _ = at.isocalendar()
+            return f'leaderboard:week:{year}W{week:02d}'
+        return 'leaderboard:all'
+
+    def record(self, user_id, amount, at=None, transaction_id=None):
+        """Apply a token change of `amount` for `user_id` to every window"""
+        self.record_many([(user_id, amount, at, transaction_id)])
+
+    def record_many(self, changes):
+        """
+        record() for committed (user_id, amount, at, transaction_id)
+        changes. An empty store is rebuilt instead, from TokenTransaction,
+        which already includes them.
+        """
+        changes = list(changes)
+        queued  = self.store.push_while(REBUILDING, PENDING_KEY, [
+            (transaction_id, user_id, amount, at and at.isoformat()) for user_id, amount, at, transaction_id in changes
+        ])
+        if queued:
+            return
+        if self._ensure_loaded():
+            return
+        self._apply(changes)
+
+    def _apply(self, changes):
+        for user_id, amount, at, _ in changes:
+            for window in WINDOWS:
+                key = self.key(window, at)
+                self.store.incr(key, user_id, amount)
+                if window in WINDOW_TTL:
+                    self.store.expire(key, WINDOW_TTL[window])
+
+    def top(self, window='all', limit=10):
+        self._ensure_loaded()
+        return self._entries(self.store.range(self.key(window), 0, limit - 1), first_rank=1)
+
+    def rank(self, user_id, window='all'):
+        """{'rank', 'user_id', 'score'} for `user_id` (rank 1 is the top), or None if unranked"""
+        self._ensure_loaded()
+        key  = self.key(window)
+        rank = self.store.rank(key, user_id)
+        if rank is None:
+            return None
+        return {'rank': rank + 1, 'user_id': user_id, 'score': self.store.score(key, user_id)}
+
+    def around(self, user_id, window='all', radius=10):
+        """Up to `radius` users above and below `user_id`, including them; [] if unranked"""
+        self._ensure_loaded()
+        key  = self.key(window)
+        rank = self.store.rank(key, user_id)
+        if rank is None:
+            return []
+        start = max(rank - radius, 0)
+        return self._entries(self.store.range(key, start, rank + radius), first_rank=start + 1)
+
+    def size(self, window='all'):
+        return self.store.card(self.key(window))
+
+    def rebuild(self):
+        """
+        Recompute every window from TokenTransaction; returns {window: ranked
+        users}, or None if another rebuild is already running.
+        """
+        # One at a time: each swaps whole sets in and drains the shared queue
+        if not self.store.add_flag(REBUILD_LOCK, REBUILD_TTL):
+            return None
+        try:
+            # Queue changes from here on; anything committed before is in the sums below
+            self.store.set_flag(REBUILDING, REBUILD_TTL)
+            try:
+                with _snapshot():
+                    counts = self._rebuild()
+                    # Changes that find the flag gone are applied to the new sets directly
+                    pending = self.store.clear_and_drain(REBUILDING, PENDING_KEY)
+                    self._replay(pending)
+            finally:
+                self.store.clear_flag(REBUILDING)
+        finally:
+            self.store.clear_flag(REBUILD_LOCK)
+        return counts
+
+    def _rebuild(self):
+        now    = timezone.localtime()
+        today  = datetime.combine(now.date(), dt_time.min, tzinfo=now.tzinfo)
+        starts = {'all': None, 'week': today - timedelta(days=now.weekday()), 'day': today}
+        counts = {}
+        for window in WINDOWS:
+            transactions = TokenTransaction.objects.all()
+            if starts[window] is not None:
+                transactions = transactions.filter(created_at__gte=starts[window])
+            scores = dict(
+                transactions.order_by().values('user_id').annotate(score=Sum('amount')).values_list('user_id', 'score')
+            )
+            self.store.replace(self.key(window, now), scores, WINDOW_TTL.get(window))
+            counts[window] = len(scores)
+        self.store.set_flag(LOADED_KEY)
+        return counts
+
+    def _replay(self, pending):
+        """Apply queued changes, except those whose transaction the rebuild's snapshot already summed"""
+        # Not an id cut-off: a lower id can commit after the sums were taken
+        summed = set(TokenTransaction.objects.filter(
+            pk__in=[transaction_id for transaction_id, _, _, _ in pending if transaction_id is not None]
+        ).values_list('pk', flat=True))
+        self._apply([
+            (user_id, amount, at and datetime.fromisoformat(at), transaction_id)
+            for transaction_id, user_id, amount, at in pending
+            if transaction_id not in summed
+        ])
+
+    def _ensure_loaded(self):
+        """
+        Rebuild a store no rebuild has filled yet (new, or flushed since);
+        True if it did. While another rebuild runs, readers get what the
+        store has meanwhile rather than starting one of their own.
+        """
+        # Not the cardinality: a token change recorded first would pass for a full ranking
+        if self.store.flag(LOADED_KEY):
+            return False
+        return self.rebuild() is not None
+
+    def _entries(self, members, first_rank):
+        usernames = dict(User.objects.filter(pk__in=[member for member, _ in members]).values_list('pk', 'username'))
+        return [
+            {'rank': first_rank + offset, 'user_id': member, 'username': usernames.get(member), 'score': score}
+            for offset, (member, score) in enumerate(members)
+        ]
+
+
+leaderboard = Leaderboard()
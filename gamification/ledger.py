@@ -0,0 +1,271 @@
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, F, IntegerField, Max, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .badges import badge_engine
+from .leaderboard import leaderboard
+from .models import TokenBalance, TokenBalanceSnapshot, TokenTransaction
+from .rules import TOKENS_CHANGED
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+# Transactions younger than this are left for the next snapshot, so one
+# that committed late (after a higher id) is never skipped
+SNAPSHOT_LAG  = timedelta(minutes=1)
+USER_CHUNK    = 2000
+SNAPSHOT_LOCK = 0x746f6b656e # pg_advisory_xact_lock key of snapshot() ("token")
+
+
+def _lock_snapshots():
+    """Wait for any other snapshot() run to commit; SQLite already serializes writers"""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [SNAPSHOT_LOCK])
+
+
+def _latest_snapshot(user_ref, field):
+    return Subquery(
+        TokenBalanceSnapshot.objects.filter(user=user_ref)
+        .order_by('-through_transaction')
+        .values(field)[:1]
+    )
+
+
+class TokenLedger:
+    """
+    The only writer of token balances.
+
+    Every change is a TokenTransaction insert plus an ``F()`` increment of
+    TokenBalance (and its mirror ``User.tokens``) in the same database
+    transaction, so concurrent awards never overwrite each other. Inside
+    ``batch()`` changes are collected and applied together: one bulk insert
+    and one UPDATE per table however many users are involved.
+
+    Periodic snapshots (``snapshot()``) record each balance up to a
+    transaction id, so recomputing a balance only sums what came after.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def credit(self, user, amount, reason, reference=None):
+        """
+        Add `amount` tokens (negative to spend) to `user` (instance or id).
+        A `reference` makes the credit idempotent: a second credit with the
+        same reference is ignored.
+        """
+        user_id = getattr(user, 'pk', user)
+        pending = getattr(self._local, 'pending', None)
+        if pending is not None:
+            pending.append((user_id, amount, reason, reference))
+            return None
+        transactions = self.apply_many([(user_id, amount, reason, reference)])
+        return transactions[0] if transactions else None
+
+    @contextmanager
+    def batch(self):
+        """Collect every credit() made inside the block and apply them at once on exit"""
+        if getattr(self._local, 'pending', None) is not None:
+            yield  # Already batching; the outer block applies
+            return
+        self._local.pending = []
+        try:
+            yield
+            pending = self._local.pending
+        finally:
+            self._local.pending = None
+        if pending:
+            self.apply_many(pending)
+
+    def apply_many(self, entries):
+        """
+        Record (user_id, amount, reason, reference) entries and update the
+        balances; returns the transactions actually recorded.
+        """
+        entries = self._unapplied(entries)
+        if not entries:
+            return []
+
+        with transaction.atomic():
+            transactions = self._insert(entries)
+            if not transactions:
+                return []
+
+            deltas = Counter()
+            for t in transactions:
+                deltas[t.user_id] += t.amount
+            TokenBalance.objects.bulk_create(
+                (TokenBalance(user_id=user_id) for user_id in deltas),
+                ignore_conflicts=True,
+            )
+            TokenBalance.objects.filter(user_id__in=deltas).update(balance=F('balance') + self._delta('user_id', deltas))
+            User.objects.filter(pk__in=deltas).update(tokens=F('tokens') + self._delta('pk', deltas))
+            transaction.on_commit(lambda: self._committed(transactions))
+        return transactions
+
+    def _insert(self, entries):
+        """
+        Insert the entries' transactions. Another process may record one of
+        their references between _unapplied() and here: the unique
+        constraint rejects the insert, and it is retried without it.
+        """
+        while entries:
+            # Only a reference can conflict; spare plain credits the savepoint
+            savepoint = any(entry[3] is not None for entry in entries)
+            try:
+                with transaction.atomic(savepoint=savepoint):
+                    return TokenTransaction.objects.bulk_create(
+                        TokenTransaction(user_id=user_id, amount=amount, reason=reason, reference=reference)
+                        for user_id, amount, reason, reference in entries
+                    )
+            except IntegrityError:
+                remaining = self._unapplied(entries)
+                if len(remaining) == len(entries):
+                    raise # Not a reference recorded meanwhile
+                entries = remaining
+        return []
+
+    def _unapplied(self, entries):
+        """Drop entries whose reference was already recorded (or repeats in this batch)"""
+        entries    = list(entries)
+        references = [entry[3] for entry in entries if entry[3] is not None]
+        if not references:
+            return entries
+
+        seen = set(TokenTransaction.objects.filter(reference__in=references).values_list('reference', flat=True))
+        unapplied = []
+        for entry in entries:
+            if entry[3] is not None:
+                if entry[3] in seen:
+                    continue
+                seen.add(entry[3])
+            unapplied.append(entry)
+        return unapplied
+
+    def balance(self, user):
+        user_id = getattr(user, 'pk', user)
+        return TokenBalance.objects.filter(user_id=user_id).values_list('balance', flat=True).first() or 0
+
+    def _delta(self, field, deltas):
+        if len(deltas) == 1:
+            return Value(next(iter(deltas.values())))
+        return Case(
+            *(When(**{field: user_id}, then=Value(delta)) for user_id, delta in deltas.items()),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+
+    def _committed(self, transactions):
+        leaderboard.record_many((t.user_id, t.amount, t.created_at, t.pk) for t in transactions)
+        badge_engine.evaluate_many({t.user_id for t in transactions}, TOKENS_CHANGED)
+
+    def snapshot(self):
+        """
+        Snapshot every balance that changed since the last snapshot, up to
+        the newest transaction older than SNAPSHOT_LAG. Returns how many
+        users were snapshotted.
+
+        Runs one at a time: an overlapping run would build on the same last
+        snapshot and count its deltas twice.
+        """
+        with transaction.atomic():
+            _lock_snapshots()
+            return self._snapshot()
+
+    def _snapshot(self):
+        through = (
+            TokenTransaction.objects.filter(created_at__lt=timezone.now() - SNAPSHOT_LAG)
+            .aggregate(through=Max('id'))['through']
+        )
+        last = TokenBalanceSnapshot.objects.aggregate(last=Max('through_transaction'))['last'] or 0
+        if through is None or through <= last:
+            return 0
+
+        deltas = dict(
+            TokenTransaction.objects.filter(id__gt=last, id__lte=through)
+            .order_by().values('user_id').annotate(delta=Sum('amount'))
+            .values_list('user_id', 'delta')
+        )
+        user_ids = list(deltas)
+        created  = 0
+        for start in range(0, len(user_ids), USER_CHUNK):
+            chunk = user_ids[start:start + USER_CHUNK]
+            previous = dict(
+                User.objects.filter(pk__in=chunk)
+                .annotate(previous=Coalesce(_latest_snapshot(OuterRef('pk'), 'balance'), Value(0)))
+                .values_list('pk', 'previous')
+            )
+            TokenBalanceSnapshot.objects.bulk_create(
+                TokenBalanceSnapshot(user_id=user_id, balance=previous[user_id] + deltas[user_id], through_transaction=through)
+                for user_id in chunk
+            )
+            created += len(chunk)
+        return created
+
+    def recompute(self, user_ids):
+        """{user_id: balance} from each user's latest snapshot plus the transactions after it"""
+        tail = (
+            TokenTransaction.objects.filter(
+                user=OuterRef('pk'),
+                id__gt=Coalesce(_latest_snapshot(OuterRef(OuterRef('pk')), 'through_transaction'), Value(0)),
+            )
+            .order_by().values('user').annotate(total=Sum('amount')).values('total')
+        )
+        return dict(
+            User.objects.filter(pk__in=user_ids)
+            .annotate(
+                base=Coalesce(_latest_snapshot(OuterRef('pk'), 'balance'), Value(0)),
+                tail=Coalesce(Subquery(tail, output_field=IntegerField()), Value(0)),
+            )
+            .annotate(computed=F('base') + F('tail'))
+            .values_list('pk', 'computed')
+        )
+
+    def reconcile(self, user_ids=None):
+        """Reset stored balances that drifted from the ledger; returns how many were fixed"""
+        if user_ids is None:
+            user_ids = User.objects.values_list('pk', flat=True)
+        user_ids = list(user_ids)
+
+        fixed = 0
+        for start in range(0, len(user_ids), USER_CHUNK):
+            chunk    = user_ids[start:start + USER_CHUNK]
+            computed = self.recompute(chunk)
+            stored   = dict(User.objects.filter(pk__in=chunk).values_list('pk', 'tokens'))
+            balances = dict(TokenBalance.objects.filter(user_id__in=chunk).values_list('user_id', 'balance'))
+            drifted  = {
+                user_id: balance for user_id, balance in computed.items()
+                if stored.get(user_id) != balance or balances.get(user_id, 0) != balance
+            }
+            if not drifted:
+                continue
+
+            logger.warning(f"Token balances drifted for {len(drifted)} users, resetting from the ledger")
+            with transaction.atomic():
+                TokenBalance.objects.bulk_create(
+                    (TokenBalance(user_id=user_id) for user_id in drifted),
+                    ignore_conflicts=True,
+                )
+                TokenBalance.objects.filter(user_id__in=drifted).update(balance=self._value('user_id', drifted))
+                User.objects.filter(pk__in=drifted).update(tokens=self._value('pk', drifted))
+            fixed += len(drifted)
+        return fixed
+
+    def _value(self, field, values):
+        return Case(
+            *(When(**{field: user_id}, then=Value(value)) for user_id, value in values.items()),
+            output_field=IntegerField(),
+        )
+
+
+ledger = TokenLedger()
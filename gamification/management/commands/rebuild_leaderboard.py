@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from gamification.leaderboard import leaderboard
+
+
+class Command(BaseCommand):
+    help = "Repopulate the all-time, weekly and daily token leaderboards from TokenTransaction."
+
+    def handle(self, *args, **options):
+        counts = leaderboard.rebuild()
+        if counts is None:
+            self.stdout.write(self.style.WARNING("Another leaderboard rebuild is running; nothing done"))
+            return
+        summary = ', '.join(f"{window}: {count}" for window, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt leaderboards ({summary} users ranked)"))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from gamification.ledger import ledger
+
+
+class Command(BaseCommand):
+    help = "Snapshot token balances that changed since the last snapshot (run periodically)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reconcile', action='store_true',
+            help='Afterwards, reset stored balances that drifted from the ledger',
+        )
+
+    def handle(self, *args, **options):
+        snapshotted = ledger.snapshot()
+        self.stdout.write(self.style.SUCCESS(f"Snapshotted {snapshotted} token balances"))
+
+        if options['reconcile']:
+            fixed = ledger.reconcile()
+            self.stdout.write(self.style.SUCCESS(f"Reconciled {fixed} drifted token balances"))
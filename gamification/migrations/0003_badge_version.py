@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0002_achievementlog_tokenbalance_tokentransaction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='badge',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='badge',
+            name='condition_code',
+            field=models.TextField(help_text="Rule over pods, public_pods, battles_won and tokens, e.g. 'pods >= 10 and battles_won >= 3'"),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def merge_token_balances(apps, schema_editor):
+    """
+    Battle wins were only ever added to User.tokens, without a ledger entry.
+    Record them as a carried-over transaction, then set both balances to
+    the ledger total.
+    """
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    TokenTransaction = apps.get_model('gamification', 'TokenTransaction')
+    TokenBalance = apps.get_model('gamification', 'TokenBalance')
+
+    TokenTransaction.objects.bulk_create(
+        TokenTransaction(user_id=user_id, amount=tokens, reason="Carried over")
+        for user_id, tokens in User.objects.exclude(tokens=0).values_list('pk', 'tokens')
+    )
+
+    totals = (
+        TokenTransaction.objects.filter(user=OuterRef('user'))
+        .order_by()
+        .values('user')
+        .annotate(total=Sum('amount'))
+        .values('total')
+    )
+    TokenBalance.objects.bulk_create(
+        (TokenBalance(user_id=user_id) for user_id in TokenTransaction.objects.values_list('user', flat=True).distinct()),
+        ignore_conflicts=True,
+    )
+    TokenBalance.objects.update(balance=Coalesce(Subquery(totals, output_field=IntegerField()), 0))
+    User.objects.update(tokens=Coalesce(
+        Subquery(TokenBalance.objects.filter(user=OuterRef('pk')).values('balance')[:1]),
+        0,
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0003_badge_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.IntegerField()),
+                ('through_transaction', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='token_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-through_transaction'], name='token_snapshot_user_idx')],
+            },
+        ),
+        migrations.RunPython(merge_token_balances, migrations.RunPython.noop),
+    ]
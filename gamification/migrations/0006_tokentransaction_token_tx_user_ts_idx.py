@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0005_token_transaction_reference'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tokentransaction',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='token_tx_user_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:12
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def dedupe_achievements(apps, schema_editor):
+    """Racing evaluations could award a badge twice; keep each user's first award"""
+    AchievementLog = apps.get_model('gamification', 'AchievementLog')
+    first = (
+        AchievementLog.objects.order_by()
+        .values('user', 'badge')
+        .annotate(first=Min('id'))
+        .values('first')
+    )
+    AchievementLog.objects.exclude(pk__in=first).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0006_tokentransaction_token_tx_user_ts_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_achievements, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='achievementlog',
+            constraint=models.UniqueConstraint(fields=('user', 'badge'), name='achievement_log_user_badge_uniq'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:40
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def dedupe_snapshots(apps, schema_editor):
+    """Overlapping runs could snapshot a range twice; keep the first of each"""
+    TokenBalanceSnapshot = apps.get_model('gamification', 'TokenBalanceSnapshot')
+    first = (
+        TokenBalanceSnapshot.objects.order_by()
+        .values('user', 'through_transaction')
+        .annotate(first=Min('id'))
+        .values('first')
+    )
+    TokenBalanceSnapshot.objects.exclude(pk__in=first).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0007_achievementlog_user_badge_uniq'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_snapshots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='tokenbalancesnapshot',
+            constraint=models.UniqueConstraint(fields=('user', 'through_transaction'), name='token_snapshot_user_through_uniq'),
+        ),
+    ]
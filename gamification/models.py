@@ -1,4 +1,6 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -9,28 +11,84 @@ class Badge(models.Model):
     name           = models.CharField(max_length=100)
     description    = models.TextField()
     icon           = models.ImageField(upload_to='badges/')
-    condition_code = models.TextField()
+    condition_code = models.TextField(help_text="Rule over pods, public_pods, battles_won and tokens, e.g. 'pods >= 10 and battles_won >= 3'")
+    version        = models.PositiveIntegerField(default=1, editable=False)
+
+    def clean(self):
+        from .rules import Rule, RuleError
+        try:
+            Rule(self.condition_code)
+        except RuleError as e:
+            raise ValidationError({'condition_code': str(e)})
+
+    def save(self, *args, **kwargs):
+        # Compiled rules are cached per version
+        if self.pk is not None:
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.name
 
 class AchievementLog(models.Model):
     user           = models.ForeignKey(User, on_delete=models.CASCADE)
     badge          = models.ForeignKey(Badge, on_delete=models.CASCADE)
     created_at     = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            # Concurrent evaluations may both decide to award a badge; only one row lands
+            models.UniqueConstraint(fields=['user', 'badge'], name='achievement_log_user_badge_uniq'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.badge.name}"
 
 class TokenTransaction(models.Model):
+    """Append-only token ledger; write through gamification.ledger, never update or delete"""
     user           = models.ForeignKey(User, on_delete=models.CASCADE)
     amount         = models.IntegerField()
     reason         = models.CharField(max_length=100)
+    reference      = models.CharField(max_length=100, null=True, blank=True) # What it pays for, e.g. 'pod:42'; at most once
     created_at     = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['reference'], condition=Q(reference__isnull=False), name='token_transaction_reference_uniq'),
+        ]
+        indexes = [
+            # A user's transactions newest first (pods.timeline, transaction list)
+            models.Index(fields=['user', 'created_at', 'id'], name='token_tx_user_ts_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.amount} - {self.reason}"
 
 class TokenBalance(models.Model):
+    """Running sum of a user's TokenTransactions, kept by gamification.ledger"""
     user           = models.OneToOneField(User, on_delete=models.CASCADE)
     balance        = models.IntegerField(default=0)
 
     def __str__(self):
         return f"{self.user.username} - {self.balance}"
+
+class TokenBalanceSnapshot(models.Model):
+    """A user's balance including every transaction up to `through_transaction`"""
+    user                = models.ForeignKey(User, related_name='token_snapshots', on_delete=models.CASCADE)
+    balance             = models.IntegerField()
+    through_transaction = models.BigIntegerField()
+    created_at          = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # A second snapshot of the same range would be counted on top of the first
+            models.UniqueConstraint(fields=['user', 'through_transaction'], name='token_snapshot_user_through_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-through_transaction'], name='token_snapshot_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.balance} @ {self.through_transaction}"
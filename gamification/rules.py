@@ -0,0 +1,142 @@
+import ast
+import operator
+
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from battles.models import Battle
+from pods.models import Pod
+from .models import TokenBalance
+
+# Events a rule can depend on
+POD_CREATED    = 'pod_created'
+BATTLE_WON     = 'battle_won'
+TOKENS_CHANGED = 'tokens_changed'
+
+
+class RuleError(ValueError):
+    """A badge condition that is not valid in the rule language"""
+
+
+def _count(queryset, user_field):
+    counts = (
+        queryset.filter(**{user_field: OuterRef('pk')})
+        .order_by()
+        .values(user_field)
+        .annotate(n=Count('pk'))
+        .values('n')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+class Metric:
+    """A per-user number rules can refer to, and the events that change it"""
+
+    def __init__(self, events, expression):
+        self.events     = frozenset(events)
+        self.expression = expression # () -> expression annotated on User
+
+
+METRICS = {
+    'pods':        Metric({POD_CREATED}, lambda: _count(Pod.objects.all(), 'user')),
+    'public_pods': Metric({POD_CREATED}, lambda: _count(Pod.objects.filter(is_public=True), 'user')),
+    'battles_won': Metric({BATTLE_WON}, lambda: _count(Battle.objects.all(), 'winner__user')),
+    'tokens':      Metric({TOKENS_CHANGED}, lambda: Coalesce(
+        Subquery(TokenBalance.objects.filter(user=OuterRef('pk')).values('balance')[:1]),
+        Value(0),
+    )),
+}
+
+COMPARISONS = {
+    ast.Eq: operator.eq, ast.NotEq: operator.ne,
+    ast.Lt: operator.lt, ast.LtE: operator.le,
+    ast.Gt: operator.gt, ast.GtE: operator.ge,
+}
+ARITHMETIC = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul}
+
+
+class Rule:
+    """
+    A compiled badge condition.
+
+    Conditions are boolean expressions over the metrics in METRICS, e.g.
+    ``pods >= 10 and (battles_won >= 3 or tokens > 500)``. Comparisons
+    (chained too), ``and``/``or``/``not``, ``+ - *``, integer literals and
+    parentheses are allowed; anything else is rejected at compile time, so
+    evaluating a rule never runs arbitrary code.
+    """
+
+    def __init__(self, source):
+        self.source  = source
+        self.metrics = set()
+        try:
+            tree = ast.parse(source.strip(), mode='eval')
+        except SyntaxError as e:
+            raise RuleError(f"Invalid condition: {e.msg}") from e
+        self.test   = self._compile(tree.body)
+        self.events = frozenset().union(*(METRICS[name].events for name in self.metrics))
+
+    def __call__(self, values):
+        return bool(self.test(values))
+
+    def _compile(self, node):
+        if isinstance(node, ast.BoolOp):
+            parts = [self._compile(value) for value in node.values]
+            if isinstance(node.op, ast.And):
+                if len(parts) == 2:
+                    first, second = parts
+                    return lambda v: first(v) and second(v)
+                return lambda v: all(part(v) for part in parts)
+            if len(parts) == 2:
+                first, second = parts
+                return lambda v: first(v) or second(v)
+            return lambda v: any(part(v) for part in parts)
+
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.USub)):
+            operand = self._compile(node.operand)
+            if isinstance(node.op, ast.Not):
+                return lambda v: not operand(v)
+            return lambda v: -operand(v)
+
+        if isinstance(node, ast.Compare):
+            operands = [self._compile(node.left)] + [self._compile(c) for c in node.comparators]
+            ops = []
+            for op in node.ops:
+                if type(op) not in COMPARISONS:
+                    raise RuleError(f"Unsupported comparison: {type(op).__name__}")
+                ops.append(COMPARISONS[type(op)])
+
+            if len(ops) == 1:
+                # The common case, `metric >= n`, without the chaining loop
+                op, (left, right) = ops[0], operands
+                if isinstance(node.comparators[0], ast.Constant):
+                    constant = node.comparators[0].value
+                    return lambda v: op(left(v), constant)
+                return lambda v: op(left(v), right(v))
+
+            def compare(v):
+                left = operands[0](v)
+                for op, operand in zip(ops, operands[1:]):
+                    right = operand(v)
+                    if not op(left, right):
+                        return False
+                    left = right
+                return True
+            return compare
+
+        if isinstance(node, ast.BinOp) and type(node.op) in ARITHMETIC:
+            op, left, right = ARITHMETIC[type(node.op)], self._compile(node.left), self._compile(node.right)
+            return lambda v: op(left(v), right(v))
+
+        if isinstance(node, ast.Name):
+            if node.id not in METRICS:
+                raise RuleError(f"Unknown metric '{node.id}'")
+            self.metrics.add(node.id)
+            name = node.id
+            return lambda v: v[name]
+
+        if isinstance(node, ast.Constant) and type(node.value) in (int, bool):
+            value = node.value
+            return lambda v: value
+
+        raise RuleError(f"Unsupported expression: {type(node).__name__}")
@@ -1,39 +1,37 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from battles.models import Battle
+from outbox.events import subscriber
 from pods.models import Pod
-from .models import TokenTransaction, TokenBalance, Badge, AchievementLog
+from thoughty.cache import invalidate_on_commit
+from .badges import badge_engine
+from .ledger import ledger
+from .models import Badge
+from .rules import BATTLE_WON, POD_CREATED
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
-@receiver(post_save, sender=Pod)
-def handle_pod_creation(sender, instance, created, **kwargs):
-    if created:
-        # Award tokens for pod creation
-        TokenTransaction.objects.create(
-            user=instance.user,
-            amount=10,
-            reason="Pod Creation"
-        )
-        # Update balance
-        balance, _ = TokenBalance.objects.get_or_create(user=instance.user)
-        balance.balance += 10
-        balance.save()
-        
-        # Evaluate badges
-        evaluate_badges(instance.user)
+@subscriber('pod.created')
+def handle_pod_creation(event):
+    # Award tokens for pod creation, once per pod however often the event is delivered
+    ledger.credit(event['user_id'], 10, "Pod Creation", reference=f"pod:{event['pod_id']}:created")
 
-def evaluate_badges(user):
-    """Evaluate all badge conditions for a user"""
-    for badge in Badge.objects.all():
-        # Skip if user already has this badge
-        if AchievementLog.objects.filter(user=user, badge=badge).exists():
-            continue
-            
-        # Evaluate condition_code (this is a placeholder - you'll need to implement
-        # proper evaluation logic based on your condition_code format)
-        try:
-            if eval(badge.condition_code):
-                AchievementLog.objects.create(user=user, badge=badge)
-        except:
-            pass  # Handle evaluation errors gracefully
\ No newline at end of file
+    # Evaluate the badges a new pod can unlock
+    badge_engine.evaluate_many([event['user_id']], POD_CREATED)
+
+@receiver(post_save, sender=Battle)
+def handle_battle_won(sender, instance, update_fields=None, **kwargs):
+    if instance.winner_id is None:
+        return
+    if update_fields is not None and 'winner' not in update_fields:
+        return
+    winner = Pod.objects.filter(pk=instance.winner_id).values_list('user_id', flat=True).first()
+    if winner is not None:
+        badge_engine.evaluate_many([winner], BATTLE_WON)
+
+@receiver(post_save, sender=Badge)
+@receiver(post_delete, sender=Badge)
+def invalidate_badge_rules(sender, instance, **kwargs):
+    badge_engine.rulebook.invalidate()
+    invalidate_on_commit(f'badge:{instance.pk}', 'badges')
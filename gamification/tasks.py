@@ -0,0 +1,6 @@
+from celery import shared_task
+
+@shared_task
+def snapshot_token_balances():
+    from .ledger import ledger
+    ledger.snapshot()
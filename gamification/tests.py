@@ -1,3 +1,227 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import IntegrityError
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from pods.models import Pod
+from users.models import User
+from .badges import BadgeEngine
+from .checks import check_badge_conditions
+from .leaderboard import Leaderboard, LocalSortedSets
+from .ledger import TokenLedger, ledger
+from .models import AchievementLog, Badge, TokenBalanceSnapshot, TokenTransaction
+from .rules import BATTLE_WON, POD_CREATED, Rule, RuleError
+
+
+class BadgeRuleTests(TestCase):
+    """Badge conditions are compiled from a small rule language and awarded once"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='badged', email='badged@thoughty.io')
+        for i in range(3):
+            Pod.objects.create(user=cls.user, title=f'Pod {i}', content='Content', is_public=bool(i))
+
+    def test_rules(self):
+        rule = Rule('pods >= 3 and (public_pods == 2 or tokens > 500)')
+        self.assertEqual(rule.metrics, {'pods', 'public_pods', 'tokens'})
+        self.assertTrue(rule({'pods': 3, 'public_pods': 2, 'tokens': 0}))
+        self.assertFalse(rule({'pods': 3, 'public_pods': 1, 'tokens': 500}))
+        self.assertTrue(Rule('1 < pods * 2 <= 6')({'pods': 3}))
+
+    def test_rejects_code(self):
+        for source in ("__import__('os').system('true')", 'pods.__class__', 'logins > 3', 'pods >'):
+            with self.assertRaises(RuleError):
+                Rule(source)
+
+    def test_awarded_once(self):
+        badge = Badge.objects.create(name='Prolific', description='Two public pods', condition_code='public_pods >= 2')
+        engine = BadgeEngine()
+        self.assertEqual(engine.evaluate(self.user, POD_CREATED), 1)
+        self.assertEqual(engine.evaluate(self.user), 0)
+        self.assertEqual(engine.evaluate(self.user, BATTLE_WON), 0) # The rule doesn't depend on it
+        self.assertEqual(list(AchievementLog.objects.filter(user=self.user).values_list('badge', flat=True)), [badge.pk])
+
+    def test_racing_award_lands_once(self):
+        badge = Badge.objects.create(name='Prolific', description='Two public pods', condition_code='public_pods >= 2')
+        AchievementLog.objects.create(user=self.user, badge=badge)
+        # As if a concurrent evaluation awarded it after this one read the earned badges
+        with mock.patch.object(AchievementLog.objects, 'filter', return_value=AchievementLog.objects.none()):
+            BadgeEngine().evaluate(self.user, POD_CREATED)
+        self.assertEqual(AchievementLog.objects.filter(user=self.user, badge=badge).count(), 1)
+
+    def test_metrics_only_for_the_given_users(self):
+        other = User.objects.create_user(username='unbadged', email='unbadged@thoughty.io')
+        values = BadgeEngine().fetch_metrics([self.user.pk], ['pods', 'public_pods'])
+        self.assertEqual(values, {self.user.pk: {'pods': 3, 'public_pods': 2}})
+        self.assertNotIn(other.pk, values)
+
+    def test_invalid_conditions_are_reported(self):
+        # Saved before conditions were validated, when they were eval'd
+        badge = Badge.objects.create(name='Legacy', description='Old style', condition_code="user.pods.count() > 3")
+        self.assertEqual(check_badge_conditions(None), [])
+        warnings = check_badge_conditions(None, databases=['default'])
+        self.assertEqual([(w.id, w.obj) for w in warnings], [('gamification.W001', f'Badge {badge.pk}')])
+
+
+class LeaderboardLoadTests(TestCase):
+    """A ranking is only served once it was rebuilt from the ledger, never from partial deltas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(username=f'ranked{i}', email=f'ranked{i}@thoughty.io') for i in range(3)]
+        for user, amount in zip(cls.users, (100, 50, 5)):
+            TokenTransaction.objects.create(user=user, amount=amount, reason='Test')
+
+    def test_first_record_rebuilds(self):
+        board = Leaderboard(LocalSortedSets())
+        # The last user's committed transaction arrives first: it must not become the whole ranking
+        board.record(self.users[2].pk, 5)
+        self.assertEqual([entry['score'] for entry in board.top()], [100, 50, 5])
+
+        board.record(self.users[2].pk, 60)
+        self.assertEqual(board.rank(self.users[2].pk)['rank'], 2)
+
+    def test_flushed_store_rebuilds(self):
+        board = Leaderboard(LocalSortedSets())
+        board.rebuild()
+        board._store = LocalSortedSets() # As after FLUSHDB
+        board.record(self.users[1].pk, 5)
+        self.assertEqual(board.rank(self.users[0].pk), {'rank': 1, 'user_id': self.users[0].pk, 'score': 100})
+
+    def test_changes_during_rebuild_are_replayed(self):
+        board   = Leaderboard(LocalSortedSets())
+        summed  = TokenTransaction.objects.get(user=self.users[2])
+        # An id below the newest one whose transaction the sums don't see, as if it committed after them
+        unseen  = TokenTransaction.objects.create(user=self.users[2], amount=70, reason='During rebuild')
+        unseen.delete()
+        TokenTransaction.objects.create(user=self.users[1], amount=0, reason='Test')
+        replace = board.store.replace
+
+        def replace_racing(key, scores, timeout=None):
+            if key == 'leaderboard:all':
+                board.record(self.users[2].pk, 70, timezone.now(), unseen.pk)
+                board.record(summed.user_id, summed.amount, summed.created_at, summed.pk) # Already summed
+            replace(key, scores, timeout)
+
+        with mock.patch.object(board.store, 'replace', replace_racing):
+            board.rebuild()
+        self.assertEqual(board.rank(self.users[2].pk), {'rank': 2, 'user_id': self.users[2].pk, 'score': 75})
+        self.assertEqual(board.rank(self.users[2].pk, 'day')['score'], 75)
+
+    def test_changes_as_the_rebuild_ends_are_applied(self):
+        board = Leaderboard(LocalSortedSets())
+        clear_and_drain = board.store.clear_and_drain
+
+        def clear_and_drain_racing(flag, key):
+            board.record(self.users[2].pk, 40) # Still queued: drained with the flag
+            pending = clear_and_drain(flag, key)
+            board.record(self.users[2].pk, 30) # The flag is gone: applied directly
+            return pending
+
+        with mock.patch.object(board.store, 'clear_and_drain', clear_and_drain_racing):
+            board.rebuild()
+        self.assertEqual(board.rank(self.users[2].pk), {'rank': 2, 'user_id': self.users[2].pk, 'score': 75})
+        self.assertFalse(board.store.flag('leaderboard:rebuilding'))
+
+    def test_one_rebuild_at_a_time(self):
+        board = Leaderboard(LocalSortedSets())
+        board.store.add_flag('leaderboard:rebuild-lock') # Another process is rebuilding
+        with mock.patch.object(board, '_rebuild') as rebuild:
+            self.assertIsNone(board.rebuild())
+            self.assertEqual(board.top(), []) # Served from the store meanwhile
+        rebuild.assert_not_called()
+
+        board.store.clear_flag('leaderboard:rebuild-lock')
+        self.assertEqual([entry['score'] for entry in board.top()], [100, 50, 5])
+        self.assertFalse(board.store.flag('leaderboard:rebuild-lock'))
+
+    def test_past_windows_are_evicted(self):
+        store = LocalSortedSets()
+        store.incr('leaderboard:day:20261017', 1, 5)
+        store.expire('leaderboard:day:20261017', 0)
+        store.incr('leaderboard:day:20261018', 1, 5) # The next day's set
+        self.assertEqual(list(store._sets), ['leaderboard:day:20261018'])
+
+    def test_views(self):
+        client = APIClient()
+        client.force_authenticate(self.users[1])
+        with mock.patch('gamification.views.leaderboard', Leaderboard(LocalSortedSets())):
+            # The original route keeps its original shape
+            response = client.get('/api/gamification/leaderboard/')
+            self.assertEqual(response.json(), [
+                {'username': 'ranked0', 'balance': 100}, {'username': 'ranked1', 'balance': 50}, {'username': 'ranked2', 'balance': 5},
+            ])
+            response = client.get('/api/gamification/leaderboard/ranking/?window=week&limit=2')
+            self.assertEqual([entry['username'] for entry in response.json()['results']], ['ranked0', 'ranked1'])
+            self.assertEqual(response.json()['me']['rank'], 2)
+
+
+class TokenLedgerTests(TestCase):
+    """Balances move with the ledger only, once per reference, and can be rebuilt from it"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(username=f'ledger{i}', email=f'ledger{i}@thoughty.io') for i in range(2)]
+
+    def assertBalance(self, user, balance):
+        self.assertEqual(ledger.balance(user), balance)
+        self.assertEqual(User.objects.get(pk=user.pk).tokens, balance)
+
+    def test_racing_references_apply_once(self):
+        ledger.credit(self.users[0], 10, 'Pod Creation', reference='pod:1:created')
+        unapplied = TokenLedger._unapplied
+        checks    = []
+
+        def checked_too_early(self, entries):
+            # The first check ran before the other credit committed
+            checks.append(entries)
+            return list(entries) if len(checks) == 1 else unapplied(self, entries)
+
+        with mock.patch.object(TokenLedger, '_unapplied', checked_too_early):
+            transactions = ledger.apply_many([
+                (self.users[0].pk, 10, 'Pod Creation', 'pod:1:created'),
+                (self.users[1].pk, 5, 'Pod Creation', 'pod:2:created'),
+            ])
+        self.assertEqual([t.reference for t in transactions], ['pod:2:created'])
+        self.assertBalance(self.users[0], 10)
+        self.assertBalance(self.users[1], 5)
+
+    def test_references_apply_once(self):
+        ledger.credit(self.users[0], 10, 'Pod Creation', reference='pod:1:created')
+        self.assertIsNone(ledger.credit(self.users[0], 10, 'Pod Creation', reference='pod:1:created'))
+        ledger.credit(self.users[0], -3, 'Spend')
+        self.assertBalance(self.users[0], 7)
+
+    def test_batch(self):
+        with self.assertNumQueries(6): # Savepoint, transactions, balance rows, two balance updates, release
+            with ledger.batch():
+                ledger.credit(self.users[0], 5, 'Award')
+                ledger.credit(self.users[1], 7, 'Award')
+                ledger.credit(self.users[0], 1, 'Award')
+        self.assertBalance(self.users[0], 6)
+        self.assertBalance(self.users[1], 7)
+
+    def test_snapshot_and_reconcile(self):
+        ledger.credit(self.users[0], 20, 'Award')
+        with mock.patch('gamification.ledger.SNAPSHOT_LAG', timedelta(0)):
+            self.assertEqual(ledger.snapshot(), 1)
+        ledger.credit(self.users[0], 5, 'Award')
+        self.assertEqual(ledger.recompute([self.users[0].pk]), {self.users[0].pk: 25})
+
+        User.objects.filter(pk=self.users[0].pk).update(tokens=999) # Drifted
+        self.assertEqual(ledger.reconcile([self.users[0].pk]), 1)
+        self.assertBalance(self.users[0], 25)
 
-# Create your tests here.
+    def test_overlapping_snapshot_fails(self):
+        ledger.credit(self.users[0], 20, 'Award')
+        with mock.patch('gamification.ledger.SNAPSHOT_LAG', timedelta(0)):
+            ledger.snapshot()
+            # A run that read the same last snapshot before the first committed
+            with mock.patch.object(TokenBalanceSnapshot.objects, 'aggregate', return_value={'last': None}):
+                with self.assertRaises(IntegrityError):
+                    ledger.snapshot()
+        self.assertEqual(ledger.recompute([self.users[0].pk]), {self.users[0].pk: 20})
@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import BadgeListView, LeaderboardView, TransactionListView
+from .views import BadgeListView, LeaderboardView, LeaderboardRankingView, LeaderboardAroundMeView, TransactionListView
 
 urlpatterns = [
     path('badges/', BadgeListView.as_view(), name='badge-list'),
     path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
+    path('leaderboard/ranking/', LeaderboardRankingView.as_view(), name='leaderboard-ranking'),
+    path('leaderboard/me/', LeaderboardAroundMeView.as_view(), name='leaderboard-me'),
     path('transactions/', TransactionListView.as_view(), name='transaction-list'),
 ] 
\ No newline at end of file
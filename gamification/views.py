@@ -3,8 +3,11 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth import get_user_model
-from .models import Badge, AchievementLog, TokenTransaction, TokenBalance
+from .models import Badge, AchievementLog, TokenTransaction
 from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from .leaderboard import WINDOWS, leaderboard
+from thoughty.cache import CachedResponseMixin
 
 User = get_user_model()
 
@@ -21,8 +24,10 @@ class BadgeSerializer(serializers.ModelSerializer):
             return AchievementLog.objects.filter(user=request.user, badge=obj).exists()
         return False
 
-class BadgeListView(APIView):
+class BadgeListView(CachedResponseMixin, APIView):
     permission_classes = [IsAuthenticated]
+    cache_per_user     = True
+    cache_tags         = {'get': ['badges', 'user:{user}:badges']}
 
     def get(self, request):
         earned_only = request.query_params.get('earned', '').lower() == 'true'
@@ -36,14 +41,62 @@ class BadgeListView(APIView):
         return Response(serializer.data)
 
 class LeaderboardView(APIView):
+    """
+    Top 10 users by token balance, as [{username, balance}].
+    Kept in this shape for existing clients; LeaderboardRankingView adds
+    windows, limits and the requesting user's rank.
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        top_users = TokenBalance.objects.select_related('user').order_by('-balance')[:10]
         return Response([{
-            'username': balance.user.username,
-            'balance': balance.balance
-        } for balance in top_users])
+            'username': entry['username'],
+            'balance': entry['score']
+        } for entry in leaderboard.top('all', 10)])
+
+class LeaderboardRankingView(APIView):
+    """
+    Top users by tokens earned, plus the requesting user's own rank.
+    ?window=all|week|day (default all), ?limit=N (default 10, max 100)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        window = _get_window(request)
+        limit  = _bounded_int(request.query_params.get('limit'), default=10, maximum=100)
+        return Response({
+            'window': window,
+            'results': leaderboard.top(window, limit),
+            'me': leaderboard.rank(request.user.pk, window),
+        })
+
+class LeaderboardAroundMeView(APIView):
+    """
+    The requesting user and up to `radius` users above and below them.
+    ?window=all|week|day (default all), ?radius=N (default 10, max 50)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        window = _get_window(request)
+        radius = _bounded_int(request.query_params.get('radius'), default=10, maximum=50)
+        return Response({
+            'window': window,
+            'me': leaderboard.rank(request.user.pk, window),
+            'results': leaderboard.around(request.user.pk, window, radius),
+        })
+
+def _get_window(request):
+    window = request.query_params.get('window', 'all')
+    if window not in WINDOWS:
+        raise ValidationError({'window': f"Must be one of: {', '.join(WINDOWS)}"})
+    return window
+
+def _bounded_int(value, default, maximum):
+    try:
+        return min(max(int(value), 1), maximum)
+    except (TypeError, ValueError):
+        return default
 
 class TransactionListView(APIView):
     permission_classes = [IsAuthenticated]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mentor', '0001_initial'),
+        ('pods', '0005_podstagehistory_pod_history_pod_ts_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='insight',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='insight_user_ts_idx'),
+        ),
+    ]
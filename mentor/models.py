@@ -18,6 +18,12 @@ class Insight(models.Model):
     type = models.CharField(max_length=20, choices=INSIGHT_TYPES)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # A user's insights newest first (pods.timeline)
+            models.Index(fields=['user', 'created_at', 'id'], name='insight_user_ts_idx'),
+        ]
+
     def __str__(self):
         return f'{self.type} for {self.user.username}'
 
@@ -1,9 +1,7 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-from pods.models import Pod
+from outbox.events import subscriber
 from .tasks import analyze_pod_for_insights
 
-@receiver(post_save, sender=Pod)
-def handle_new_pod(sender, instance, created, **kwargs):
-    if created:
-        analyze_pod_for_insights.delay(instance.id)
\ No newline at end of file
+@subscriber('pod.created')
+def handle_new_pod(event):
+    # Already off the request path: run inline instead of another broker hop
+    analyze_pod_for_insights(event['pod_id'])
@@ -10,6 +10,10 @@ def analyze_pod_for_insights(pod_id):
         pod = Pod.objects.get(id=pod_id)
         text = pod.content.lower()
 
+        # Safe to deliver twice: one reflection per pod
+        if Insight.objects.filter(pod=pod, type='reflection').exists():
+            return
+
         sample_insight = "What triggered this line of thinking?"
         Insight.objects.create(user=pod.user, pod=pod, text=sample_insight, type='reflection')
 
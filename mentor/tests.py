@@ -1,3 +1,30 @@
 from django.test import TestCase
 
-# Create your tests here.
+from outbox.events import Dispatcher
+from outbox.models import OutboxEvent
+from pods.models import Pod
+from users.models import User
+from .models import Insight
+from .tasks import generate_insights_for_user
+
+
+class PodReflectionTests(TestCase):
+    """A new pod gets one reflection insight, however often it is analyzed"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='mentee', email='mentee@thoughty.io')
+        self.pod  = Pod.objects.create(user=self.user, title='Pod', content='Content')
+        Dispatcher().drain()
+
+    def test_new_pod(self):
+        # Delivered through the outbox (mentor.signals is connected in MentorConfig.ready)
+        self.assertEqual(Insight.objects.filter(pod=self.pod, type='reflection').count(), 1)
+
+    def test_redelivery(self):
+        OutboxEvent.objects.filter(topic='pod.created', payload__pod_id=self.pod.pk).update(dispatched_at=None, delivered=[])
+        Dispatcher().drain()
+        self.assertEqual(Insight.objects.filter(pod=self.pod, type='reflection').count(), 1)
+
+    def test_insights_for_user_skip_reflected_pods(self):
+        generate_insights_for_user(self.user.pk)
+        self.assertEqual(Insight.objects.filter(pod=self.pod, type='reflection').count(), 1)
@@ -0,0 +1,91 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification
+from .services import deliver
+
+logger = logging.getLogger(__name__)
+
+USER_CHUNK   = 1000 # Recipients per digest transaction
+DIGEST_ITEMS = 20   # Notifications listed in one digest; the rest only count toward the summary
+# Digested rows only dedupe redelivered events (their reference); outbox retries end well before this
+DIGESTED_RETENTION = timedelta(days=7)
+
+Kind = Notification.Kind
+
+# (singular, plural) phrasing per kind for the summary line
+PHRASES = {
+    Kind.VOTE_RESULT:    ("{n} battle you voted in has closed", "{n} battles you voted in have closed"),
+    Kind.BATTLE_VOTED:   ("{n} new vote on your battles", "{n} new votes on your battles"),
+    Kind.BATTLE_CREATED: ("{n} new battle with your pods", "{n} new battles with your pods"),
+    Kind.BATTLE_CLOSED:  ("{n} of your battles has closed", "{n} of your battles have closed"),
+}
+
+
+def send_digests():
+    """
+    Roll every user's pending notifications into one digest notification
+    per user. Runs as a periodic batch job, a chunk of users per
+    transaction: pending rows are read and marked digested in bulk and the
+    digests are inserted in bulk. Returns how many digests were sent.
+    """
+    Notification.objects.filter(digested_at__lt=timezone.now() - DIGESTED_RETENTION).delete()
+    recipients = list(
+        Notification.objects.filter(pending=True, digested_at__isnull=True)
+        .order_by().values_list('recipient_id', flat=True).distinct()
+    )
+    sent = 0
+    for start in range(0, len(recipients), USER_CHUNK):
+        sent += _send_chunk(recipients[start:start + USER_CHUNK])
+    if sent:
+        logger.info(f"Sent {sent} notification digests")
+    return sent
+
+
+def _send_chunk(recipients):
+    with transaction.atomic():
+        # Skip rows another digest run already holds
+        pending = list(
+            Notification.objects.select_for_update(skip_locked=True)
+            .filter(pending=True, digested_at__isnull=True, recipient_id__in=recipients)
+            .order_by('recipient_id', '-updated_at')
+        )
+        if not pending:
+            return 0
+
+        by_recipient = defaultdict(list)
+        for n in pending:
+            by_recipient[n.recipient_id].append(n)
+
+        digests = Notification.objects.bulk_create(
+            Notification(recipient_id=recipient_id, kind=Kind.DIGEST, data=render(notifications))
+            for recipient_id, notifications in by_recipient.items()
+        )
+        # Kept, not deleted: notify() dedupes a redelivered event on their references
+        Notification.objects.filter(pk__in=[n.pk for n in pending]).update(digested_at=timezone.now())
+        transaction.on_commit(lambda: deliver(digests))
+    return len(digests)
+
+
+def render(notifications):
+    """Digest data for one user's pending notifications, newest first"""
+    counts = defaultdict(int)
+    for n in notifications:
+        counts[n.kind] += n.count
+
+    parts = []
+    for kind, n in counts.items():
+        singular, plural = PHRASES.get(kind, ("{n} " + Kind(kind).label.lower(), "{n} " + Kind(kind).label.lower()))
+        parts.append((singular if n == 1 else plural).format(n=n))
+    return {
+        'summary': '; '.join(parts),
+        'total': sum(counts.values()),
+        'items': [
+            {'kind': n.kind, 'message': n.message, 'count': n.count, 'data': n.data, 'updated_at': n.updated_at}
+            for n in notifications[:DIGEST_ITEMS]
+        ],
+    }
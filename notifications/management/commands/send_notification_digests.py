@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from notifications.digests import send_digests
+
+
+class Command(BaseCommand):
+    help = "Roll each user's pending notifications into a single digest (run periodically)."
+
+    def handle(self, *args, **options):
+        sent = send_digests()
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} notification digests"))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:38
+
+import django.db.models.deletion
+import rest_framework.utils.encoders
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('battle_created', 'Battle created'), ('battle_voted', 'Battle voted on'), ('battle_closed', 'Battle closed')], max_length=20)),
+                ('reference', models.CharField(blank=True, max_length=100, null=True)),
+                ('data', models.JSONField(default=dict, encoder=rest_framework.utils.encoders.JSONEncoder)),
+                ('is_read', models.BooleanField(default=False)),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['recipient', 'is_read', 'created_at'], name='notification_unread_idx'), models.Index(fields=['recipient', 'created_at', 'id'], name='notification_feed_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('reference__isnull', False)), fields=('reference', 'recipient'), name='notification_reference_uniq')],
+            },
+        ),
+    ]
@@ -1,3 +1,79 @@
+from django.conf import settings
 from django.db import models
+from rest_framework.utils.encoders import JSONEncoder
 
 # Create your models here.
+
+class Notification(models.Model):
+    """
+    One alert for one user. Rows are written at event time for every
+    recipient (fan-out on write, see notifications.services), so reading a
+    feed or an unread badge never joins back to battles or votes.
+
+    Bursts of similar events roll up into one notification whose `count`
+    grows (see notifications.policies); `pending` ones wait for the next
+    digest and are never shown themselves. Once digested they are kept,
+    marked `digested_at`, so their `reference` still dedupes redelivered
+    events.
+    """
+
+    class Kind(models.TextChoices):
+        BATTLE_CREATED = 'battle_created', 'Battle created'
+        BATTLE_VOTED   = 'battle_voted', 'Battle voted on'
+        BATTLE_CLOSED  = 'battle_closed', 'Battle closed'
+        VOTE_RESULT    = 'vote_result', 'Battle you voted in closed'
+        DIGEST         = 'digest', 'Digest'
+
+    recipient  = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='notifications', on_delete=models.CASCADE)
+    actor      = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', on_delete=models.SET_NULL, null=True, blank=True)
+    kind       = models.CharField(max_length=20, choices=Kind.choices)
+    # Identifies the event, so a redelivered event notifies nobody twice
+    reference  = models.CharField(max_length=100, null=True, blank=True)
+    # Denormalized context (ids and titles) as of the latest event
+    data       = models.JSONField(default=dict, encoder=JSONEncoder)
+    # Events rolled into this notification, and what they had in common
+    count      = models.PositiveIntegerField(default=1)
+    group      = models.CharField(max_length=100, blank=True)
+    pending    = models.BooleanField(default=False)
+    digested_at = models.DateTimeField(null=True, blank=True) # Rolled into a digest; a pending row is done
+    is_read    = models.BooleanField(default=False)
+    read_at    = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True) # Latest event; orders the feed
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['reference', 'recipient'],
+                condition=models.Q(reference__isnull=False),
+                name='notification_reference_uniq',
+            ),
+        ]
+        indexes = [
+            # Unread feed and bulk mark-read; also backs a cold unread count
+            models.Index(fields=['recipient', 'is_read', 'created_at'], name='notification_unread_idx'),
+            # Keyset scan of the full feed
+            models.Index(fields=['recipient', 'updated_at', 'id'], name='notification_feed_idx'),
+            # What the digest job has left to send
+            models.Index(fields=['recipient'], condition=models.Q(pending=True, digested_at__isnull=True), name='notification_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for user {self.recipient_id}"
+
+    @property
+    def message(self):
+        """The notification as one line of text"""
+        data  = self.data
+        title = data.get('title', '')
+        if self.kind == self.Kind.BATTLE_CREATED:
+            return f"Your pod was entered in a battle: {title}"
+        if self.kind == self.Kind.BATTLE_VOTED:
+            return f"New vote on {title}" if self.count == 1 else f"{self.count} new votes on {title}"
+        if self.kind in (self.Kind.BATTLE_CLOSED, self.Kind.VOTE_RESULT):
+            if data.get('winner_title'):
+                return f"{title} is over: {data['winner_title']} won"
+            return f"{title} is over"
+        if self.kind == self.Kind.DIGEST:
+            return data.get('summary', '')
+        return self.get_kind_display()
@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from .models import Notification
+
+Kind = Notification.Kind
+
+
+class Policy:
+    """
+    How notifications of one kind are delivered.
+
+    `window`: a new event merges into the recipient's unread notification
+    of the same kind and group if that was last bumped within the window,
+    raising its count instead of adding a row (None: every event is its
+    own notification). `group`: the data fields that must match to merge.
+    `digest`: hold the notification back for the next periodic digest
+    (see notifications.digests) instead of delivering it now.
+    """
+
+    def __init__(self, window=None, group=(), digest=False):
+        self.window = window
+        self.group  = tuple(group)
+        self.digest = digest
+
+    def group_key(self, data):
+        return ':'.join(str(data.get(field)) for field in self.group)
+
+
+IMMEDIATE = Policy()
+
+POLICIES = {
+    Kind.BATTLE_CREATED: IMMEDIATE,
+    # "37 new votes on X" rather than 37 notifications
+    Kind.BATTLE_VOTED:   Policy(window=timedelta(hours=1), group=('battle_id',)),
+    Kind.BATTLE_CLOSED:  IMMEDIATE,
+    # Voters outnumber everyone else with a stake in a battle; they hear about results in bulk
+    Kind.VOTE_RESULT:    Policy(digest=True),
+}
+
+
+def policy_for(kind):
+    return POLICIES.get(kind, IMMEDIATE)
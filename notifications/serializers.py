@@ -0,0 +1,20 @@
+from rest_framework import serializers
+
+from .models import Notification
+
+class NotificationSerializer(serializers.ModelSerializer):
+    actor = serializers.CharField(source='actor.username', default=None, read_only=True)
+
+    class Meta:
+        model  = Notification
+        fields = ['id', 'kind', 'message', 'count', 'actor', 'data', 'is_read', 'read_at', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+class MarkReadSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=1000)
+    all = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if not data['all'] and not data.get('ids'):
+            raise serializers.ValidationError('Pass "ids" or "all": true.')
+        return data
@@ -0,0 +1,157 @@
+import logging
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from thoughty.realtime import hub, user_channel
+from .models import Notification
+from .policies import policy_for
+
+logger = logging.getLogger(__name__)
+
+UNREAD_KEY     = 'notifications:unread:{}'
+UNREAD_TTL     = 60 * 60 * 24 # A counter that drifted is rebuilt from the table at most a day later
+BATCH_SIZE     = 1000
+LOCK_NAMESPACE = 7301 # First key of the advisory locks taken while coalescing
+
+
+def notify(recipient_ids, kind, actor_id=None, reference=None, **data):
+    """
+    Notify each recipient (never the actor) of one `kind` event, as its
+    policy says (see notifications.policies). Recipients with a recent
+    unread notification of the same group get that one bumped; the rest
+    get a new row, written with batched inserts. Once committed, new rows
+    bump the cached unread counts and everything is pushed to the
+    recipients' live connections; digest kinds stay pending instead.
+
+    A `reference` makes the fan-out idempotent: recipients already
+    notified under it are skipped. (A bumped notification keeps its first
+    reference, so a redelivered event can over-count it.) Returns the
+    notifications created or bumped.
+    """
+    policy     = policy_for(kind)
+    recipients = set(recipient_ids)
+    recipients.discard(actor_id)
+    recipients.discard(None)
+    if reference is not None and recipients:
+        recipients -= set(
+            Notification.objects.filter(reference=reference, recipient_id__in=recipients)
+            .values_list('recipient_id', flat=True)
+        )
+    if not recipients:
+        return []
+
+    group = policy.group_key(data) if policy.window else ''
+    with transaction.atomic():
+        bumped = _bump(recipients, kind, group, policy, actor_id, data) if policy.window else []
+        recipients -= {n.recipient_id for n in bumped}
+        created = Notification.objects.bulk_create(
+            (
+                Notification(
+                    recipient_id=recipient_id, actor_id=actor_id, kind=kind, reference=reference,
+                    data=data, group=group, pending=policy.digest,
+                )
+                for recipient_id in sorted(recipients)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+    if not policy.digest:
+        transaction.on_commit(lambda: deliver(created, bumped))
+    return created + bumped
+
+
+def _bump(recipients, kind, group, policy, actor_id, data):
+    """Roll the event into each recipient's open notification of this group; returns those bumped"""
+    with connection.cursor() as cursor:
+        # Held to commit: two events of one group must not both find nothing to bump and insert twice
+        cursor.execute('SELECT pg_advisory_xact_lock(%s, hashtext(%s))', [LOCK_NAMESPACE, f'{kind}:{group}'])
+
+    now     = timezone.now()
+    rolling = {}
+    # Locked so a concurrent mark-read can't slip between finding and bumping
+    for n in (
+        Notification.objects.select_for_update()
+        .filter(
+            recipient_id__in=recipients, kind=kind, group=group, is_read=False,
+            pending=policy.digest, digested_at__isnull=True, updated_at__gte=now - policy.window,
+        )
+        .order_by('pk')
+    ):
+        rolling[n.recipient_id] = n # Latest wins if a race left two
+    if not rolling:
+        return []
+
+    Notification.objects.filter(pk__in=[n.pk for n in rolling.values()]).update(
+        count=F('count') + 1, actor_id=actor_id, data=data, updated_at=now,
+    )
+    for n in rolling.values():
+        n.count, n.actor_id, n.data, n.updated_at = n.count + 1, actor_id, data, now
+    return list(rolling.values())
+
+
+def unread_count(user_id):
+    """
+    The user's unread notifications, from cache. Only a cold (or expired)
+    counter reads the table, through the (recipient, is_read) index.
+    """
+    key   = UNREAD_KEY.format(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(recipient_id=user_id, is_read=False, pending=False).count()
+        # add(): an increment that landed meanwhile wins over this read
+        if not cache.add(key, count, UNREAD_TTL):
+            count = cache.get(key, count)
+    return count
+
+
+def mark_read(user_id, ids=None):
+    """Mark the user's unread notifications (all, or those in `ids`) read; returns how many changed"""
+    notifications = Notification.objects.filter(recipient_id=user_id, is_read=False, pending=False)
+    if ids is not None:
+        notifications = notifications.filter(pk__in=ids)
+    changed = notifications.update(is_read=True, read_at=timezone.now())
+    if changed:
+        transaction.on_commit(lambda: _adjust_unread([user_id], -changed))
+    return changed
+
+
+def deliver(created, bumped=()):
+    """Count new notifications as unread and push them (and bumped ones) to live connections"""
+    unread = _adjust_unread([n.recipient_id for n in created], 1)
+    for n in created:
+        hub.publish(user_channel(n.recipient_id), {
+            'type': 'notification', 'notification': payload(n), 'unread': unread.get(n.recipient_id),
+        })
+    # A hot group bumps the same notification over and over; clients get its latest state a few times a second
+    for n in bumped:
+        hub.publish(user_channel(n.recipient_id), {
+            'type': 'notification', 'notification': payload(n),
+        }, coalesce=f'notification:{n.pk}', seq=n.count)
+
+
+def payload(notification):
+    """What a live connection receives for a notification"""
+    n = notification
+    return {
+        'id': n.pk, 'kind': n.kind, 'message': n.message, 'count': n.count, 'data': n.data,
+        'created_at': n.created_at, 'updated_at': n.updated_at,
+    }
+
+
+def _adjust_unread(user_ids, delta):
+    """Apply `delta` to the cached counters; returns {user_id: new count} for those cached"""
+    counts = {}
+    for user_id in user_ids:
+        key = UNREAD_KEY.format(user_id)
+        try:
+            count = cache.incr(key, delta)
+        except ValueError:
+            continue # Not cached: the next unread_count() reads the table
+        if count < 0:
+            logger.warning(f"Unread count for user {user_id} went negative, rebuilding it")
+            cache.delete(key)
+            continue
+        counts[user_id] = count
+    return counts
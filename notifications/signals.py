@@ -0,0 +1,72 @@
+from battles.models import Battle, Vote
+from outbox.events import subscriber
+from .models import Notification
+from .services import notify
+
+
+def _battle(battle_id):
+    return (
+        Battle.objects.select_related('pod_a', 'pod_b', 'winner')
+        .only('created_by', 'pod_a__user', 'pod_a__title', 'pod_b__user', 'pod_b__title', 'winner__title')
+        .filter(pk=battle_id).first()
+    )
+
+
+def _context(battle):
+    return {'battle_id': battle.pk, 'title': f"{battle.pod_a.title} vs {battle.pod_b.title}"}
+
+
+@subscriber('battle.created')
+def notify_battle_created(event):
+    # Tell both pod owners their pods were put up against each other
+    battle = _battle(event['battle_id'])
+    if battle is None:
+        return
+    notify(
+        [battle.pod_a.user_id, battle.pod_b.user_id],
+        Notification.Kind.BATTLE_CREATED,
+        actor_id=event['user_id'],
+        reference=f"battle:{battle.pk}:created",
+        **_context(battle),
+    )
+
+
+@subscriber('battle.voted')
+def notify_battle_voted(event):
+    battle = _battle(event['battle_id'])
+    if battle is None:
+        return
+    notify(
+        [battle.created_by_id, battle.pod_a.user_id, battle.pod_b.user_id],
+        Notification.Kind.BATTLE_VOTED,
+        actor_id=event['user_id'],
+        reference=f"vote:{event['vote_id']}",
+        **_context(battle),
+    )
+
+
+@subscriber('battle.closed')
+def notify_battle_closed(event):
+    # Everyone with a stake in the result hears now; voters get it in their next digest
+    battle = _battle(event['battle_id'])
+    if battle is None:
+        return
+    context = {
+        'winner_pod': event['winner_id'],
+        'winner_title': battle.winner.title if battle.winner else None,
+        **_context(battle),
+    }
+    stakeholders = {battle.created_by_id, battle.pod_a.user_id, battle.pod_b.user_id}
+    notify(
+        stakeholders,
+        Notification.Kind.BATTLE_CLOSED,
+        reference=f"battle:{battle.pk}:closed",
+        **context,
+    )
+    voters = Vote.objects.filter(battle_id=battle.pk).exclude(voted_by_id__in=stakeholders).values_list('voted_by_id', flat=True)
+    notify(
+        voters,
+        Notification.Kind.VOTE_RESULT,
+        reference=f"battle:{battle.pk}:result",
+        **context,
+    )
@@ -0,0 +1,6 @@
+from celery import shared_task
+
+@shared_task
+def send_notification_digests():
+    from .digests import send_digests
+    send_digests()
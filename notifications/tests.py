@@ -1,3 +1,68 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from users.models import User
+from .digests import send_digests
+from .models import Notification
+from .services import notify, unread_count
+
+Kind = Notification.Kind
+
+
+class FanOutTests(TestCase):
+    """Fan-out writes one row per recipient, merges bursts and keeps the unread counters current"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.actor      = User.objects.create_user(username='fan_actor', email='fan_actor@thoughty.io', password='pw')
+        cls.recipients = [User.objects.create_user(username=f'fan{i}', email=f'fan{i}@thoughty.io', password='pw')
+                          for i in range(3)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.recipients[0])
+
+    def test_fan_out(self):
+        ids = [user.pk for user in (self.actor, *self.recipients)]
+        self.assertEqual(unread_count(self.recipients[0].pk), 0) # Warm counter
+        with self.captureOnCommitCallbacks(execute=True):
+            created = notify(ids, Kind.BATTLE_CREATED, actor_id=self.actor.pk, reference='battle:1:created', title='A vs B')
+        self.assertEqual(sorted(n.recipient_id for n in created), ids[1:]) # Never the actor
+        self.assertEqual(notify(ids, Kind.BATTLE_CREATED, actor_id=self.actor.pk, reference='battle:1:created'), [])
+
+        with self.assertNumQueries(0): # Counted in cache
+            self.assertEqual(self.client.get('/api/notifications/unread-count/').json(), {'unread': 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/notifications/mark-read/', {'all': True}, format='json')
+        self.assertEqual(response.json()['updated'], 1)
+        self.assertEqual(unread_count(self.recipients[0].pk), 0)
+
+    def test_bursts_merge(self):
+        for voter in (self.actor, *self.recipients[1:]):
+            notify([self.recipients[0].pk], Kind.BATTLE_VOTED, actor_id=voter.pk, battle_id=7, title='A vs B')
+        notification = Notification.objects.get(recipient=self.recipients[0])
+        self.assertEqual((notification.count, notification.message), (3, '3 new votes on A vs B'))
+
+
+class DigestTests(TestCase):
+    """Digesting keeps the rows' references, so redelivered events stay deduplicated"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.voters = [User.objects.create_user(username=f'voter{i}', email=f'voter{i}@thoughty.io') for i in range(2)]
+
+    def test_redelivered_event_after_digest(self):
+        voter_ids = [voter.pk for voter in self.voters]
+        notify(voter_ids, Kind.VOTE_RESULT, reference='battle:1:result', title='A vs B')
+        self.assertEqual(send_digests(), 2)
+
+        # The battle.closed event is delivered again (the outbox is at least once)
+        self.assertEqual(notify(voter_ids, Kind.VOTE_RESULT, reference='battle:1:result', title='A vs B'), [])
+        self.assertEqual(send_digests(), 0)
+        self.assertEqual(Notification.objects.filter(kind=Kind.DIGEST).count(), 2)
+
+    def test_digested_rows_stay_hidden(self):
+        notify([self.voters[0].pk], Kind.VOTE_RESULT, reference='battle:2:result', title='C vs D')
+        send_digests()
+        visible = Notification.objects.filter(recipient=self.voters[0], pending=False)
+        self.assertEqual(list(visible.values_list('kind', flat=True)), [Kind.DIGEST])
@@ -1,3 +1,38 @@
-from django.shortcuts import render
+from rest_framework import viewsets, permissions
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from thoughty.pagination import KeysetPagination
+from .models import Notification
+from .serializers import MarkReadSerializer, NotificationSerializer
+from .services import mark_read, unread_count
 
 # Create your views here.
+
+class NotificationPagination(KeysetPagination):
+    ordering_field = 'updated_at' # A rolling notification moves up when bumped
+
+class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
+    """The user's notifications, newest first; ?unread=true for unread only"""
+    serializer_class   = NotificationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class   = NotificationPagination
+
+    def get_queryset(self):
+        notifications = Notification.objects.filter(recipient=self.request.user, pending=False).select_related('actor')
+        if self.request.query_params.get('unread', '').lower() == 'true':
+            notifications = notifications.filter(is_read=False)
+        return notifications
+
+    @action(detail=False, methods=['get'], url_path='unread-count')
+    def unread_count(self, request):
+        return Response({'unread': unread_count(request.user.pk)})
+
+    @action(detail=False, methods=['post'], url_path='mark-read')
+    def mark_read(self, request):
+        """Mark the listed notifications ({"ids": [...]}) or all of them ({"all": true}) read"""
+        serializer = MarkReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids     = None if serializer.validated_data['all'] else serializer.validated_data['ids']
+        updated = mark_read(request.user.pk, ids)
+        return Response({'updated': updated, 'unread': unread_count(request.user.pk)})
@@ -0,0 +1,183 @@
+import logging
+import math
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from thoughty.tasks import enqueue
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+DRAIN_SCHEDULED_KEY = 'outbox:drain-scheduled'
+RETRY_SCHEDULED_KEY = 'outbox:retry-scheduled:{at}'
+PURGED_KEY          = 'outbox:purged' # Set for PURGE_INTERVAL after a purge
+PURGE_INTERVAL      = 60 * 60
+PURGE_CHUNK         = 10000 # Events per purge DELETE
+MAX_BACKOFF         = timedelta(hours=1)
+
+_subscribers = defaultdict(list)
+
+
+def subscriber(topic):
+    """
+    Register the decorated function to receive every `topic` event's payload.
+
+    Delivery is at least once: a subscriber runs in the dispatcher's
+    transaction and is retried until it succeeds, so it must tolerate
+    seeing the same event twice.
+    """
+    def register(handler):
+        _subscribers[topic].append(handler)
+        return handler
+    return register
+
+
+def subscribers(topic):
+    return _subscribers.get(topic, [])
+
+
+def handler_name(handler):
+    return f'{handler.__module__}.{handler.__qualname__}'
+
+
+def publish(topic, **payload):
+    """
+    Record an event in the current transaction. It is dispatched once the
+    transaction commits, and not at all if it rolls back. The caller pays
+    for one insert regardless of how many subscribers there are.
+    """
+    event = OutboxEvent.objects.create(topic=topic, payload=payload)
+    transaction.on_commit(schedule_drain)
+    return event
+
+
+def publish_many(topic, payloads):
+    """publish() for a batch of `topic` events, in one insert"""
+    events = OutboxEvent.objects.bulk_create(OutboxEvent(topic=topic, payload=payload) for payload in payloads)
+    if events:
+        transaction.on_commit(schedule_drain)
+    return events
+
+
+def schedule_drain():
+    """Queue a background drain unless one is already queued"""
+    if cache.add(DRAIN_SCHEDULED_KEY, 1, 30):
+        from .tasks import drain_outbox
+        enqueue(drain_outbox)
+
+
+def schedule_retry(at):
+    """Queue a background drain for `at` (rounded up to the second) unless one is already queued for then"""
+    countdown = max(math.ceil((at - timezone.now()).total_seconds()), 1)
+    at        = int(time.time()) + countdown
+    if cache.add(RETRY_SCHEDULED_KEY.format(at=at), 1, countdown + 60):
+        from .tasks import drain_outbox
+        enqueue(drain_outbox, countdown=countdown)
+
+
+class Dispatcher:
+    """
+    Delivers pending outbox events to their subscribers in batches.
+
+    Each batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED, so several
+    dispatchers can run side by side without delivering an event twice at
+    the same time. A subscriber's writes and the record that it ran commit
+    together; a failing subscriber is rolled back alone and retried later
+    with exponential backoff, without re-running the ones that succeeded.
+    Dispatched events are kept OUTBOX_RETENTION_DAYS, then purged by a
+    drain (at most once per PURGE_INTERVAL).
+
+    A drain that leaves retries behind schedules the next one for when the
+    earliest is due. Delayed drains on the 'local' task backend die with
+    their process, so production should also run `drain_outbox --loop` or
+    a periodic drain_outbox task as a safety net.
+    """
+
+    def __init__(self, batch_size=None, max_attempts=None):
+        self.batch_size   = batch_size or settings.OUTBOX_BATCH_SIZE
+        self.max_attempts = max_attempts or settings.OUTBOX_MAX_ATTEMPTS
+
+    def drain(self, limit=None):
+        """Dispatch batches until nothing is due (or `limit` events were handled); returns the count"""
+        # New events from here on need a new drain
+        cache.delete(DRAIN_SCHEDULED_KEY)
+
+        handled = 0
+        while limit is None or handled < limit:
+            count = self.dispatch_batch()
+            if not count:
+                break
+            handled += count
+
+        retry_at = (
+            OutboxEvent.objects.filter(dispatched_at__isnull=True, attempts__lt=self.max_attempts)
+            .aggregate(at=Min('available_at'))['at']
+        )
+        if retry_at is not None:
+            schedule_retry(retry_at)
+
+        if cache.add(PURGED_KEY, 1, PURGE_INTERVAL):
+            self.purge()
+        return handled
+
+    def purge(self):
+        """Delete events dispatched more than OUTBOX_RETENTION_DAYS ago, in chunks; returns the count"""
+        cutoff = timezone.now() - timedelta(days=settings.OUTBOX_RETENTION_DAYS)
+        purged = 0
+        while True:
+            chunk = OutboxEvent.objects.filter(dispatched_at__lt=cutoff).values('pk')[:PURGE_CHUNK]
+            count, _ = OutboxEvent.objects.filter(pk__in=chunk).delete()
+            purged += count
+            if count < PURGE_CHUNK:
+                break
+        if purged:
+            logger.info(f"Purged {purged} dispatched outbox events")
+        return purged
+
+    def dispatch_batch(self):
+        with transaction.atomic():
+            events = list(
+                OutboxEvent.objects.select_for_update(skip_locked=True)
+                .filter(dispatched_at__isnull=True, available_at__lte=timezone.now(), attempts__lt=self.max_attempts)
+                .order_by('available_at', 'id')[:self.batch_size]
+            )
+            for event in events:
+                self.dispatch(event)
+        return len(events)
+
+    def dispatch(self, event):
+        errors = []
+        for handler in subscribers(event.topic):
+            name = handler_name(handler)
+            if name in event.delivered:
+                continue
+            try:
+                with transaction.atomic():
+                    handler(event.payload)
+            except Exception as e:
+                logger.exception(f"Outbox subscriber {name} failed on {event}")
+                errors.append(f"{name}: {e}")
+            else:
+                event.delivered.append(name)
+
+        now = timezone.now()
+        event.attempts += 1
+        if errors:
+            event.last_error   = '\n'.join(errors)
+            event.available_at = now + min(timedelta(seconds=2 ** event.attempts), MAX_BACKOFF)
+            if event.attempts >= self.max_attempts:
+                logger.error(f"Outbox {event} gave up after {event.attempts} attempts")
+        else:
+            event.last_error    = ''
+            event.dispatched_at = now
+        event.save(update_fields=['delivered', 'attempts', 'last_error', 'available_at', 'dispatched_at'])
+
+
+dispatcher = Dispatcher()
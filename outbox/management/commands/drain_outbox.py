@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from outbox.events import dispatcher
+
+
+class Command(BaseCommand):
+    help = "Deliver pending outbox events to their subscribers."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep polling for new and retried events instead of exiting once drained',
+        )
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            handled = dispatcher.drain()
+            if handled:
+                self.stdout.write(f"Dispatched {handled} outbox events")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
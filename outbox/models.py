@@ -0,0 +1,33 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+# Create your models here.
+
+class OutboxEvent(models.Model):
+    """
+    A domain event written in the same transaction as the change it
+    describes, and delivered to its subscribers afterwards by
+    outbox.events.Dispatcher. `delivered` lists the subscribers that have
+    already handled it, so a retry only runs the ones that failed.
+    """
+    topic         = models.CharField(max_length=100)
+    payload       = models.JSONField(default=dict, encoder=JSONEncoder)
+    delivered     = models.JSONField(default=list)
+    attempts      = models.PositiveIntegerField(default=0)
+    last_error    = models.TextField(blank=True)
+    created_at    = models.DateTimeField(auto_now_add=True)
+    available_at  = models.DateTimeField(default=timezone.now)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The dispatcher only ever scans undelivered events
+            models.Index(fields=['available_at', 'id'], condition=Q(dispatched_at__isnull=True), name='outbox_pending_idx'),
+            # And the purge only delivered ones
+            models.Index(fields=['dispatched_at'], condition=Q(dispatched_at__isnull=False), name='outbox_dispatched_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} #{self.pk}"
@@ -0,0 +1,6 @@
+from celery import shared_task
+
+@shared_task
+def drain_outbox():
+    from .events import dispatcher
+    dispatcher.drain()
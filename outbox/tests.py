@@ -0,0 +1,96 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from gamification.ledger import ledger
+from pods.models import Pod
+from users.models import User
+from . import events
+from .events import Dispatcher, publish
+from .models import OutboxEvent
+
+
+class OutboxTests(TestCase):
+    """Events commit with their change and reach every subscriber at least once"""
+
+    def setUp(self):
+        self.calls  = []
+        self.broken = True
+        # Scheduled drains are deduplicated in the cache, which outlives each test's rollback
+        cache.clear()
+
+        def steady(payload):
+            self.calls.append(('steady', payload['n']))
+
+        def flaky(payload):
+            if self.broken:
+                raise RuntimeError('down')
+            self.calls.append(('flaky', payload['n']))
+
+        patcher = mock.patch.dict(events._subscribers, {'test.event': [steady, flaky]})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rolled_back_changes_publish_nothing(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                publish('test.event', n=1)
+                raise RuntimeError('rollback')
+        self.assertFalse(OutboxEvent.objects.filter(topic='test.event').exists())
+
+    def test_failed_subscriber_retried_alone(self):
+        event      = publish('test.event', n=1)
+        dispatcher = Dispatcher(batch_size=10, max_attempts=3)
+        with self.assertLogs('outbox.events', 'ERROR'):
+            dispatcher.drain()
+        event.refresh_from_db()
+        self.assertIsNone(event.dispatched_at)
+        self.assertIn('down', event.last_error)
+        self.assertGreater(event.available_at, timezone.now()) # Backing off
+
+        self.broken = False
+        OutboxEvent.objects.filter(pk=event.pk).update(available_at=timezone.now() - timedelta(seconds=1))
+        dispatcher.drain()
+        event.refresh_from_db()
+        self.assertIsNotNone(event.dispatched_at)
+        self.assertEqual(event.attempts, 2)
+        self.assertEqual(self.calls, [('steady', 1), ('flaky', 1)])
+
+
+    @mock.patch('outbox.events.enqueue')
+    def test_retry_scheduled_when_due(self, enqueue):
+        publish('test.event', n=1)
+        with self.assertLogs('outbox.events', 'ERROR'):
+            Dispatcher(batch_size=10, max_attempts=3).drain()
+        # First backoff is 2 seconds
+        self.assertEqual(enqueue.call_args.kwargs, {'countdown': 2})
+
+    def test_dispatched_events_purged_after_retention(self):
+        self.broken = False
+        old, recent = publish('test.event', n=1), publish('test.event', n=2)
+        Dispatcher().drain()
+        OutboxEvent.objects.filter(pk=old.pk).update(dispatched_at=timezone.now() - timedelta(days=8))
+        undelivered = publish('test.event', n=3)
+        OutboxEvent.objects.filter(pk=undelivered.pk).update(created_at=timezone.now() - timedelta(days=8))
+
+        cache.delete(events.PURGED_KEY) # The drain above purged already
+        with mock.patch.object(Dispatcher, 'dispatch_batch', return_value=0):
+            Dispatcher().drain()
+        self.assertEqual(set(OutboxEvent.objects.values_list('pk', flat=True)), {recent.pk, undelivered.pk})
+
+
+class PodCreatedEventTests(TestCase):
+    """The pod.created side effects happen once however often the event is delivered"""
+
+    def test_redelivery(self):
+        user  = User.objects.create_user(username='outbox_user', email='outbox_user@thoughty.io')
+        pod   = Pod.objects.create(user=user, title='Pod', content='Content')
+        event = OutboxEvent.objects.get(topic='pod.created', payload__pod_id=pod.pk)
+        Dispatcher().drain()
+        OutboxEvent.objects.filter(pk=event.pk).update(dispatched_at=None, delivered=[])
+        Dispatcher().drain()
+        self.assertEqual(ledger.balance(user), 10)
@@ -1,10 +1,12 @@
 from django.contrib import admin
+from .history import content_at
 from .models import Pod, PodStageHistory, Tag
 
 class PodStageHistoryInline(admin.TabularInline):
     model = PodStageHistory
     extra = 0
-    readonly_fields = ['version', 'content', 'created_at', 'timestamp']
+    fields = ['version', 'is_keyframe', 'size', 'created_at', 'timestamp']
+    readonly_fields = fields
     can_delete = False
 
 @admin.register(Pod)
@@ -18,10 +20,19 @@ class PodAdmin(admin.ModelAdmin):
 
 @admin.register(PodStageHistory)
 class PodStageHistoryAdmin(admin.ModelAdmin):
-    list_display = ['pod', 'version', 'created_at']
+    list_display = ['pod', 'version', 'is_keyframe', 'size', 'created_at']
     list_filter = ['created_at']
-    search_fields = ['pod__title', 'content']
-    readonly_fields = ['created_at', 'timestamp']
+    search_fields = ['pod__title']
+    fields = ['pod', 'version', 'content', 'is_keyframe', 'size', 'created_at', 'timestamp']
+    # Rows are links in a delta chain (see pods.history): only pods.history writes them
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description='Content')
+    def content(self, obj):
+        return content_at(obj.pod, obj.version)
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PodsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pods'
+
+    def ready(self):
+        import pods.signals  # noqa
@@ -0,0 +1,132 @@
+"""
+Bulk pod writes: importing a notebook of ideas in one request.
+
+    POST /api/pods/bulk/
+    [{"title": "...", "content": "...", "tags": [{"name": "physics"}]},
+     {"id": 42, "stage": "draft", "if_match": "\"9c1e...\""}]
+
+Items without an `id` are created, items with one update that pod of
+the requesting user (only the fields given). An update carrying
+`if_match` (the pod's ETag, from GET /api/pods/42/ or an earlier bulk
+result) is only applied if the locked pod still has it, as If-Match does
+for a single PATCH; without it the bulk write wins. Every item is
+validated on its own and the valid ones are written together, in one
+transaction:
+
+- all tag names in one INSERT ... ON CONFLICT DO NOTHING plus one IN query;
+- new pods and their tag links in one bulk insert each;
+- updated pods in one bulk update, with stage changes archived as a
+  single edit would (see PodSerializer.update), in one history read and
+  one insert;
+- side effects once: 'pod.created' events in one outbox insert, cache
+  invalidation in one call.
+
+The result has one entry per item, in order: {'status': 201 or 200, 'pod': {...},
+'etag': ...} or {'status': 400, 404 or 412, 'errors': {...}}.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from outbox.events import publish_many
+from thoughty.cache import invalidate_on_commit
+from thoughty.conditional import etag_matches
+from .history import record_versions
+from .models import Pod, Tag
+from .serializers import PodBulkItemSerializer, PodSerializer
+
+MAX_ITEMS = 500 # Pods per request
+
+UPDATABLE_FIELDS = ('title', 'content', 'stage', 'is_public')
+
+
+def save_pods(user, items, etag, context=None):
+    """
+    Create or update `items` (see the module docstring) for `user`; one
+    result per item. `etag(pod)` is the pod's ETag, as the detail view has it.
+    """
+    results = [None] * len(items)
+    creates = []  # (index, validated data)
+    updates = {}  # pk -> (index, validated data)
+    for index, item in enumerate(items):
+        serializer = PodBulkItemSerializer(data=item, partial=isinstance(item, dict) and 'id' in item)
+        if not serializer.is_valid():
+            results[index] = {'status': 400, 'errors': serializer.errors}
+            continue
+        data = serializer.validated_data
+        if 'id' not in data:
+            creates.append((index, data))
+        elif data['id'] in updates:
+            results[index] = {'status': 400, 'errors': {'id': ['This pod appears more than once in the request.']}}
+        else:
+            updates[data['id']] = (index, data)
+
+    if not creates and not updates:
+        return results
+
+    with transaction.atomic():
+        tags    = Tag.objects.resolve(
+            tag['name'] for _, data in [*creates, *updates.values()] for tag in data.get('tags', ())
+        )
+        written = {**_create(user, creates, tags), **_update(user, updates, tags, results, etag)}
+
+        invalidate_on_commit(*(f'pod:{pk}' for pk in written), f'user:{user.pk}:pods', 'pods')
+
+    pods = Pod.objects.filter(pk__in=written).with_history_count().prefetch_related('tags').in_bulk()
+    for pk, (index, status) in written.items():
+        results[index] = {'status': status, 'pod': PodSerializer(pods[pk], context=context).data, 'etag': etag(pods[pk])}
+    return results
+
+
+def _create(user, creates, tags):
+    """Insert the new pods and their tag links; {pk: (index, 201)}"""
+    if not creates:
+        return {}
+    pods = Pod.objects.bulk_create(
+        Pod(user=user, **{field: value for field, value in data.items() if field in UPDATABLE_FIELDS})
+        for _, data in creates
+    )
+    _link_tags(zip(pods, (data for _, data in creates)), tags)
+    # Pod.save() publishes these one by one (see outbox)
+    publish_many('pod.created', [{'pod_id': pod.pk, 'user_id': user.pk} for pod in pods])
+    return {pod.pk: (index, 201) for pod, (index, _) in zip(pods, creates)}
+
+
+def _update(user, updates, tags, results, etag):
+    """Apply the updates to `user`'s pods, locked until commit; {pk: (index, 200)}, 404s and 412s into `results`"""
+    if not updates:
+        return {}
+    pods    = Pod.objects.select_for_update().filter(user=user, pk__in=updates).in_bulk()
+    now     = timezone.now()
+    changed  = []
+    archived = []  # (pod, version, content), written together below
+    for pk, (index, data) in updates.items():
+        pod = pods.get(pk)
+        if pod is None:
+            results[index] = {'status': 404, 'errors': {'id': ['No such pod of yours.']}}
+            continue
+        if 'if_match' in data and not etag_matches(data['if_match'], etag(pod)):
+            results[index] = {'status': 412, 'errors': {'if_match': ['The pod has changed since it was fetched; reload it and try again.']}}
+            continue
+        if data.get('stage', pod.stage) != pod.stage:
+            # Archive the old content & bump the version, as a single update does
+            archived.append((pod, f'{pod.version}.0.0', pod.content))
+            pod.version += 1
+        for field in UPDATABLE_FIELDS:
+            if field in data:
+                setattr(pod, field, data[field])
+        pod.timestamp = now # bulk_update skips auto_now
+        changed.append((pod, data))
+
+    record_versions(archived)
+    Pod.objects.bulk_update([pod for pod, _ in changed], [*UPDATABLE_FIELDS, 'version', 'timestamp'])
+    retagged = [(pod, data) for pod, data in changed if 'tags' in data]
+    Pod.tags.through.objects.filter(pod__in=[pod for pod, _ in retagged]).delete()
+    _link_tags(retagged, tags)
+    return {pod.pk: (updates[pod.pk][0], 200) for pod, _ in changed}
+
+
+def _link_tags(pods_and_data, tags):
+    Pod.tags.through.objects.bulk_create(
+        (Pod.tags.through(pod=pod, tag=tags[tag['name']]) for pod, data in pods_and_data for tag in data.get('tags', ())),
+        ignore_conflicts=True,
+    )
@@ -0,0 +1,167 @@
+import difflib
+import json
+import zlib
+
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Pod, PodStageHistory
+
+# Every Nth version is stored whole, so rebuilding any version applies at most N - 1 deltas
+KEYFRAME_INTERVAL = 10
+
+
+def compress(text):
+    return zlib.compress(text.encode(), 9)
+
+
+def decompress(data):
+    return zlib.decompress(bytes(data)).decode()
+
+
+def make_delta(base, target):
+    """
+    Edit script turning `base` into `target`: a list of
+    ``n`` (keep n characters), ``-n`` (skip n) and ``"text"`` (insert).
+    """
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, base, target, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(i1 - i2)
+        if j2 > j1:
+            ops.append(target[j1:j2])
+    return ops
+
+
+def apply_delta(base, ops):
+    parts = []
+    pos   = 0
+    for op in ops:
+        if isinstance(op, str):
+            parts.append(op)
+        elif op >= 0:
+            parts.append(base[pos:pos + op])
+            pos += op
+        else:
+            pos -= op
+    return ''.join(parts)
+
+
+def record_version(pod, version, content):
+    """
+    Archive `content` as `version` of `pod`: a compressed delta from the
+    previous version, or a full keyframe every KEYFRAME_INTERVAL versions
+    (or when the delta would not be smaller).
+    """
+    with transaction.atomic():
+        # Locked: concurrent saves would both append a delta and outrun the keyframe interval
+        Pod.objects.select_for_update().filter(pk=pod.pk).exists()
+        chain = _chain(PodStageHistory.objects.filter(pod=pod).order_by('-id')[:KEYFRAME_INTERVAL])
+        entry = _entry(pod, version, content, chain)
+        entry.save()
+        return entry
+
+
+def record_versions(versions):
+    """
+    record_version() for many (pod, version, content), at most one per pod,
+    reading their recent history in one query and inserting in another.
+    The caller must hold the pods' row locks (select_for_update).
+    """
+    if not versions:
+        return []
+    recent = (
+        PodStageHistory.objects.filter(pod__in=[pod for pod, _, _ in versions])
+        .annotate(nth=Window(RowNumber(), partition_by=[F('pod_id')], order_by=F('id').desc()))
+        .filter(nth__lte=KEYFRAME_INTERVAL)
+        .order_by('pod_id', '-id')
+    )
+    newest_first = {}
+    for entry in recent:
+        newest_first.setdefault(entry.pod_id, []).append(entry)
+    return PodStageHistory.objects.bulk_create(
+        _entry(pod, version, content, _chain(newest_first.get(pod.pk, ()))) for pod, version, content in versions
+    )
+
+
+def _entry(pod, version, content, chain):
+    """The unsaved history row for `content`, given the pod's current chain"""
+    if chain and len(chain) < KEYFRAME_INTERVAL:
+        previous = rebuild(chain)[-1]
+        delta    = zlib.compress(json.dumps(make_delta(previous, content), separators=(',', ':')).encode(), 9)
+        keyframe = compress(content)
+        if len(delta) < len(keyframe):
+            return PodStageHistory(pod=pod, user_id=pod.user_id, version=version, is_keyframe=False, data=delta, size=len(content))
+    return PodStageHistory(pod=pod, user_id=pod.user_id, version=version, is_keyframe=True, data=compress(content), size=len(content))
+
+
+def rebuild(chain):
+    """Contents of consecutive history rows, oldest first; the first must be a keyframe"""
+    contents = []
+    for entry in chain:
+        if entry.is_keyframe:
+            contents.append(decompress(entry.data))
+        else:
+            contents.append(apply_delta(contents[-1], json.loads(decompress(entry.data))))
+    return contents
+
+
+def contents(entries):
+    """
+    Contents of all of a pod's history rows (any order in, oldest first out),
+    in one pass over the chain.
+    """
+    return rebuild(sorted(entries, key=lambda entry: entry.pk))
+
+
+def content_at(pod, version):
+    """The content `pod` had at `version` (a history version or 'current'), or None if there is no such version"""
+    if version == 'current':
+        return pod.content
+    target = PodStageHistory.objects.filter(pod=pod, version=version).values_list('id', flat=True).first()
+    if target is None:
+        return None
+    history = PodStageHistory.objects.filter(pod=pod, id__lte=target)
+    chain   = _chain(history.order_by('-id')[:KEYFRAME_INTERVAL])
+    if not chain:
+        # Rows written before saves were serialized can leave the keyframe further back
+        keyframe = history.filter(is_keyframe=True).order_by('-id').values_list('id', flat=True).first()
+        if keyframe is None:
+            return None
+        chain = list(history.filter(id__gte=keyframe).order_by('id'))
+    return rebuild(chain)[-1]
+
+
+def diff(pod, from_version, to_version='current'):
+    """
+    Differences between two versions: a unified line diff and the changed
+    character spans. None if either version does not exist.
+    """
+    before = content_at(pod, from_version)
+    after  = content_at(pod, to_version)
+    if before is None or after is None:
+        return None
+    changes = [
+        {'op': tag, 'at': i1, 'before': before[i1:i2], 'after': after[j1:j2]}
+        for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, before, after, autojunk=False).get_opcodes()
+        if tag != 'equal'
+    ]
+    unified = list(difflib.unified_diff(
+        before.splitlines(), after.splitlines(),
+        fromfile=from_version, tofile=to_version, lineterm='',
+    ))
+    return {'from': from_version, 'to': to_version, 'unified': unified, 'changes': changes}
+
+
+def _chain(newest_first):
+    """The rows from the latest keyframe on, oldest first"""
+    chain = []
+    for entry in newest_first:
+        chain.append(entry)
+        if entry.is_keyframe:
+            return chain[::-1]
+    return [] # No keyframe in reach: the next version starts a new chain
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pods', '0002_alter_podstagehistory_pod_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pod',
+            index=models.Index(fields=['is_public', 'timestamp', 'id'], name='pod_public_ts_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pod',
+            index=models.Index(fields=['user', 'timestamp', 'id'], name='pod_user_ts_id_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pods', '0004_pod_search_vector_pod_pod_search_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='podstagehistory',
+            index=models.Index(fields=['pod', 'created_at', 'id'], name='pod_history_pod_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+import zlib
+
+from django.db import migrations, models
+
+
+def compress_content(apps, schema_editor):
+    # Existing versions become keyframes; later versions are stored as deltas
+    PodStageHistory = apps.get_model('pods', 'PodStageHistory')
+    for entry in PodStageHistory.objects.only('content').iterator(chunk_size=1000):
+        entry.data = zlib.compress(entry.content.encode(), 9)
+        entry.size = len(entry.content)
+        entry.save(update_fields=['data', 'size'])
+
+
+def decompress_content(apps, schema_editor):
+    # Only keyframes can be restored without pods.history; deltas are expanded through it
+    from pods.history import contents
+
+    PodStageHistory = apps.get_model('pods', 'PodStageHistory')
+    pods = PodStageHistory.objects.values_list('pod_id', flat=True).distinct()
+    for pod_id in pods.iterator():
+        entries = list(PodStageHistory.objects.filter(pod_id=pod_id).order_by('id'))
+        for entry, content in zip(entries, contents(entries)):
+            entry.content = content
+            entry.save(update_fields=['content'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pods', '0005_podstagehistory_pod_history_pod_ts_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='podstagehistory',
+            name='is_keyframe',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='podstagehistory',
+            name='data',
+            field=models.BinaryField(default=b''),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='podstagehistory',
+            name='size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='podstagehistory',
+            name='content',
+            field=models.TextField(max_length=500, blank=True),
+        ),
+        migrations.RunPython(compress_content, decompress_content),
+        migrations.RemoveField(
+            model_name='podstagehistory',
+            name='content',
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:59
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pods', '0006_podstagehistory_delta_storage'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='tag',
+            options={'ordering': ['id']},
+        ),
+    ]
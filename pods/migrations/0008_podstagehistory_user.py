@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_owners(apps, schema_editor):
+    Pod             = apps.get_model('pods', 'Pod')
+    PodStageHistory = apps.get_model('pods', 'PodStageHistory')
+    PodStageHistory.objects.update(user=Subquery(Pod.objects.filter(pk=OuterRef('pod')).values('user')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pods', '0007_alter_tag_options'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='podstagehistory',
+            name='user',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(copy_owners, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='podstagehistory',
+            name='user',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='podstagehistory',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='pod_history_user_ts_idx'),
+        ),
+    ]
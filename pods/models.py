@@ -1,8 +1,14 @@
 import re
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
 from django.core.exceptions import ValidationError
 
+from outbox.events import publish
+from search.fields import SearchVectorDeferringManager, search_vector_field
+
 # Create your models here.
 
 def validate_version(value):
@@ -23,6 +29,27 @@ class Stage(models.TextChoices):
     REVIEW = 'review', 'Review'
     FINAL  = 'final', 'Final'
 
+class PodQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """
+        Public pods for everyone, plus the user's own private pods
+        when they are authenticated.
+        """
+        if user.is_authenticated:
+            return self.filter(Q(is_public=True) | Q(user=user))
+        return self.filter(is_public=True)
+
+    def with_history_count(self):
+        """Annotate `history_count`, the number of archived versions"""
+        # A correlated subquery runs for the fetched rows only, unlike a GROUP BY over the scan
+        return self.annotate(history_count=Coalesce(Subquery(
+            PodStageHistory.objects.filter(pod=OuterRef('pk')).order_by().values('pod')
+            .annotate(n=Count('pk')).values('n'),
+            output_field=models.IntegerField(),
+        ), Value(0)))
+
+PodManager = SearchVectorDeferringManager.from_queryset(PodQuerySet)
+
 class Pod(models.Model):
     """
     Represents a thought pod - the core entity of the application.
@@ -38,29 +65,83 @@ class Pod(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     timestamp  = models.DateTimeField(auto_now=True)
 
+    search_vector = search_vector_field(('title', 'A'), ('content', 'B'))
+
+    objects = PodManager()
+
     def __str__(self):
         return f"{self.title} ({self.user.username})"
 
+    def save(self, *args, **kwargs):
+        # The event commits or rolls back with the pod; subscribers run later (see outbox)
+        created = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if created:
+                publish('pod.created', pod_id=self.pk, user_id=self.user_id)
+
     class Meta:
         ordering = ['-timestamp']
+        indexes  = [
+            # Back the keyset scans in PodViewSet: public feed and "my pods"
+            models.Index(fields=['is_public', 'timestamp', 'id'], name='pod_public_ts_id_idx'),
+            models.Index(fields=['user', 'timestamp', 'id'], name='pod_user_ts_id_idx'),
+            GinIndex(fields=['search_vector'], name='pod_search_idx'),
+        ]
 
 class PodStageHistory(models.Model):
     """
     Tracks historical versions of pods when stages change.
     Each entry represents a previous state of a pod.
+
+    Content is stored compressed, as a delta from the previous version
+    with a full keyframe every few versions; write and read it through
+    pods.history.
     """
-    pod        = models.ForeignKey(Pod, on_delete=models.CASCADE, related_name='history')
-    version    = models.CharField(max_length=20, validators=[validate_version])
-    content    = models.TextField(max_length=500)
-    created_at = models.DateTimeField(auto_now_add=True)
-    timestamp  = models.DateTimeField(auto_now=True)
+    pod         = models.ForeignKey(Pod, on_delete=models.CASCADE, related_name='history')
+    user        = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+', editable=False) # The pod's owner, for pods.timeline
+    version     = models.CharField(max_length=20, validators=[validate_version])
+    is_keyframe = models.BooleanField(default=True)
+    data        = models.BinaryField() # zlib: the full content (keyframe) or an edit script from the previous version
+    size        = models.PositiveIntegerField(default=0) # Length of the content
+    created_at  = models.DateTimeField(auto_now_add=True)
+    timestamp   = models.DateTimeField(auto_now=True)
     
     class Meta:
         unique_together = ['pod', 'version']
+        indexes = [
+            # A pod's versions newest first (pods.timeline)
+            models.Index(fields=['pod', 'created_at', 'id'], name='pod_history_pod_ts_idx'),
+            # A user's versions across all their pods newest first (pods.timeline)
+            models.Index(fields=['user', 'created_at', 'id'], name='pod_history_user_ts_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.user_id is None:
+            self.user_id = self.pod.user_id
+        super().save(*args, **kwargs)
+
+class TagQuerySet(models.QuerySet):
+    def resolve(self, names):
+        """
+        {name: Tag} for `names`, creating the missing ones: one
+        INSERT ... ON CONFLICT DO NOTHING and one IN query, however many.
+        """
+        names = set(names)
+        if not names:
+            return {}
+        self.bulk_create([Tag(name=name) for name in sorted(names)], ignore_conflicts=True)
+        return {tag.name: tag for tag in self.filter(name__in=names)}
 
 class Tag(models.Model):
     """Represents a tag that can be attached to pods for categorization"""
     name = models.CharField(max_length=100, unique=True)
+
+    objects = TagQuerySet.as_manager()
     
     def __str__(self):
         return self.name
+
+    class Meta:
+        # A pod's tags come out in a stable order, however they were fetched
+        ordering = ['id']
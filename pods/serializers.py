@@ -1,6 +1,9 @@
 from rest_framework import serializers
+from thoughty.sparse import Load, SparseFieldsMixin
+from .history import contents, record_version
 from .models import Pod, PodStageHistory, Tag
 
+
 class TagSerializer(serializers.ModelSerializer):
     """Serializer for the Tag model"""
     class Meta:
@@ -8,27 +11,48 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ['id', 'name']
 
 class PodStageHistorySerializer(serializers.ModelSerializer):
-    """Serializer for the PodStageHistory model"""
+    """Metadata of a PodStageHistory entry; the content is rebuilt on demand (see pods.history)"""
     class Meta:
         model = PodStageHistory
-        fields = ['version', 'content', 'timestamp']
+        fields = ['version', 'size', 'created_at', 'timestamp']
 
-class PodSerializer(serializers.ModelSerializer):
+class PodSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for the Pod model.
     Handles creation, updating, and proper versioning of pods.
+    History is summarized by its count; ?expand=history adds every
+    version with its content. ?fields= narrows it (see thoughty.sparse).
     """
     tags = TagSerializer(many=True, required=False)
-    history = PodStageHistorySerializer(many=True, read_only=True)
+    history_count = serializers.SerializerMethodField()
+    history = serializers.SerializerMethodField()
     
     class Meta:
         model = Pod
         fields = [
             'id', 'user', 'title', 'content', 'stage',
-            'version', 'is_public', 'tags', 'history',
+            'version', 'is_public', 'tags', 'history_count', 'history',
             'created_at', 'timestamp',
         ]
         read_only_fields = ['user', 'version', 'created_at', 'timestamp']
+        expandable_fields = ['history']
+        loads = {
+            'history_count': Load(annotate=lambda queryset: queryset.with_history_count()),
+            'history': Load(prefetch=['history']),
+        }
+        # Method fields that just return a column, for thoughty.fastpath
+        value_columns = {'history_count': 'history_count'}
+
+    def get_history_count(self, obj):
+        count = getattr(obj, 'history_count', None) # Annotated through Meta.loads
+        return obj.history.count() if count is None else count
+
+    def get_history(self, obj):
+        entries = list(obj.history.all())
+        return [
+            {**PodStageHistorySerializer(entry).data, 'content': content}
+            for entry, content in zip(sorted(entries, key=lambda entry: entry.pk), contents(entries))
+        ]
 
     def create(self, validated_data):
         tags_data = validated_data.pop('tags', [])
@@ -46,11 +70,9 @@ class PodSerializer(serializers.ModelSerializer):
             # Create version string in format: 1.0.0
             version_str = f"{instance.version}.0.0"
             
-            PodStageHistory.objects.create(
-                pod=instance,
-                version=version_str,
-                content=instance.content
-            )
+            record_version(instance, version_str, instance.content)
+            if hasattr(instance, 'history_count'):
+                instance.history_count += 1
 
             instance.version += 1
             instance.stage = new_stage
@@ -70,17 +92,35 @@ class PodSerializer(serializers.ModelSerializer):
         
     def _process_tags(self, pod, tags_data):
         """Helper method to process tags for both create and update operations"""
+        # Names are resolved together, however many (see TagQuerySet.resolve)
+        names = [tag_data.get('name') for tag_data in tags_data if isinstance(tag_data, dict)]
+        tags  = list(Tag.objects.resolve(name for name in names if name).values())
         for tag_data in tags_data:
-            if isinstance(tag_data, dict):
-                # If we received a dictionary with tag data
-                tag_name = tag_data.get('name')
-                if tag_name:
-                    tag, _ = Tag.objects.get_or_create(name=tag_name)
-                    pod.tags.add(tag)
-            else:
+            if not isinstance(tag_data, dict):
                 # If we received just a tag ID
                 try:
-                    tag = Tag.objects.get(id=tag_data)
-                    pod.tags.add(tag)
+                    tags.append(Tag.objects.get(id=tag_data))
                 except (Tag.DoesNotExist, ValueError):
-                    pass
\ No newline at end of file
+                    pass
+        if tags:
+            pod.tags.add(*tags)
+
+
+class TagNameSerializer(serializers.Serializer):
+    """A tag by name, created if it doesn't exist yet"""
+    name = serializers.CharField(max_length=100)
+
+class PodBulkItemSerializer(serializers.ModelSerializer):
+    """
+    One pod of a bulk write (see pods.bulk): created without an `id`,
+    updated (partially) with one, only if it still has the ETag in
+    `if_match` when given. Validation runs no queries; tags are resolved
+    for the whole batch at once.
+    """
+    id       = serializers.IntegerField(required=False)
+    tags     = TagNameSerializer(many=True, required=False)
+    if_match = serializers.CharField(required=False)
+
+    class Meta:
+        model  = Pod
+        fields = ['id', 'title', 'content', 'stage', 'is_public', 'tags', 'if_match']
@@ -0,0 +1,36 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from thoughty.cache import invalidate_on_commit
+from .models import Pod, PodStageHistory
+
+@receiver(post_save, sender=Pod)
+@receiver(post_delete, sender=Pod)
+def invalidate_pod(sender, instance, **kwargs):
+    """Cached responses showing the pod, its owner's pods or any pod list (see thoughty.cache)."""
+    invalidate_on_commit(f'pod:{instance.pk}', f'user:{instance.user_id}:pods', 'pods')
+
+@receiver(m2m_changed, sender=Pod.tags.through)
+def invalidate_pod_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    """Tags are part of the pod: move its timestamp too, the validator of thoughty.conditional."""
+    if reverse and action == 'pre_clear':
+        # tag.pod_set.clear() doesn't say which pods afterwards
+        pks = list(Pod.objects.filter(tags=instance).values_list('pk', flat=True))
+        Pod.objects.filter(pk__in=pks).update(timestamp=timezone.now())
+        invalidate_on_commit(*(f'pod:{pk}' for pk in pks), 'pods')
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        if pk_set:
+            Pod.objects.filter(pk__in=pk_set).update(timestamp=timezone.now())
+            invalidate_on_commit(*(f'pod:{pk}' for pk in pk_set), 'pods')
+    else:
+        instance.timestamp = timezone.now()
+        Pod.objects.filter(pk=instance.pk).update(timestamp=instance.timestamp)
+        invalidate_on_commit(f'pod:{instance.pk}', f'user:{instance.user_id}:pods', 'pods')
+
+@receiver(post_save, sender=PodStageHistory)
+@receiver(post_delete, sender=PodStageHistory)
+def invalidate_pod_history(sender, instance, **kwargs):
+    """History counts are part of the pod's representation."""
+    invalidate_on_commit(f'pod:{instance.pod_id}', 'pods')
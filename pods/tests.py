@@ -1,3 +1,442 @@
+import gc
+import json
+import weakref
+from unittest import mock
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from battles.models import Battle
+from thoughty import fastpath
+from thoughty.fastpath import compile_serializer
+from users.models import User
+from .history import KEYFRAME_INTERVAL, compress, content_at, contents, make_delta, record_version
+from .models import Pod, PodStageHistory, Tag
+from .serializers import PodSerializer
+from .views import PodViewSet
+
+
+class PodPaginationTests(TestCase):
+    """Keyset pages cover every pod once, ties on the timestamp included, both ways"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='page_owner', email='page_owner@thoughty.io', password='pw')
+        for i in range(7):
+            Pod.objects.create(user=cls.owner, title=f'Pod {i}', content='Content')
+        # Several pods saved within one timestamp
+        first = Pod.objects.order_by('id').first()
+        Pod.objects.filter(pk__in=Pod.objects.order_by('id').values('pk')[:4]).update(timestamp=first.timestamp)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def walk(self, url, direction):
+        pages = []
+        while url:
+            page = self.client.get(url).json()
+            pages.append([pod['id'] for pod in page['results']])
+            url = page[direction]
+        return pages
+
+    def test_forward_and_back(self):
+        expected = list(Pod.objects.order_by('-timestamp', '-id').values_list('id', flat=True))
+        forward  = self.walk('/api/pods/?page_size=3', 'next')
+        self.assertEqual(sum(forward, []), expected)
+
+        last_page = self.client.get('/api/pods/?page_size=3').json()
+        while last_page['next']:
+            last_page = self.client.get(last_page['next']).json()
+        backward = self.walk(last_page['previous'], 'previous')
+        self.assertEqual(sum(reversed(backward), []), expected[:-len(forward[-1])])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/pods/?cursor=not-a-cursor').status_code, 404)
+
+
+class TimelineTests(TestCase):
+    """Battles from either side of the user's pods, each once, across pages"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user  = User.objects.create_user(username='timeline_user', email='timeline_user@thoughty.io', password='pw')
+        rival     = User.objects.create_user(username='timeline_rival', email='timeline_rival@thoughty.io', password='pw')
+        mine      = [Pod.objects.create(user=cls.user, title=f'Mine {i}', content='Content') for i in range(2)]
+        theirs    = Pod.objects.create(user=rival, title='Theirs', content='Content')
+        cls.battles = [
+            Battle.objects.create(pod_a=mine[0], pod_b=theirs, created_by=cls.user),
+            Battle.objects.create(pod_a=theirs, pod_b=mine[1], created_by=rival),
+            Battle.objects.create(pod_a=mine[0], pod_b=mine[1], created_by=cls.user),
+            Battle.objects.create(pod_a=theirs, pod_b=theirs, created_by=rival),
+        ]
+
+    def test_battles_each_once(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        seen, url = [], '/api/timeline/?types=battle&page_size=1'
+        while url:
+            page = client.get(url).json()
+            seen += [(entry['type'], entry['id']) for entry in page['results']]
+            url = page['next']
+        self.assertEqual(seen, [('battle', battle.pk) for battle in reversed(self.battles[:3])])
+
+    def test_page_cost_independent_of_history(self):
+        prolific = User.objects.create_user(username='timeline_prolific', email='timeline_prolific@thoughty.io', password='pw')
+        rival    = Pod.objects.get(title='Theirs')
+        for i in range(30):
+            pod = Pod.objects.create(user=prolific, title=f'Prolific {i}', content='Content')
+            record_version(pod, '1.0.0', f'Older content {i}')
+            Battle.objects.create(pod_a=pod, pod_b=rival, created_by=prolific)
+            Battle.objects.create(pod_a=rival, pod_b=pod, created_by=prolific)
+
+        client = APIClient()
+        client.force_authenticate(prolific)
+        # One query per source, each filtered on its own (user, ordering, id) index and never through pods
+        with self.assertNumQueries(6), CaptureQueriesContext(connection) as queries:
+            page = client.get('/api/timeline/?page_size=5').json()
+        self.assertEqual(len(page['results']), 5)
+        for query in queries:
+            self.assertNotIn('pods_pod', query['sql'].split('WHERE', 1)[1])
+
+
+class PodHistoryTests(TestCase):
+    """Archived versions are stored as deltas between keyframes and read back exactly"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner    = User.objects.create_user(username='history_owner', email='history_owner@thoughty.io', password='pw')
+        cls.pod      = Pod.objects.create(user=cls.owner, title='Pod', content='Content')
+        cls.base     = 'An idea grows one sentence at a time, and most of it stays the same. ' * 20
+        cls.contents = [f'{cls.base}Revision {i}: {"more " * i}' for i in range(KEYFRAME_INTERVAL * 2 + 3)]
+        for i, content in enumerate(cls.contents):
+            record_version(cls.pod, f'{i + 1}.0.0', content)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_round_trip(self):
+        entries = list(self.pod.history.order_by('id'))
+        self.assertEqual([entry.is_keyframe for entry in entries].count(True), 3)
+        self.assertTrue(all(len(entry.data) < 100 for entry in entries if not entry.is_keyframe))
+        self.assertEqual(contents(entries), self.contents)
+        for i in (0, 1, KEYFRAME_INTERVAL - 1, KEYFRAME_INTERVAL, len(self.contents) - 1):
+            self.assertEqual(content_at(self.pod, f'{i + 1}.0.0'), self.contents[i])
+
+    def test_keyframe_out_of_reach(self):
+        # As two unserialized saves could leave it: more deltas in a row than KEYFRAME_INTERVAL
+        pod = Pod.objects.create(user=self.owner, title='Raced', content='Content')
+        PodStageHistory.objects.create(pod=pod, version='1.0.0', is_keyframe=True, data=compress(self.contents[0]), size=0)
+        for i in range(1, KEYFRAME_INTERVAL + 2):
+            delta = compress(json.dumps(make_delta(self.contents[i - 1], self.contents[i])))
+            PodStageHistory.objects.create(pod=pod, version=f'{i + 1}.0.0', is_keyframe=False, data=delta, size=0)
+        self.assertEqual(content_at(pod, f'{KEYFRAME_INTERVAL + 2}.0.0'), self.contents[KEYFRAME_INTERVAL + 1])
+
+    def test_endpoints(self):
+        url = f'/api/pods/{self.pod.pk}/'
+        self.assertEqual(self.client.get(f'{url}versions/12.0.0/').json()['content'], self.contents[11])
+        self.assertEqual(self.client.get(f'{url}versions/99.0.0/').status_code, 404)
+        changes = self.client.get(f'{url}diff/?from=1.0.0&to=2.0.0').json()['changes']
+        at = len(self.base) + len('Revision ')
+        self.assertEqual(changes, [
+            {'op': 'replace', 'at': at, 'before': '0', 'after': '1'},
+            {'op': 'insert', 'at': at + 3, 'before': '', 'after': 'more '},
+        ])
+
+
+class PodSparseFieldsTests(TestCase):
+    """?fields= and ?expand= shape the response and what is queried for it"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='sparse_owner', email='sparse_owner@thoughty.io', password='pw')
+        cls.pod   = Pod.objects.create(user=cls.owner, title='Pod', content='Sparse content')
+        cls.pod.tags.add(Tag.objects.create(name='sparse'))
+        record_version(cls.pod, '1.0.0', 'Older content')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def get(self, url):
+        with mock.patch.object(PodViewSet, 'cache_tags', {}), CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), ' '.join(query['sql'] for query in queries)
+
+    def test_fields_prune_queries(self):
+        data, sql = self.get('/api/pods/?fields=id,title')
+        self.assertEqual(data['results'], [{'id': self.pod.pk, 'title': 'Pod'}])
+        for table in (Tag._meta.db_table, PodStageHistory._meta.db_table, '"content"'):
+            self.assertNotIn(table, sql)
+        _, sql = self.get('/api/pods/')
+        for table in (Tag._meta.db_table, '"content"'):
+            self.assertIn(table, sql)
+
+    def test_expand(self):
+        data, _ = self.get(f'/api/pods/{self.pod.pk}/')
+        self.assertNotIn('history', data)
+        data, _ = self.get(f'/api/pods/{self.pod.pk}/?expand=history')
+        self.assertEqual([entry['version'] for entry in data['history']], ['1.0.0'])
+
+
+class PodFastPathParityTests(TestCase):
+    """The fast list path must answer byte for byte what PodSerializer does"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='owner', email='owner@thoughty.io', password='pw')
+        cls.other = User.objects.create_user(username='other', email='other@thoughty.io', password='pw')
+        shared = Tag.objects.create(name='shared')
+        for i in range(30):
+            pod = Pod.objects.create(
+                user=cls.owner if i % 3 else cls.other,
+                title=f'Pod {i} "quoted" ünïcode',
+                content=f'Content {i}\nwith a second line',
+                stage=['idea', 'draft', 'review', 'final'][i % 4],
+                is_public=i % 5 != 0,
+            )
+            if i % 2:
+                pod.tags.add(shared, Tag.objects.create(name=f'tag-{i}'))
+            for version in range(i % 3):
+                record_version(pod, f'{version + 1}.0.0', f'old content {version}')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def assertParity(self, url):
+        # Both paths must run, not answer from the response cache
+        with mock.patch.object(PodViewSet, 'cache_tags', {}):
+            fast = self.client.get(url)
+            with mock.patch.object(PodViewSet, 'fast_list', False):
+                slow = self.client.get(url)
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, slow.content)
+        return fast
+
+    def test_default_fields(self):
+        self.assertParity('/api/pods/')
+
+    def test_sparse_fields(self):
+        self.assertParity('/api/pods/?fields=id,title,stage')
+        self.assertParity('/api/pods/?fields=tags,history_count,created_at')
+
+    def test_pages(self):
+        url = '/api/pods/?page_size=7'
+        while url:
+            url = self.assertParity(url).json()['next']
+
+    def test_anonymous(self):
+        self.client.force_authenticate(None)
+        self.assertParity('/api/pods/')
+
+    def test_plans_are_bounded_and_detached(self):
+        request    = mock.Mock(method='GET', query_params={'fields': 'id,created_at'})
+        serializer = PodSerializer(context={'request': request})
+        self.assertIsNotNone(compile_serializer(serializer))
+        alive = weakref.ref(serializer)
+        del serializer
+        gc.collect()
+        self.assertIsNone(alive()) # The cached plan must not keep the serializer (or its request)
+
+        with mock.patch.object(fastpath, 'PLAN_CACHE_SIZE', 3):
+            for fields in ('id', 'title', 'stage', 'content', 'version'):
+                compile_serializer(PodSerializer(context={'request': mock.Mock(method='GET', query_params={'fields': fields})}))
+            self.assertEqual(len(fastpath._plans), 3)
+
+    def test_expanded_history_uses_the_serializer(self):
+        request = mock.Mock(method='GET', query_params={'expand': 'history'})
+        self.assertIsNone(compile_serializer(PodSerializer(context={'request': request})))
+        self.assertParity('/api/pods/?expand=history')
+
+
+class PodCacheTests(TestCase):
+    """Cached pod reads must follow writes and never cross users"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='cache_owner', email='cache_owner@thoughty.io', password='pw')
+        cls.other = User.objects.create_user(username='cache_other', email='cache_other@thoughty.io', password='pw')
+        cls.pod   = Pod.objects.create(user=cls.owner, title='Before', content='Content', is_public=False)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_update_invalidates(self):
+        url = f'/api/pods/{self.pod.pk}/'
+        self.assertEqual(self.client.get(url).json()['title'], 'Before')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).json()['title'], 'Before')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, {'title': 'After'}, format='json')
+        self.assertEqual(self.client.get(url).json()['title'], 'After')
+
+    def test_tags_invalidate_the_list(self):
+        self.client.get('/api/pods/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pod.tags.add(Tag.objects.create(name='cache-tag'))
+        self.assertEqual(self.client.get('/api/pods/').json()['results'][0]['tags'][0]['name'], 'cache-tag')
+
+    def test_per_user(self):
+        url = f'/api/pods/{self.pod.pk}/'
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class PodConditionalTests(TestCase):
+    """Validators must answer 304 for unchanged pods and refuse stale If-Match writes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='etag_owner', email='etag_owner@thoughty.io', password='pw')
+        cls.pod   = Pod.objects.create(user=cls.owner, title='Pod', content='Content')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.url = f'/api/pods/{self.pod.pk}/'
+
+    def test_not_modified(self):
+        for url in (self.url, '/api/pods/'):
+            etag = self.client.get(url)['ETag']
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(response.content, b'')
+
+    def test_list_validators_per_page(self):
+        Pod.objects.create(user=self.owner, title='Second', content='Content')
+        first  = self.client.get('/api/pods/?page_size=1')
+        second = self.client.get(first.json()['next'])
+        self.assertNotEqual(first['ETag'], second['ETag'])
+        self.assertNotEqual(first['ETag'], self.client.get('/api/pods/?page_size=1&fields=id')['ETag'])
+        self.assertIn('Authorization', first['Vary'])
+        # The query string is canonical: parameter order doesn't matter
+        self.assertEqual(self.client.get('/api/pods/?fields=id&page_size=1')['ETag'],
+                         self.client.get('/api/pods/?page_size=1&fields=id')['ETag'])
+        response = self.client.get(first.json()['next'], HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_validators_read_only_the_page(self):
+        etag = self.client.get('/api/pods/?page_size=1')['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/pods/?page_size=1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('COUNT(', sql.upper())
+        self.assertIn('LIMIT 2', sql.upper())
+        self.assertNotIn(PodStageHistory._meta.db_table, sql) # history_count isn't evaluated
+
+    def test_changes_move_the_validators(self):
+        etag = self.client.get('/api/pods/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pod.tags.add(Tag.objects.create(name='etag-tag'))
+        self.assertEqual(self.client.get('/api/pods/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_if_match(self):
+        etag  = self.client.get(self.url)['ETag']
+        first = self.client.patch(self.url, {'stage': 'draft'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(first.status_code, 200)
+        stale = self.client.patch(self.url, {'stage': 'review'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(stale.status_code, 412)
+        chained = self.client.patch(self.url, {'stage': 'review'}, format='json', HTTP_IF_MATCH=first['ETag'])
+        self.assertEqual(chained.status_code, 200)
+        self.assertEqual(Pod.objects.get(pk=self.pod.pk).version, 3)
+
+    def test_detail_validators_per_representation(self):
+        plain  = self.client.get(self.url)['ETag']
+        sparse = self.client.get(f'{self.url}?fields=id,title')['ETag']
+        self.assertNotEqual(plain, sparse)
+        self.assertNotEqual(sparse, self.client.get(f'{self.url}?expand=history')['ETag'])
+        self.assertNotEqual(plain, self.client.get(self.url, HTTP_ACCEPT='text/html')['ETag'])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=plain).status_code, 304)
+        self.assertEqual(self.client.get(f'{self.url}?fields=id,title', HTTP_IF_NONE_MATCH=plain).status_code, 200)
+        # Any representation of the current version satisfies If-Match
+        response = self.client.patch(self.url, {'title': 'Sparse edit'}, format='json', HTTP_IF_MATCH=sparse)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.patch(self.url, {'title': 'Stale edit'}, format='json', HTTP_IF_MATCH=sparse)
+        self.assertEqual(response.status_code, 412)
+
+
+class PodBulkTests(TestCase):
+    """Bulk writes batch their queries and report every item"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='bulk_owner', email='bulk_owner@thoughty.io', password='pw')
+        cls.other = User.objects.create_user(username='bulk_other', email='bulk_other@thoughty.io', password='pw')
+        cls.theirs = Pod.objects.create(user=cls.other, title='Theirs', content='Content')
+        Tag.objects.create(name='existing')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_create_in_constant_queries(self):
+        items = [{'title': f'Idea {i}', 'content': 'Content', 'tags': [{'name': f'tag-{i % 5}'}, {'name': 'existing'}]}
+                 for i in range(50)]
+        # tags in + out, pods, links, outbox events, then the pods and their tags read back
+        with self.assertNumQueries(9):
+            response = self.client.post('/api/pods/bulk/', items, format='json')
+        results = response.json()['results']
+        self.assertEqual([result['status'] for result in results], [201] * 50)
+        self.assertEqual(Pod.objects.filter(user=self.owner).count(), 50)
+        self.assertEqual(Tag.objects.filter(name='existing').get().pod_set.count(), 50)
+
+    def test_per_item_results(self):
+        mine = Pod.objects.create(user=self.owner, title='Mine', content='Content')
+        response = self.client.post('/api/pods/bulk/', [
+            {'id': mine.pk, 'stage': 'draft', 'tags': [{'name': 'fresh'}]},
+            {'id': self.theirs.pk, 'title': 'Taken over'},
+            {'title': ''},
+            {'title': 'New', 'content': 'Content'},
+        ], format='json')
+        statuses = [result['status'] for result in response.json()['results']]
+        self.assertEqual(statuses, [200, 404, 400, 201])
+
+        mine.refresh_from_db()
+        self.assertEqual((mine.stage, mine.version, mine.history.count()), ('draft', 2, 1))
+        self.assertEqual(list(mine.tags.values_list('name', flat=True)), ['fresh'])
+        self.assertEqual(Pod.objects.get(pk=self.theirs.pk).title, 'Theirs')
+
+    def test_archive_in_constant_queries(self):
+        pods = [Pod.objects.create(user=self.owner, title=f'Pod {i}', content=f'Content {i}') for i in range(20)]
+        for pod in pods[::2]:
+            record_version(pod, '0.0.0', f'Older content {pod.pk}')
+
+        def stage_all(pods):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/pods/bulk/', [{'id': pod.pk, 'stage': 'draft'} for pod in pods], format='json')
+            self.assertEqual({result['status'] for result in response.json()['results']}, {200})
+            return len(queries)
+
+        self.assertEqual(stage_all(pods[:2]), stage_all(pods[2:]))
+        for pod in pods[:3]:
+            self.assertEqual(content_at(pod, '1.0.0'), pod.content)
+        self.assertEqual(content_at(pods[2], '0.0.0'), f'Older content {pods[2].pk}')
+
+    def test_if_match_per_item(self):
+        mine  = Pod.objects.create(user=self.owner, title='Mine', content='Content')
+        other = Pod.objects.create(user=self.owner, title='Other', content='Content')
+        etag  = self.client.get(f'/api/pods/{mine.pk}/')['ETag']
+        self.client.patch(f'/api/pods/{mine.pk}/', {'title': 'Edited elsewhere'}, format='json')
+
+        results = self.client.post('/api/pods/bulk/', [
+            {'id': mine.pk, 'title': 'Stale', 'if_match': etag},
+            {'id': other.pk, 'title': 'Unconditional'},
+        ], format='json').json()['results']
+        self.assertEqual([result['status'] for result in results], [412, 200])
+        self.assertEqual(Pod.objects.get(pk=mine.pk).title, 'Edited elsewhere')
 
-# Create your tests here.
+        # The returned ETag chains into the next write
+        chained = self.client.post('/api/pods/bulk/', [
+            {'id': other.pk, 'title': 'Chained', 'if_match': results[1]['etag']},
+        ], format='json').json()['results']
+        self.assertEqual(chained[0]['status'], 200)
+        self.assertEqual(chained[0]['etag'], self.client.get(f'/api/pods/{other.pk}/')['ETag'])
@@ -0,0 +1,177 @@
+import heapq
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import Counter
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from battles.models import Battle, Vote
+from gamification.models import TokenTransaction
+from mentor.models import Insight
+from .models import PodStageHistory
+
+
+class InvalidCursor(ValueError):
+    """A timeline cursor that could not be decoded"""
+
+
+class Source:
+    """
+    One kind of timeline entry: a queryset scanned newest first by
+    (`ordering_field`, id), and how to render a row.
+    """
+
+    def __init__(self, name, queryset, ordering_field, render, type=None):
+        self.name           = name
+        self.queryset       = queryset
+        self.ordering_field = ordering_field
+        self.render         = render
+        self.type           = type or name # The entries' type; several sources may share one
+
+    def fetch(self, position, limit):
+        """Up to `limit` rows strictly older than `position` ((value, id) or None for the newest)"""
+        field    = self.ordering_field
+        queryset = self.queryset.order_by(f'-{field}', '-id')
+        if position is not None:
+            value, pk = position
+            # Inclusive bound on the leading column keeps the scan on the index (see KeysetPagination)
+            queryset = queryset.filter(**{f'{field}__lte': value}).filter(
+                Q(**{f'{field}__lt': value}) | Q(id__lt=pk)
+            )
+        return list(queryset[:limit])
+
+
+class Timeline:
+    """
+    Several sources merged into one chronological feed, newest first.
+
+    Each page asks every source for at most page_size + 1 rows after its
+    own keyset position and k-way merges them, so a page costs k small
+    index scans however long the history is; nothing is UNIONed, sorted
+    or offset across whole tables. The cursor carries each source's
+    position separately, and a source that ran dry is not queried again.
+    """
+
+    def __init__(self, sources):
+        self.sources = {source.name: source for source in sources}
+
+    def page(self, cursor=None, page_size=20):
+        """(entries, next cursor or None)"""
+        positions = self.decode_cursor(cursor) if cursor else {name: None for name in self.sources}
+
+        streams, fetched = [], {}
+        for name, position in positions.items():
+            if position is False:
+                continue # Exhausted
+            source = self.sources[name]
+            rows   = source.fetch(position, page_size + 1)
+            fetched[name] = rows
+            streams.append([(getattr(row, source.ordering_field), row.pk, name, row) for row in rows])
+
+        merged = list(heapq.merge(*streams, key=lambda item: (item[0], item[1]), reverse=True))
+        taken  = merged[:page_size]
+
+        consumed = Counter()
+        for value, pk, name, _ in taken:
+            consumed[name] += 1
+            positions[name] = (value, pk)
+        for name, rows in fetched.items():
+            # Everything this source had was used and it had no more
+            if consumed[name] == len(rows) and len(rows) <= page_size:
+                positions[name] = False
+
+        entries = [
+            {'type': self.sources[name].type, 'id': row.pk, 'at': value, **self.sources[name].render(row)}
+            for value, _, name, row in taken
+        ]
+        if all(position is False for position in positions.values()):
+            return entries, None
+        return entries, self.encode_cursor(positions)
+
+    def encode_cursor(self, positions):
+        tokens = {
+            name: (0 if position is False else None if position is None else [position[0].isoformat(), position[1]])
+            for name, position in positions.items()
+        }
+        return urlsafe_b64encode(json.dumps(tokens, separators=(',', ':')).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            tokens = json.loads(urlsafe_b64decode(cursor.encode('ascii')))
+            positions = {}
+            for name in self.sources:
+                token = tokens.get(name)
+                if token == 0:
+                    positions[name] = False
+                elif token is None:
+                    positions[name] = None
+                else:
+                    value = parse_datetime(token[0])
+                    if value is None:
+                        raise ValueError(token[0])
+                    positions[name] = (value, int(token[1]))
+            return positions
+        except (TypeError, ValueError, KeyError, IndexError, AttributeError, UnicodeError) as e:
+            raise InvalidCursor(str(e))
+
+
+def _battles(queryset):
+    return queryset.select_related('pod_a', 'pod_b').only('pod_a__title', 'pod_b__title', 'winner', 'total_votes', 'created_at')
+
+
+def _render_battle(b):
+    return {
+        'pod_a': b.pod_a_id, 'pod_b': b.pod_b_id, 'title': f"{b.pod_a.title} vs {b.pod_b.title}",
+        'winner': b.winner_id, 'total_votes': b.total_votes,
+    }
+
+
+def user_timeline(user, types=None):
+    """A user's thought progression: pod versions, battles, votes, insights and tokens"""
+    sources = [
+        Source(
+            'stage',
+            PodStageHistory.objects.filter(user=user).select_related('pod').only('pod__title', 'version', 'size', 'created_at'),
+            'created_at',
+            # Content is rebuilt on demand: /pods/<id>/versions/<version>/
+            lambda h: {'pod': h.pod_id, 'pod_title': h.pod.title, 'version': h.version, 'size': h.size},
+        ),
+        # One source per side, each an index scan on (pod_x_user, created_at, id); an OR of the two is not.
+        # A battle between two of the user's own pods comes from the first only.
+        Source(
+            'battle_a',
+            _battles(Battle.objects.filter(pod_a_user=user)),
+            'created_at',
+            _render_battle,
+            type='battle',
+        ),
+        Source(
+            'battle_b',
+            _battles(Battle.objects.filter(pod_b_user=user).exclude(pod_a_user=user)),
+            'created_at',
+            _render_battle,
+            type='battle',
+        ),
+        Source(
+            'vote',
+            Vote.objects.filter(voted_by=user).select_related('choice').only('battle', 'choice__title', 'voted_at'),
+            'voted_at',
+            lambda v: {'battle': v.battle_id, 'choice': v.choice_id, 'choice_title': v.choice.title},
+        ),
+        Source(
+            'insight',
+            Insight.objects.filter(user=user).only('pod', 'type', 'text', 'created_at'),
+            'created_at',
+            lambda i: {'pod': i.pod_id, 'insight_type': i.type, 'text': i.text},
+        ),
+        Source(
+            'tokens',
+            TokenTransaction.objects.filter(user=user).only('amount', 'reason', 'created_at'),
+            'created_at',
+            lambda t: {'amount': t.amount, 'reason': t.reason},
+        ),
+    ]
+    if types:
+        sources = [source for source in sources if source.type in types]
+    return Timeline(sources)
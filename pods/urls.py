@@ -1,10 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PodViewSet
+from .views import PodViewSet, TimelineView
 
 router = DefaultRouter()
 router.register(r'pods', PodViewSet, basename='pod')
 
 urlpatterns = [
     path('', include(router.urls)),
-]
\ No newline at end of file
+    path('timeline/', TimelineView.as_view(), name='timeline'),
+]
@@ -1,7 +1,20 @@
 from rest_framework import viewsets, permissions
-from django.db.models import Q
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+from .bulk import MAX_ITEMS, save_pods
+from .history import content_at, diff
 from .models import Pod
-from .serializers import PodSerializer
+from .serializers import PodSerializer, PodStageHistorySerializer
+from .timeline import InvalidCursor, user_timeline
+from thoughty.pagination import KeysetPagination
+from thoughty.cache import CachedResponseMixin
+from thoughty.conditional import ConditionalMixin
+from thoughty.fastpath import FastListMixin
+from thoughty.sparse import SparseQuerysetMixin
 
 # Create your views here.
 
@@ -13,18 +26,33 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         # Read: anyone if public; Write: only owner
         if request.method in permissions.SAFE_METHODS:
-            return obj.is_public or obj.user == request.user
+            return obj.is_public or obj.user_id == request.user.pk
         
-        return obj.user == request.user
+        return obj.user_id == request.user.pk
 
-class PodViewSet(viewsets.ModelViewSet):
+class PodViewSet(CachedResponseMixin, ConditionalMixin, FastListMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
     """
     ViewSet for viewing and editing Pod instances.
     Automatically handles permissions and filtering based on user authentication.
+    Tags, history and its count are only loaded when serialized (see thoughty.sparse).
+    Reads are cached per user until the pod changes (see pods.signals).
+    Reads carry ETag/Last-Modified; updates honour If-Match (see thoughty.conditional).
     """
-    queryset = Pod.objects.all().select_related('user').prefetch_related('tags', 'history')
+    queryset = Pod.objects.all()
     serializer_class = PodSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    pagination_class   = KeysetPagination
+    sparse_required    = ['user', 'is_public']
+    cache_per_user     = True
+    cache_tags         = {
+        'list': ['pods'],
+        'retrieve': ['pod:{pk}'],
+        'versions': ['pod:{pk}'],
+        'version': ['pod:{pk}'],
+        'diff': ['pod:{pk}'],
+    }
+    conditional_actions = ('list', 'retrieve', 'versions', 'version', 'diff')
+    etag_fields         = ('version', 'timestamp')
 
     def get_queryset(self):
         """
@@ -32,13 +60,70 @@ class PodViewSet(viewsets.ModelViewSet):
         - Authenticated users see all public pods and their own private pods
         - Anonymous users see only public pods
         """
-        user = self.request.user
-        qs = super().get_queryset()
+        return super().get_queryset().visible_to(self.request.user)
 
-        if user.is_authenticated:
-            return qs.filter(Q(is_public=True) | Q(user=user))
-        return qs.filter(is_public=True)
+    @action(detail=True, methods=['get'])
+    def versions(self, request, pk=None):
+        """Metadata of every archived version, oldest first"""
+        pod = self.get_object()
+        return Response(PodStageHistorySerializer(pod.history.order_by('id'), many=True).data)
+
+    @action(detail=True, methods=['get'], url_path=r'versions/(?P<version>[^/]+)')
+    def version(self, request, pk=None, version=None):
+        """The pod's content as of `version` ('current' for the live content)"""
+        pod     = self.get_object()
+        content = content_at(pod, version)
+        if content is None:
+            raise NotFound(f'No version {version} of this pod.')
+        return Response({'version': version, 'content': content})
+
+    @action(detail=True, methods=['get'])
+    def diff(self, request, pk=None):
+        """Changes between ?from=<version> and ?to=<version> (default: the current content)"""
+        pod = self.get_object()
+        from_version = request.query_params.get('from')
+        if not from_version:
+            raise ValidationError({'from': 'This parameter is required.'})
+        changes = diff(pod, from_version, request.query_params.get('to', 'current'))
+        if changes is None:
+            raise NotFound('No such version of this pod.')
+        return Response(changes)
     
     def perform_create(self, serializer):
         """User is automatically set by the serializer"""
-        serializer.save()
\ No newline at end of file
+        serializer.save()
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Create or update a list of pods at once; one result per item, in order (see pods.bulk)"""
+        if not isinstance(request.data, list):
+            raise ValidationError({'non_field_errors': ['Expected a list of pods.']})
+        if len(request.data) > MAX_ITEMS:
+            raise ValidationError({'non_field_errors': [f'At most {MAX_ITEMS} pods per request.']})
+        return Response({'results': save_pods(request.user, request.data, self.get_object_etag, self.get_serializer_context())})
+
+class TimelineView(APIView):
+    """
+    The user's thought progression, newest first: pod versions, battles of
+    their pods, votes, mentor insights and token changes in one feed.
+    ?types=stage,battle,vote,insight,tokens narrows it; follow `next` to page.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    page_size          = 20
+    max_page_size      = 100
+
+    def get(self, request):
+        types = [t for t in request.query_params.get('types', '').split(',') if t]
+        try:
+            page_size = _positive_int(request.query_params.get('page_size', self.page_size), strict=True, cutoff=self.max_page_size)
+        except ValueError:
+            page_size = self.page_size
+
+        timeline = user_timeline(request.user, types)
+        try:
+            entries, cursor = timeline.page(request.query_params.get('cursor'), page_size)
+        except InvalidCursor:
+            raise NotFound('Invalid cursor')
+
+        next_url = cursor and replace_query_param(request.build_absolute_uri(), 'cursor', cursor)
+        return Response({'next': next_url, 'results': entries})
@@ -0,0 +1,31 @@
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import models
+
+SEARCH_CONFIG = 'english'
+
+
+def search_vector_field(*weighted_columns):
+    """
+    Stored generated tsvector over `weighted_columns`, e.g. ('title', 'A'), ('content', 'B').
+    Postgres keeps it in sync on every write, so queries never re-parse text.
+    """
+    vector = None
+    for column, weight in weighted_columns:
+        part   = SearchVector(column, weight=weight, config=SEARCH_CONFIG)
+        vector = part if vector is None else vector + part
+
+    return models.GeneratedField(
+        expression=vector,
+        output_field=SearchVectorField(),
+        db_persist=True,
+        editable=False,
+    )
+
+
+class SearchVectorDeferringManager(models.Manager):
+    """
+    Leaves the `search_vector` column out of regular queries; it is only
+    needed by the search engine and would otherwise double the row payload.
+    """
+    def get_queryset(self):
+        return super().get_queryset().defer('search_vector')
@@ -0,0 +1,68 @@
+import heapq
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+
+from brainstorm.models import Prompt, Variation
+from pods.models import Pod
+from .fields import SEARCH_CONFIG
+
+
+class SearchSource:
+    """One searchable table: its visible rows and the columns returned per hit"""
+
+    def __init__(self, type, fields, get_queryset):
+        self.type         = type
+        self.fields       = fields
+        self.get_queryset = get_queryset
+
+    def search(self, query, user, limit):
+        """Top `limit` hits for `query`, best first; served by the GIN index"""
+        rows = (
+            self.get_queryset(user)
+            .filter(search_vector=query)
+            .annotate(search_rank=SearchRank(F('search_vector'), query))
+            .order_by('-search_rank', '-id')
+            .values(*self.fields, 'search_rank')[:limit]
+        )
+        return [
+            {'type': self.type, 'rank': row.pop('search_rank'), 'data': row}
+            for row in rows
+        ]
+
+
+SOURCES = {
+    'pod': SearchSource(
+        'pod',
+        ('id', 'title', 'content', 'stage', 'user_id', 'timestamp'),
+        lambda user: Pod.objects.visible_to(user),
+    ),
+    'prompt': SearchSource(
+        'prompt',
+        ('id', 'text', 'type', 'difficulty'),
+        lambda user: Prompt.objects.all(),
+    ),
+    'variation': SearchSource(
+        'variation',
+        ('id', 'text', 'prompt_id', 'created_by_ai'),
+        lambda user: Variation.objects.filter(pooled=False),
+    ),
+}
+
+
+def search(text, user, types=None, offset=0, limit=20):
+    """
+    Ranked hits across `types` (default: all sources) for the slice
+    [offset, offset + limit). Each source only ranks its own top
+    offset + limit rows, and the sorted lists are merged lazily, so the
+    cost depends on the page depth rather than on table size.
+    """
+    query   = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+    sources = [SOURCES[t] for t in (types or SOURCES)]
+    depth   = offset + limit
+
+    ranked = heapq.merge(
+        *(source.search(query, user, depth) for source in sources),
+        key=lambda hit: -hit['rank'],
+    )
+    return list(ranked)[offset:depth]
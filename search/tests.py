@@ -0,0 +1,46 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from brainstorm.models import Prompt, Variation
+from pods.models import Pod
+from users.models import User
+
+
+class SearchTests(TestCase):
+    """Ranked hits across sources, private pods for their owner only"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='search_owner', email='search_owner@thoughty.io', password='pw')
+        cls.pod    = Pod.objects.create(user=cls.owner, title='Glaciers', content='How glaciers carve valleys')
+        cls.secret = Pod.objects.create(user=cls.owner, title='Private glaciers', content='Notes', is_public=False)
+        cls.prompt = Prompt.objects.create(text='Describe a glacier to a child', type='idea')
+        Variation.objects.create(prompt=cls.prompt, text='A glacier is a slow river of ice')
+        Variation.objects.create(prompt=cls.prompt, text='Pooled glacier variation', pooled=True)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def hits(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [(hit['type'], hit['data']['id']) for hit in response.json()['results']]
+
+    def test_across_sources(self):
+        hits = self.hits('/api/search/?q=glacier')
+        self.assertEqual(sorted(type for type, _ in hits), ['pod', 'prompt', 'variation'])
+        self.assertIn(('pod', self.pod.pk), hits)
+
+        self.client.force_authenticate(self.owner)
+        self.assertIn(('pod', self.secret.pk), self.hits('/api/search/?q=glacier&type=pod'))
+
+    def test_pages(self):
+        first  = self.hits('/api/search/?q=glacier&page_size=2')
+        second = self.hits('/api/search/?q=glacier&page_size=2&page=2')
+        self.assertEqual(len(first + second), 3)
+        self.assertFalse(set(first) & set(second))
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/search/').status_code, 400)
+        self.assertEqual(self.client.get('/api/search/?q=ice&type=user').status_code, 400)
+        self.assertEqual(self.client.get('/api/search/?q=ice&page=11').status_code, 404)
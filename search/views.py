@@ -0,0 +1,74 @@
+from rest_framework import permissions
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework.views import APIView
+
+from . import services
+
+# Create your views here.
+
+class SearchView(APIView):
+    """
+    Ranked full-text search over pods, prompts and variations.
+    Query params: q (required), type (comma separated: pod, prompt, variation),
+    page and page_size. Private pods are only returned to their owner.
+    """
+    permission_classes = [permissions.AllowAny]
+    page_size     = 20
+    max_page_size = 50
+    max_page      = 10 # Ranking depth is bounded; refine the query instead of paging further
+
+    def get(self, request):
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            raise ValidationError({'q': 'A search query is required.'})
+
+        types = self.get_types(request)
+        page, page_size = self.get_page(request)
+
+        offset = (page - 1) * page_size
+        # Fetch one extra hit to learn whether another page exists
+        hits = services.search(text, request.user, types, offset=offset, limit=page_size + 1)
+
+        base_url = request.build_absolute_uri()
+        has_next = len(hits) > page_size and page < self.max_page
+        return Response({
+            'next': replace_query_param(base_url, 'page', page + 1) if has_next else None,
+            'previous': self.get_previous_link(base_url, page),
+            'results': hits[:page_size],
+        })
+
+    def get_types(self, request):
+        raw = request.query_params.get('type')
+        if not raw:
+            return None
+
+        types = [t.strip() for t in raw.split(',') if t.strip()]
+        unknown = set(types) - set(services.SOURCES)
+        if unknown:
+            raise ValidationError({'type': f"Unknown type(s): {', '.join(sorted(unknown))}"})
+        return types
+
+    def get_page(self, request):
+        try:
+            page = _positive_int(request.query_params.get('page', 1), strict=True)
+            page_size = _positive_int(
+                request.query_params.get('page_size', self.page_size),
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except ValueError:
+            raise NotFound('Invalid page.')
+
+        if page > self.max_page:
+            raise NotFound('Invalid page.')
+        return page, page_size
+
+    def get_previous_link(self, base_url, page):
+        if page <= 1:
+            return None
+        if page == 2:
+            return remove_query_param(base_url, 'page')
+        return replace_query_param(base_url, 'page', page - 1)
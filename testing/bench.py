@@ -0,0 +1,30 @@
+import os
+import sys
+import time
+import statistics
+
+# Benchmarks run against the local database directly, not the HTTP API
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def setup_django():
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'thoughty.settings')
+
+    import django
+    django.setup()
+
+def measure(fn, repeat=1000):
+    """Call fn `repeat` times; return per-call timings in microseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+def report(label, timings):
+    timings = sorted(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{label:<40} n={len(timings):<6} mean={statistics.mean(timings):>10.1f}us "
+          f"p50={statistics.median(timings):>10.1f}us p99={p99:>10.1f}us")
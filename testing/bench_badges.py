@@ -0,0 +1,101 @@
+"""
+Badge evaluation benchmark.
+
+Creates 500 badges with random conditions and 100k users with pods and
+token balances, then times the per-event evaluation that runs on pod
+creation and a full re-evaluation sweep over every user. Everything runs
+inside a transaction that is rolled back at the end.
+
+    python testing/bench_badges.py [--badges 500] [--users 100000]
+"""
+import argparse
+import random
+import time
+
+from bench import setup_django, measure, report
+
+setup_django()
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from gamification.badges import badge_engine
+from gamification.models import AchievementLog, Badge, TokenBalance
+from gamification.rules import BATTLE_WON, POD_CREATED, Rule
+from pods.models import Pod
+from users.models import User
+
+
+def random_condition():
+    terms = [
+        f'pods >= {random.randint(1, 50)}',
+        f'public_pods >= {random.randint(1, 20)}',
+        f'battles_won >= {random.randint(1, 10)}',
+        f'tokens > {random.randint(100, 5000)}',
+    ]
+    # Mostly conjunctions, so a typical user holds a handful of badges, not hundreds
+    picked = random.sample(terms, random.randint(2, 3))
+    return f' {random.choice(["and", "and", "or"])} '.join(picked)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--badges', type=int, default=500)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--evaluations', type=int, default=200)
+    args = parser.parse_args()
+
+    with transaction.atomic():
+        Badge.objects.bulk_create(
+            Badge(name=f'Bench badge {i}', description='', icon='badges/bench.png', condition_code=random_condition())
+            for i in range(args.badges)
+        )
+        users = User.objects.bulk_create(
+            (User(username=f'bench_badges_{i}', email=f'bench_badges_{i}@thoughty.io') for i in range(args.users)),
+            batch_size=5000,
+        )
+        Pod.objects.bulk_create(
+            (
+                Pod(user=user, title='Benchmark pod', content='', is_public=random.random() < 0.5)
+                for user in users for _ in range(random.randint(0, 4))
+            ),
+            batch_size=5000,
+        )
+        TokenBalance.objects.bulk_create(
+            (TokenBalance(user=user, balance=random.randint(0, 1200)) for user in users),
+            batch_size=5000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE') # Plan like a live database, not freshly bulk-loaded tables
+        print(f"{args.badges} badges, {len(users)} users, {Pod.objects.count()} pods")
+
+        sources = list(Badge.objects.values_list('condition_code', flat=True))
+        report('compile one rule', measure(lambda: Rule(random.choice(sources)), repeat=args.badges))
+
+        badge_engine.rulebook.invalidate()
+        report('cold rulebook load (all badges)', measure(lambda: badge_engine.rulebook.rules(), repeat=1))
+        print(f"rules on {POD_CREATED}: {len(badge_engine.rulebook.rules(POD_CREATED))}, "
+              f"on {BATTLE_WON}: {len(badge_engine.rulebook.rules(BATTLE_WON))}")
+
+        sample = random.sample(users, args.evaluations)
+        with CaptureQueriesContext(connection) as queries:
+            badge_engine.evaluate(sample[0], POD_CREATED)
+        print(f"queries per pod-created evaluation: {len(queries)}")
+
+        sample_iter = iter(sample)
+        report('evaluate on pod_created (awarding)', measure(lambda: badge_engine.evaluate(next(sample_iter), POD_CREATED), repeat=args.evaluations))
+        sample_iter = iter(sample)
+        report('evaluate on pod_created (nothing new)', measure(lambda: badge_engine.evaluate(next(sample_iter), POD_CREATED), repeat=args.evaluations))
+
+        AchievementLog.objects.filter(user__in=sample).delete()
+        start   = time.perf_counter()
+        awarded = badge_engine.evaluate_many([user.pk for user in users])
+        elapsed = time.perf_counter() - start
+        print(f"full sweep: {len(users)} users x {args.badges} badges in {elapsed:.1f}s, {awarded} badges awarded")
+
+        transaction.set_rollback(True)
+
+    badge_engine.rulebook.invalidate()
+
+
+if __name__ == '__main__':
+    main()
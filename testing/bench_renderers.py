@@ -0,0 +1,109 @@
+"""
+JSON rendering benchmark: DRF's stdlib JSONRenderer against
+thoughty.renderers (orjson when installed).
+
+Builds the payloads of the pod list, battle list, battle results and
+leaderboard endpoints from throwaway data, then times rendering each with
+both renderers, checks they produce the same bytes and reports the sizes.
+Also times parsing the pod list back. Everything runs inside a transaction
+that is rolled back at the end.
+
+    python testing/bench_renderers.py [--pods 1000] [--users 1000] [--repeat 200]
+"""
+import argparse
+import io
+import random
+
+from bench import setup_django, measure, report
+
+setup_django()
+
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from battles.models import Battle
+from battles.serializers import BattleSerializer
+from gamification.leaderboard import Leaderboard, LocalSortedSets
+from pods.models import Pod, Tag
+from pods.serializers import PodSerializer
+from thoughty import renderers
+from thoughty.renderers import FastJSONParser, FastJSONRenderer
+from users.models import User
+
+
+def compare(label, data, repeat):
+    stdlib, fast = JSONRenderer(), FastJSONRenderer()
+    expected, actual = stdlib.render(data), fast.render(data)
+    same = 'identical' if expected == actual else 'DIFFERENT'
+    print(f"{label}: {len(expected):,} bytes stdlib, {len(actual):,} bytes fast ({same})")
+    report(f'  {label} stdlib', measure(lambda: stdlib.render(data), repeat=repeat))
+    report(f'  {label} fast', measure(lambda: fast.render(data), repeat=repeat))
+    return expected
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pods', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    if renderers.orjson is None:
+        print("orjson is not installed: the fast renderer falls back to the stdlib and times the same")
+
+    with transaction.atomic():
+        users = User.objects.bulk_create(
+            User(username=f'bench_render_{i}', email=f'bench_render_{i}@thoughty.io') for i in range(args.users)
+        )
+        tags = Tag.objects.bulk_create(Tag(name=f'bench-render-{i}') for i in range(30))
+        pods = Pod.objects.bulk_create(
+            (Pod(user=random.choice(users), title=f'Pod {i}: “smart quotes” and émojis 🚀',
+                 content='Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 6,
+                 stage=random.choice(['idea', 'draft', 'review', 'final']))
+             for i in range(args.pods)),
+            batch_size=2000,
+        )
+        Pod.tags.through.objects.bulk_create(
+            Pod.tags.through(pod=pod, tag=tag) for pod in pods for tag in random.sample(tags, 3)
+        )
+        battles = Battle.objects.bulk_create(
+            Battle(pod_a=a, pod_b=b, pod_a_user_id=a.user_id, pod_b_user_id=b.user_id, created_by=random.choice(users),
+                   pod_a_votes=random.randint(0, 500), pod_b_votes=random.randint(0, 500), total_votes=0)
+            for a, b in zip(pods[::2], pods[1::2])
+        )
+
+        board = Leaderboard(LocalSortedSets())
+        board.rebuild()
+        for user in users:
+            board.record(user.pk, random.randint(1, 5000))
+
+        pod_list = {'next': 'http://testserver/api/pods/?cursor=djE9MjAyNg%3D%3D', 'previous': None,
+                    'results': PodSerializer(Pod.objects.filter(pk__in=[p.pk for p in pods]), many=True).data}
+        battle   = battles[0]
+        verdict  = {
+            'winner_pod': battle.pod_a_id, 'winner_title': battle.pod_a.title,
+            'reasoning': [f'Pod A received {battle.pod_a_votes} votes', f'Pod B received {battle.pod_b_votes} votes'],
+            'analysis': 'Pod A makes the sharper argument — and backs it up.',
+            'key_factors': ['Clarity', 'Originality', 'Evidence'],
+            'vote_summary': f'Pod A: {battle.pod_a_votes} votes, Pod B: {battle.pod_b_votes} votes',
+            'ai_confidence': 'high', 'ai_powered': True,
+        }
+
+        print(f"{args.pods} pods, {len(battles)} battles, {args.users} ranked users; {args.repeat} renders each")
+        encoded = compare('pod list', pod_list, max(args.repeat // 20, 5))
+        compare('pod page (20)', {**pod_list, 'results': pod_list['results'][:20]}, args.repeat)
+        compare('battle list', BattleSerializer(battles, many=True).data, max(args.repeat // 20, 5))
+        compare('battle results', battle.vote_counts(), args.repeat * 10)
+        compare('battle verdict', verdict, args.repeat * 10)
+        compare('leaderboard (top 100)', {'window': 'all', 'results': board.top('all', 100),
+                                          'me': board.rank(users[0].pk)}, args.repeat)
+
+        print(f"parse pod list: {len(encoded):,} bytes")
+        report('  pod list stdlib', measure(lambda: JSONParser().parse(io.BytesIO(encoded)), repeat=max(args.repeat // 20, 5)))
+        report('  pod list fast', measure(lambda: FastJSONParser().parse(io.BytesIO(encoded)), repeat=max(args.repeat // 20, 5)))
+
+        transaction.set_rollback(True)
+
+
+if __name__ == '__main__':
+    main()
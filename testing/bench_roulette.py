@@ -0,0 +1,66 @@
+"""
+Roulette spin benchmark for a heavy user.
+
+Creates a throwaway user with 100k RouletteSpin records over a prompt
+catalog, then times unseen-first picks with a cold and a warm seen-set.
+Everything runs inside a transaction that is rolled back at the end.
+
+    python testing/bench_roulette.py [--prompts 20000] [--spins 100000]
+"""
+import argparse
+import random
+
+from bench import setup_django, measure, report
+
+setup_django()
+
+from django.db import transaction
+from brainstorm.models import Prompt, RouletteSpin
+from brainstorm.roulette import selector
+from users.models import User
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--prompts', type=int, default=20000)
+    parser.add_argument('--spins', type=int, default=100000)
+    parser.add_argument('--picks', type=int, default=2000)
+    args = parser.parse_args()
+
+    with transaction.atomic():
+        user = User.objects.create_user(username='bench_roulette', email='bench_roulette@thoughty.io')
+
+        prompts = Prompt.objects.bulk_create(
+            Prompt(text=f'Benchmark prompt {i}', type=random.choice(['idea', 'quote', 'title']))
+            for i in range(args.prompts)
+        )
+        selector.invalidate()
+
+        # ~90% of the catalog already seen, with repeats, like a long-time user
+        seen_pool = random.sample(prompts, int(len(prompts) * 0.9))
+        RouletteSpin.objects.bulk_create(
+            (RouletteSpin(user=user, prompt=random.choice(seen_pool)) for _ in range(args.spins)),
+            batch_size=5000,
+        )
+        print(f"{len(prompts)} prompts, {args.spins} spins for one user")
+
+        selector.seen.forget(user.pk)
+        report('cold seen-set rebuild + pick', measure(lambda: selector.pick_id(user), repeat=1))
+
+        report('warm pick (unseen first)', measure(lambda: selector.pick_id(user), repeat=args.picks))
+        report('warm pick (type=idea)', measure(lambda: selector.pick_id(user, type='idea'), repeat=args.picks))
+        report('pick without user', measure(lambda: selector.pick_id(), repeat=args.picks))
+
+        seen  = selector.seen.get(user.pk)
+        fresh = sum(selector.pick_id(user) not in seen for _ in range(args.picks))
+        print(f"unseen picks: {fresh}/{args.picks}")
+
+        selector.seen.forget(user.pk)
+        transaction.set_rollback(True)
+
+    selector.invalidate()
+    selector.seen.forget(user.pk)
+
+
+if __name__ == '__main__':
+    main()
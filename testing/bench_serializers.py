@@ -0,0 +1,92 @@
+"""
+List serialization benchmark: DRF serializers against thoughty.fastpath.
+
+Creates 10k pods (with tags and history), prompts and variations, then
+times fetching and serializing a whole 10k-row page both ways, as the
+list endpoints do, and checks the two produce the same JSON. Everything
+runs inside a transaction that is rolled back at the end.
+
+    python testing/bench_serializers.py [--rows 10000] [--repeat 5]
+"""
+import argparse
+import random
+
+from bench import setup_django, measure, report
+
+setup_django()
+
+from django.db import connection, transaction
+from rest_framework.renderers import JSONRenderer
+from brainstorm.models import Prompt, Variation
+from brainstorm.serializers import PromptSerializer, VariationSerializer
+from pods.models import Pod, PodStageHistory, Tag
+from pods.serializers import PodSerializer
+from thoughty.fastpath import compile_serializer
+from thoughty.sparse import prune_queryset
+from users.models import User
+
+
+def compare(label, serializer_class, queryset, rows, repeat):
+    queryset = prune_queryset(queryset, serializer_class())
+    plan     = compile_serializer(serializer_class())
+
+    def drf():
+        return serializer_class(queryset.all(), many=True).data
+
+    def fast():
+        return plan.render(plan.rows(queryset.all()))
+
+    if JSONRenderer().render(drf()) != JSONRenderer().render(fast()):
+        raise SystemExit(f"{label}: fast path output differs")
+
+    for name, fn in (('drf', drf), ('fast', fast)):
+        timings = measure(fn, repeat=repeat)
+        report(f'{label} {name}', timings)
+        print(f"{'':<40} {rows / (sum(timings) / len(timings) / 1e6):>12,.0f} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with transaction.atomic():
+        user = User.objects.create_user(username='bench_serializers', email='bench_serializers@thoughty.io')
+        tags = Tag.objects.bulk_create(Tag(name=f'bench-tag-{i}') for i in range(50))
+
+        pods = Pod.objects.bulk_create(
+            (Pod(user=user, title=f'Benchmark pod {i}', content='Lorem ipsum dolor sit amet. ' * 10,
+                 stage=random.choice(['idea', 'draft', 'review', 'final']))
+             for i in range(args.rows)),
+            batch_size=2000,
+        )
+        Pod.tags.through.objects.bulk_create(
+            (Pod.tags.through(pod=pod, tag=tag) for pod in pods for tag in random.sample(tags, 3)),
+            batch_size=5000,
+        )
+        PodStageHistory.objects.bulk_create(
+            (PodStageHistory(pod=pod, user_id=pod.user_id, version='1.0.0', is_keyframe=True, data=b'', size=0) for pod in pods[::2]),
+            batch_size=5000,
+        )
+        prompts = Prompt.objects.bulk_create(
+            (Prompt(text=f'Benchmark prompt {i}', type=random.choice(['idea', 'quote', 'title'])) for i in range(args.rows)),
+            batch_size=2000,
+        )
+        Variation.objects.bulk_create(
+            (Variation(prompt=random.choice(prompts), text=f'Benchmark variation {i}') for i in range(args.rows)),
+            batch_size=2000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE') # Plan like a live database, not freshly bulk-loaded tables
+        print(f"{args.rows} rows per page, {args.repeat} runs each")
+
+        compare('pods', PodSerializer, Pod.objects.filter(user=user), args.rows, args.repeat)
+        compare('prompts', PromptSerializer, Prompt.objects.filter(pk__in=[p.pk for p in prompts]), args.rows, args.repeat)
+        compare('variations', VariationSerializer, Variation.objects.filter(text__startswith='Benchmark variation'), args.rows, args.repeat)
+
+        transaction.set_rollback(True)
+
+
+if __name__ == '__main__':
+    main()
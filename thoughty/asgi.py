@@ -3,6 +3,15 @@ ASGI config for thoughty project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Streaming endpoints (e.g. the SSE variation stream) are async views; serve
+them through ASGI so an open stream does not tie up a sync worker:
+
+    uvicorn thoughty.asgi:application --workers 4
+
+WebSocket connections go to the real-time gateway (thoughty.gateway);
+everything else goes to Django. With more than one worker set
+REALTIME_BACKEND=redis so a message reaches clients on every worker.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -13,4 +22,12 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'thoughty.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from thoughty.gateway import websocket_application  # noqa: E402 (needs Django set up)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        return await websocket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
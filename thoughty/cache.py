@@ -0,0 +1,354 @@
+"""
+Tiered caching with tag-based invalidation.
+
+Two tiers: a per-process LRU (CACHE_LOCAL_SIZE entries) answers repeats
+without a network round trip, in front of the shared Django cache
+(CACHES['default']: Redis, or local memory for tests and development).
+
+Every entry carries dependency tags such as ``pod:42``, ``user:7:pods``
+or ``battle:3``. Each tag has a version in the shared cache; an entry
+records the versions it was computed under and is stale as soon as any
+of them moves. ``invalidate(*tags)`` (usually from model signals, after
+commit) bumps the versions, so every process and both tiers see it
+without finding or deleting entries. Versions are read before a value is
+computed, so a value computed from data that changed meanwhile is stored
+already stale. A local entry is served without rereading its tag versions
+for CACHE_LOCAL_TTL seconds: invalidations in the same process drop it at
+once, others within that window.
+
+    pods = namespace('pods')
+    data = pods.get_or_set(key, compute, tags=[f'pod:{pk}'])
+
+    @cached('battle-results', tags=lambda battle_id: [f'battle:{battle_id}'])
+    def results(battle_id): ...
+
+Views adopt it with CachedResponseMixin. Hits and misses are counted per
+namespace (see stats()).
+"""
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import permissions
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+MISSING = object()
+
+STATS_OUTCOMES = ('local_hits', 'shared_hits', 'misses')
+STATS_FLUSH    = 10 # Seconds between adding a process's counts to the shared totals
+
+
+def tag_key(tag):
+    return f'cache:tag:{tag}'
+
+
+def tag_versions(tags):
+    """{tag: current version}; a tag seen for the first time gets a fresh version"""
+    if not tags:
+        return {}
+    keys     = {tag: tag_key(tag) for tag in tags}
+    found    = cache.get_many(keys.values())
+    versions = {tag: found.get(key) for tag, key in keys.items()}
+    for tag, version in versions.items():
+        if version is None:
+            # Never reuse an old version: an entry stored under it would come back to life
+            cache.add(keys[tag], time.time_ns(), None)
+            versions[tag] = cache.get(keys[tag])
+    return versions
+
+
+def invalidate(*tags):
+    """Make every entry tagged with any of `tags` stale, in every process"""
+    if not tags:
+        return
+    version = time.time_ns()
+    cache.set_many({tag_key(tag): version for tag in tags}, None)
+    _local.drop_tags(tags)
+
+
+def invalidate_on_commit(*tags):
+    """invalidate() once the current transaction commits (at once outside one)"""
+    transaction.on_commit(lambda: invalidate(*tags))
+
+
+class LocalLRU:
+    """The per-process tier: (namespace, key) -> (versions, value, checked_at), indexed by tag"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._by_tag  = defaultdict(set)
+        self._lock    = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, versions, value):
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (versions, value, time.monotonic())
+            for tag in versions:
+                self._by_tag[tag].add(key)
+            while len(self._entries) > settings.CACHE_LOCAL_SIZE:
+                self._discard(next(iter(self._entries)))
+
+    def checked(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], entry[1], time.monotonic())
+
+    def delete(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def drop_tags(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._by_tag.get(tag, ())):
+                    self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_tag.clear()
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[0]:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+
+_local = LocalLRU()
+
+
+class Namespace:
+    """
+    One kind of cached data, with its own default TTL and hit/miss counts.
+    Get instances through namespace().
+    """
+
+    def __init__(self, name, ttl=None):
+        self.name     = name
+        self.ttl      = ttl
+        self._counts  = dict.fromkeys(STATS_OUTCOMES, 0)
+        self._flushed = time.monotonic()
+        self._lock    = threading.Lock()
+
+    def key(self, key):
+        return f'cache:{self.name}:' + hashlib.sha1(str(key).encode()).hexdigest()
+
+    def get_or_set(self, key, compute, tags=(), ttl=None):
+        """The cached value for `key`, or compute() stored under `tags`"""
+        value, versions = self.lookup(key, tags)
+        if value is not MISSING:
+            return value
+        value = compute()
+        self.set(key, value, tags, ttl, versions)
+        return value
+
+    def get(self, key, tags=(), default=None):
+        value, _ = self.lookup(key, tags)
+        return default if value is MISSING else value
+
+    def set(self, key, value, tags=(), ttl=None, versions=None):
+        """Store `value`; pass the `versions` read before computing it, or the current ones are used"""
+        if versions is None:
+            versions = tag_versions(tags)
+        ttl = ttl or self.ttl or settings.CACHE_TTL
+        cache.set(self.key(key), (versions, value), ttl)
+        _local.set((self.name, key), versions, value)
+
+    def delete(self, key):
+        cache.delete(self.key(key))
+        _local.delete((self.name, key))
+
+    def stats(self):
+        counts = {outcome: cache.get(self._stats_key(outcome), 0) + self._counts[outcome] for outcome in STATS_OUTCOMES}
+        requests = sum(counts.values())
+        hits     = counts['local_hits'] + counts['shared_hits']
+        return {**counts, 'requests': requests, 'hit_rate': round(hits / requests, 4) if requests else None}
+
+    def lookup(self, key, tags):
+        """
+        (value or MISSING, the tag versions it was checked against): on a
+        miss, pass those versions to set() with the value computed next.
+        """
+        local = _local.get((self.name, key))
+        if local is not None:
+            stored, value, checked_at = local
+            if time.monotonic() - checked_at < settings.CACHE_LOCAL_TTL:
+                self._record('local_hits')
+                return value, stored
+            versions = tag_versions(tags)
+            if versions == stored:
+                _local.checked((self.name, key))
+                self._record('local_hits')
+                return value, versions
+            _local.delete((self.name, key))
+        else:
+            versions = None
+
+        shared_key = self.key(key)
+        if versions is None and tags:
+            # The entry and its tags' versions in one round trip
+            found    = cache.get_many([shared_key, *(tag_key(tag) for tag in tags)])
+            entry    = found.get(shared_key)
+            versions = {tag: found.get(tag_key(tag)) for tag in tags}
+            if None in versions.values():
+                versions = tag_versions(tags)
+        else:
+            entry    = cache.get(shared_key)
+            versions = versions if versions is not None else {}
+
+        if entry is not None and entry[0] == versions:
+            _local.set((self.name, key), versions, entry[1])
+            self._record('shared_hits')
+            return entry[1], versions
+        self._record('misses')
+        return MISSING, versions
+
+    def _record(self, outcome):
+        with self._lock:
+            self._counts[outcome] += 1
+            if time.monotonic() - self._flushed < STATS_FLUSH:
+                return
+            counts, self._counts = self._counts, dict.fromkeys(STATS_OUTCOMES, 0)
+            self._flushed = time.monotonic()
+        for outcome, count in counts.items():
+            if count:
+                key = self._stats_key(outcome)
+                cache.add(key, 0, None)
+                try:
+                    cache.incr(key, count)
+                except ValueError:
+                    cache.set(key, count, None)
+
+    def _stats_key(self, outcome):
+        return f'cache:stats:{self.name}:{outcome}'
+
+
+_namespaces = {}
+_namespaces_lock = threading.Lock()
+
+
+def namespace(name, ttl=None):
+    """The Namespace called `name`, created on first use"""
+    with _namespaces_lock:
+        if name not in _namespaces:
+            _namespaces[name] = Namespace(name, ttl)
+        return _namespaces[name]
+
+
+def stats():
+    """Hits and misses per namespace, all processes' flushed counts plus this one's pending ones"""
+    with _namespaces_lock:
+        namespaces = list(_namespaces.values())
+    return {ns.name: ns.stats() for ns in sorted(namespaces, key=lambda ns: ns.name)}
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def stats_view(request):
+    """Cache hits and misses per namespace (staff only)."""
+    return Response(stats())
+
+
+def cached(name, key=None, tags=None, ttl=None):
+    """
+    Decorator caching a function's results in namespace `name`. `key` and
+    `tags` are functions of the same arguments; the default key is the
+    arguments themselves.
+    """
+    def decorator(fn):
+        ns = namespace(name, ttl)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            entry_key  = key(*args, **kwargs) if key else repr((args, sorted(kwargs.items())))
+            entry_tags = tags(*args, **kwargs) if tags else ()
+            return ns.get_or_set(entry_key, lambda: fn(*args, **kwargs), entry_tags)
+
+        wrapper.namespace = ns
+        return wrapper
+    return decorator
+
+
+class CachedResponseMixin:
+    """
+    View mixin caching successful GET responses.
+
+    `cache_tags` maps the cached actions (viewset actions, or 'get' on a
+    plain APIView) to their tags, format strings over the URL kwargs and
+    `user` (the requesting user's id): {'retrieve': ['pod:{pk}']}.
+    Authentication and permissions run as usual; only the handler is
+    skipped on a hit. Responses are keyed on the action, URL kwargs, query
+    string and renderer, and also on the user when `cache_per_user` is set, which
+    any view whose output depends on who asks must do.
+    """
+    cache_tags      = {}
+    cache_per_user  = False
+    cache_namespace = None # Default: the view class name
+    cache_ttl       = None
+    cache_headers   = ('ETag', 'Last-Modified') # Stored and restored with the data
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        action = getattr(self, 'action', None) or request.method.lower()
+        if request.method in ('GET', 'HEAD') and action in self.cache_tags:
+            # The handler is looked up after initial(): put the caching one in its place
+            handler = getattr(self, request.method.lower())
+            setattr(self, request.method.lower(), functools.partial(self._cached_response, action, handler))
+
+    def get_cache_tags(self, action):
+        user = self.request.user.pk if self.request.user.is_authenticated else None
+        return [tag.format(user=user, **self.kwargs) for tag in self.cache_tags[action]]
+
+    def get_cache_key(self, action):
+        request = self.request
+        parts   = [
+            action, sorted(self.kwargs.items()), sorted(request.query_params.lists()), request.build_absolute_uri('/'),
+            request.accepted_renderer.format, # The restored validators are per renderer (see thoughty.conditional)
+        ]
+        if self.cache_per_user:
+            parts.append(request.user.pk if request.user.is_authenticated else None)
+        return repr(parts)
+
+    def _cached_response(self, action, handler, request, *args, **kwargs):
+        ns       = namespace(self.cache_namespace or type(self).__name__, self.cache_ttl)
+        key      = self.get_cache_key(action)
+        tags     = self.get_cache_tags(action)
+        value, versions = ns.lookup(key, tags)
+        if value is not MISSING:
+            data, headers = value
+            return Response(data, headers=headers)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200 and isinstance(response, Response):
+            headers = {name: response[name] for name in self.cache_headers if response.has_header(name)}
+            ns.set(key, (_detach(response.data), headers), tags, versions=versions)
+        return response
+
+
+def _detach(data):
+    # serializer.data keeps its serializer (and every instance) alive; the local tier shouldn't
+    if isinstance(data, list):
+        return list(data)
+    if isinstance(data, dict):
+        return {key: list(value) if isinstance(value, list) else value for key, value in data.items()}
+    return data
@@ -0,0 +1,226 @@
+"""
+Conditional requests: ETag and Last-Modified validators, 304 Not
+Modified and If-Match preconditions for viewsets.
+
+Validators are computed from the database, never from a rendered body:
+
+- detail: the object's `etag_fields` (e.g. version and timestamp), one
+  single-row query; a strong ETag, so it also serves If-Match. Other
+  representations of the same version (?fields=, ?expand=, another
+  renderer) get a suffixed tag of their own, "<version>-<representation>";
+  If-Match accepts any of them, since it asks about the version;
+- list: the keys and timestamps of the page's rows (and of the row after
+  it) for a paginator with `page_keys` (KeysetPagination), otherwise
+  count and max(timestamp) of everything the list is drawn from; one
+  query either way. A weak ETag, scoped to the requesting user, the
+  query string (cursor, page_size, fields, expand ...) and the renderer,
+  sent with Vary: Authorization.
+
+Any insert, update or delete changes one of them, as long as every
+change to what an endpoint shows moves the model's auto_now timestamp.
+
+    GET  /api/pods/42/                 -> ETag: "9c1e..."
+    GET  /api/pods/42/  If-None-Match  -> 304, nothing serialized
+    PATCH /api/pods/42/ If-Match       -> 412 if the pod changed meanwhile
+
+When the validators match, the handler (and the response cache in front
+of it, see thoughty.cache) is skipped entirely. Updates with If-Match
+lock the row, so two clients editing the same version cannot both win.
+"""
+import functools
+import hashlib
+import re
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+REPRESENTATION = re.compile(r'-[0-9a-f]+"$') # The suffix of a non-default representation's ETag
+
+
+class PreconditionFailed(APIException):
+    status_code    = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The resource has changed since it was fetched; reload it and try again.'
+    default_code   = 'precondition_failed'
+
+
+def make_etag(parts, weak=False, representation=None):
+    tag = hashlib.sha1(repr(parts).encode()).hexdigest()
+    if representation:
+        tag += '-' + hashlib.sha1(repr(representation).encode()).hexdigest()[:16]
+    return ('W/"%s"' if weak else '"%s"') % tag
+
+
+def etag_matches(if_match, etag):
+    """
+    Whether the If-Match value `if_match` holds for the object whose
+    (default representation) ETag is `etag`; any representation of the
+    same version does.
+    """
+    return any(tag == '*' or REPRESENTATION.sub('"', tag) == etag for tag in parse_etags(if_match))
+
+
+class ConditionalMixin:
+    """
+    ViewSet mixin adding validators to the `conditional_actions` and
+    honouring If-None-Match / If-Modified-Since on them, and If-Match /
+    If-Unmodified-Since on updates and deletes.
+
+    `etag_fields` identify a version of one object; `last_modified_field`
+    is the auto_now timestamp that moves on every change. Detail actions
+    must look the object up by the viewset's lookup kwarg.
+    """
+    conditional_actions = ('list', 'retrieve')
+    etag_fields         = ('timestamp',)
+    last_modified_field = 'timestamp'
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in SAFE_METHODS and self._has_preconditions(request):
+            # The row lock taken with the check lasts until the write commits
+            with transaction.atomic():
+                return super().dispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD') and self.action in self.conditional_actions:
+            handler = getattr(self, request.method.lower())
+            setattr(self, request.method.lower(), functools.partial(self._conditional_response, handler))
+
+    def get_validators(self):
+        """(etag, last modified datetime) of what this request would return, or (None, None)"""
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None).order_by()
+        if self.detail:
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            row = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]}).values_list(
+                'pk', *self.etag_fields, self.last_modified_field
+            ).first()
+            if row is None:
+                return None, None # Let the handler answer 404
+            return make_etag((queryset.model._meta.label, *row[:-1]), representation=self._representation()), row[-1]
+
+        user  = self.request.user.pk if self.request.user.is_authenticated else None
+        scope = (queryset.model._meta.label, user, *self._representation(default=None))
+        page_keys = getattr(self.paginator, 'page_keys', None)
+        if page_keys is not None:
+            # Only the page (and whether one follows): the same index range scan the page itself is
+            rows = page_keys(queryset, self.request, (self.last_modified_field,))
+            last = max((row[-1] for row in rows), default=None)
+            return make_etag((*scope, rows), weak=True), last
+
+        # Just the keys: the serializer's annotations (e.g. correlated subqueries) aren't evaluated
+        totals = queryset.values('pk').aggregate(count=Count('pk'), last=Max(self.last_modified_field))
+        return make_etag((*scope, totals['count'], totals['last']), weak=True), totals['last']
+
+    def _representation(self, default=()):
+        """
+        (query, renderer format) of this request: each page, field set and
+        format is a representation of its own. `default` for a plain request
+        in the first renderer's format.
+        """
+        # The query string is canonical: parameter order doesn't matter
+        query  = sorted((name, sorted(values)) for name, values in self.request.query_params.lists())
+        renderer = self.request.accepted_renderer.format
+        if default is not None and not query and renderer == self.renderer_classes[0].format:
+            return default
+        return query, renderer
+
+    def get_object_etag(self, obj):
+        return make_etag((obj._meta.label, obj.pk, *(getattr(obj, name) for name in self.etag_fields)))
+
+    def get_object(self):
+        obj = super().get_object()
+        if self.request.method not in SAFE_METHODS:
+            self.check_preconditions(obj)
+        return obj
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method not in SAFE_METHODS and self._has_preconditions(self.request):
+            # Hold the row from the If-Match check until the write commits (see dispatch)
+            queryset = queryset.select_for_update()
+        return queryset
+
+    def check_preconditions(self, obj):
+        """Raise PreconditionFailed if If-Match / If-Unmodified-Since don't hold for `obj`"""
+        if_match = self.request.META.get('HTTP_IF_MATCH')
+        if if_match is not None:
+            # If-Unmodified-Since is ignored alongside it (RFC 9110, 13.2.2)
+            if not etag_matches(if_match, self.get_object_etag(obj)):
+                raise PreconditionFailed()
+            return
+        response = get_conditional_response(
+            self.request._request,
+            etag=self.get_object_etag(obj),
+            last_modified=self._timestamp(getattr(obj, self.last_modified_field)),
+        )
+        if response is not None and response.status_code == status.HTTP_412_PRECONDITION_FAILED:
+            raise PreconditionFailed()
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        # The new validators, so the client can chain its next If-Match
+        self.headers.update(self._validator_headers(
+            self.get_object_etag(serializer.instance), getattr(serializer.instance, self.last_modified_field),
+        ))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method in ('GET', 'HEAD') and response.get('ETag', '').startswith('W/'):
+            # List validators are per user
+            patch_vary_headers(response, ('Authorization',))
+        if request.method in ('GET', 'HEAD') and response.status_code == status.HTTP_200_OK and response.has_header('ETag'):
+            # Validators restored with a cached response are checked here
+            conditional = get_conditional_response(
+                request._request, etag=response['ETag'],
+                last_modified=parse_http_date_safe(response.get('Last-Modified', '')), response=response,
+            )
+            if conditional is not response:
+                return self._not_modified(response, conditional.status_code)
+        return response
+
+    def _conditional_response(self, handler, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+        if etag is None:
+            return handler(request, *args, **kwargs)
+        headers     = self._validator_headers(etag, last_modified)
+        conditional = get_conditional_response(request._request, etag=etag, last_modified=self._timestamp(last_modified))
+        if conditional is not None:
+            return Response(status=conditional.status_code, headers=headers)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            for name, value in headers.items():
+                response[name] = value
+        return response
+
+    @staticmethod
+    def _has_preconditions(request):
+        return 'HTTP_IF_MATCH' in request.META or 'HTTP_IF_UNMODIFIED_SINCE' in request.META
+
+    @staticmethod
+    def _validator_headers(etag, last_modified):
+        headers = {'ETag': etag}
+        if last_modified is not None:
+            headers['Last-Modified'] = http_date(last_modified.timestamp())
+        return headers
+
+    @staticmethod
+    def _timestamp(value):
+        # HTTP dates have whole seconds
+        return int(value.timestamp()) if value is not None else None
+
+    @staticmethod
+    def _not_modified(response, status_code):
+        not_modified = Response(status=status_code, headers={
+            name: response[name] for name in ('ETag', 'Last-Modified', 'Cache-Control', 'Vary') if response.has_header(name)
+        })
+        not_modified.accepted_renderer     = response.accepted_renderer
+        not_modified.accepted_media_type   = response.accepted_media_type
+        not_modified.renderer_context      = response.renderer_context
+        return not_modified
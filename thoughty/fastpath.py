@@ -0,0 +1,252 @@
+"""
+Fast read path for list endpoints.
+
+A ModelSerializer builds a model instance per row and walks every field
+through get_attribute() and to_representation() with their checks. For
+plain columns all of that is known ahead of time, so compile_serializer()
+turns a (pruned, see thoughty.sparse) serializer into a RowPlan:
+
+- the columns to fetch with values_list(), nested objects as joins;
+- a generated function building each row's dict straight from the tuple.
+  Values whose representation is the database value itself (strings,
+  integers, booleans) are copied; anything else goes through the field's
+  own to_representation(), so the JSON is byte-identical;
+- one query per nested many-valued field (tags), the one prefetch_related
+  would run.
+
+A serializer with a field the plan can't reproduce exactly (a method
+field not listed in ``Meta.value_columns``, a property, a custom
+relation) compiles to None and the view uses the serializer as usual.
+
+Plans are cached per serializer class and field set, in a bounded LRU
+(?fields= lets clients ask for any subset). A plan holds no serializer
+instance: conversions use unbound copies of the fields.
+"""
+import copy
+import threading
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+from rest_framework.response import Response
+
+# (serializer field class, model field classes) whose representation is the column value itself
+IDENTITY = [
+    (serializers.CharField, (models.CharField, models.TextField)),
+    (serializers.IntegerField, (models.IntegerField, models.AutoField)),
+    (serializers.BooleanField, (models.BooleanField,)),
+]
+
+# Column fields whose representation depends on the request (absolute file URLs)
+CONTEXTUAL = (serializers.FileField,)
+
+PLAN_CACHE_SIZE = 256 # Plans kept per process
+
+
+class Unsupported(Exception):
+    """A serializer field the fast path can't reproduce"""
+
+
+class _Columns:
+    """The values_list() columns of one query, each fetched once"""
+
+    def __init__(self):
+        self.names = []
+        self.index = {}
+
+    def __call__(self, name):
+        if name not in self.index:
+            self.index[name] = len(self.names)
+            self.names.append(name)
+        return self.index[name]
+
+
+class _Many:
+    """A nested many-valued field: its rows are fetched per page and grouped by owner"""
+
+    def __init__(self, model, lookup, columns, owner, row):
+        self.model   = model
+        self.lookup  = lookup
+        self.columns = columns
+        self.owner   = owner
+        self.row     = row
+
+    def fetch(self, pks):
+        groups = {}
+        queryset = self.model._default_manager.filter(**{f'{self.lookup}__in': pks}).values_list(*self.columns)
+        for r in queryset:
+            groups.setdefault(r[self.owner], []).append(self.row(r, ()))
+        return groups
+
+
+class _Compiler:
+    def __init__(self):
+        self.columns   = _Columns()
+        self.namespace = {}
+        self.many      = []
+
+    def bind(self, value):
+        name = f'_{len(self.namespace)}'
+        self.namespace[name] = value
+        return name
+
+    def build(self, expression):
+        namespace = dict(self.namespace)
+        exec(compile(f'def row(r, many):\n    return {expression}\n', '<fastpath>', 'exec'), namespace)
+        return namespace['row']
+
+    def serializer(self, serializer, model, prefix=''):
+        """Source of a dict expression reproducing `serializer` from a row `r`"""
+        value_columns = getattr(getattr(serializer, 'Meta', None), 'value_columns', {})
+        items = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in value_columns and not prefix:
+                items.append(f'{name!r}: r[{self.columns(value_columns[name])}]')
+                continue
+            if field.source == '*':
+                raise Unsupported(name)
+            items.append(f'{name!r}: {self.field(field, model, field.source_attrs, prefix)}')
+        return '{' + ', '.join(items) + '}'
+
+    def field(self, field, model, attrs, prefix):
+        try:
+            model_field = model._meta.get_field(attrs[0])
+        except FieldDoesNotExist:
+            raise Unsupported(field.source) # A property or method
+        path = prefix + attrs[0]
+
+        if not model_field.is_relation:
+            if len(attrs) > 1:
+                raise Unsupported(field.source)
+            return self.value(field, model_field, path)
+        if model_field.many_to_many or model_field.one_to_many:
+            if prefix or len(attrs) > 1 or not isinstance(field, serializers.ListSerializer):
+                raise Unsupported(field.source)
+            return self.nested_many(field.child, model_field)
+        if model_field.auto_created:
+            raise Unsupported(field.source) # Reverse one-to-one
+
+        fk = self.columns(path)
+        if isinstance(field, serializers.BaseSerializer) and len(attrs) == 1:
+            expression = self.serializer(field, model_field.related_model, f'{path}__')
+        elif type(field) is serializers.PrimaryKeyRelatedField and field.pk_field is None and len(attrs) == 1:
+            return f'r[{fk}]'
+        elif len(attrs) > 1 and not model_field.null:
+            # A dotted source such as 'user.username'; a null hop would skip the field in DRF
+            expression = self.field(field, model_field.related_model, attrs[1:], f'{path}__')
+        else:
+            raise Unsupported(field.source)
+        return f'(None if r[{fk}] is None else {expression})'
+
+    def value(self, field, model_field, path):
+        if not path.count('__') and model_field.primary_key:
+            path = 'pk'
+        i = self.columns(path)
+        if any(type(field) is drf and isinstance(model_field, django) for drf, django in IDENTITY):
+            return f'r[{i}]'
+        if isinstance(field, CONTEXTUAL):
+            raise Unsupported(field.source)
+        # A fresh, unbound copy (same class and arguments): the live field pins its serializer and request
+        convert = self.bind(copy.deepcopy(field).to_representation)
+        if model_field.null or '__' in path:
+            # Columns of a joined row are NULL when the join found nothing
+            return f'(None if r[{i}] is None else {convert}(r[{i}]))'
+        return f'{convert}(r[{i}])'
+
+    def nested_many(self, child, model_field):
+        if model_field.many_to_many and not model_field.auto_created:
+            lookup = model_field.related_query_name() # Forward many-to-many
+        elif model_field.one_to_many:
+            lookup = model_field.field.name # Reverse foreign key
+        else:
+            raise Unsupported(model_field.name)
+
+        nested     = _Compiler()
+        expression = nested.serializer(child, model_field.related_model)
+        if nested.many:
+            raise Unsupported(model_field.name)
+        owner = nested.columns(lookup)
+        self.many.append(_Many(model_field.related_model, lookup, nested.columns.names, owner, nested.build(expression)))
+        return f'(many[{len(self.many) - 1}].get(r[{self.columns("pk")}]) or [])'
+
+
+class RowPlan:
+    """How to fetch and represent a serializer's rows; see compile_serializer()"""
+
+    def __init__(self, columns, row, many):
+        self.columns = columns
+        self.row     = row
+        self.many    = many
+
+    def rows(self, queryset, extra=()):
+        """
+        `queryset` as named values_list() rows, with `extra` columns
+        (e.g. a paginator's ordering field) after the plan's own.
+        """
+        names = self.columns + [name for name in extra if name not in self.columns]
+        return queryset.prefetch_related(None).values_list(*names, named=True)
+
+    def render(self, rows):
+        """The serialized representation of `rows` (from rows())"""
+        rows = list(rows)
+        many = ()
+        if self.many and rows:
+            pks  = [r[0] for r in rows]
+            many = tuple(field.fetch(pks) for field in self.many)
+        row = self.row
+        return [row(r, many) for r in rows]
+
+
+_plans      = OrderedDict()
+_plans_lock = threading.Lock()
+
+
+def compile_serializer(serializer):
+    """RowPlan reproducing `serializer`'s fields, or None if any can't be reproduced exactly"""
+    key = (type(serializer), tuple(serializer.fields))
+    with _plans_lock:
+        if key in _plans:
+            _plans.move_to_end(key)
+            return _plans[key]
+
+    plan = _compile(serializer)
+    with _plans_lock:
+        _plans[key] = plan
+        while len(_plans) > PLAN_CACHE_SIZE:
+            _plans.popitem(last=False)
+    return plan
+
+
+def _compile(serializer):
+    compiler = _Compiler()
+    compiler.columns('pk') # Always first: rows are grouped and paginated by it
+    try:
+        expression = compiler.serializer(serializer, serializer.Meta.model)
+    except Unsupported:
+        return None
+    return RowPlan(compiler.columns.names, compiler.build(expression), compiler.many)
+
+
+class FastListMixin:
+    """
+    Generic view mixin: list() through compile_serializer() when the
+    serializer allows it, and the regular serializer path otherwise.
+    Works with any paginator that reads attributes of page rows
+    (values_list() rows carry `pk` and the ordering field).
+    """
+    fast_list = True
+
+    def list(self, request, *args, **kwargs):
+        plan = compile_serializer(self.get_serializer()) if self.fast_list else None
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        ordering = getattr(self.pagination_class, 'ordering_field', None)
+        queryset = plan.rows(self.filter_queryset(self.get_queryset()), [ordering] if ordering else [])
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(plan.render(page))
+        return Response(plan.render(queryset))
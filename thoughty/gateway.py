@@ -0,0 +1,152 @@
+"""
+Real-time gateway: pushes hub messages (see thoughty.realtime) to clients.
+
+Two transports carry the same messages, each a JSON object with a "type":
+``votes`` (live tallies, coalesced), ``closed`` (winner decided) and
+``notification``. Every connection receives its user's notifications and
+the battles it asks for.
+
+WebSocket, routed by thoughty.asgi::
+
+    ws://host/ws/?token=<access token>&battles=1,2
+    -> {"subscribe": [3]}  /  {"unsubscribe": [1]}
+
+Server-Sent Events, for clients that only listen::
+
+    GET /api/realtime/?battles=1,2   (Authorization header or ?token=)
+"""
+import asyncio
+import json
+import logging
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework.exceptions import AuthenticationFailed
+
+from .realtime import battle_channel, hub, user_channel
+
+logger = logging.getLogger(__name__)
+
+WEBSOCKET_PATH = '/ws/'
+MAX_BATTLES    = 50 # Battle channels one connection may follow
+KEEPALIVE      = 15 # Seconds of silence before an SSE comment keeps proxies from closing the stream
+
+
+async def authenticate_token(raw_token):
+    """The user an access token belongs to, or None"""
+    if not raw_token:
+        return None
+    auth = JWTAuthentication()
+    try:
+        token = auth.get_validated_token(raw_token)
+        user  = await sync_to_async(auth.get_user)(token)
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+    return user if user.is_active else None
+
+
+def battle_ids(values):
+    """Battle ids from a comma-separated string or a list, invalid ones skipped"""
+    if isinstance(values, str):
+        values = values.split(',')
+    if not isinstance(values, list):
+        return []
+    ids = []
+    for value in values:
+        try:
+            ids.append(int(value))
+        except (TypeError, ValueError):
+            continue
+    return ids[:MAX_BATTLES]
+
+
+async def websocket_application(scope, receive, send):
+    """Raw ASGI WebSocket endpoint; one subscription per connection"""
+    event = await receive()
+    if event['type'] != 'websocket.connect':
+        return
+
+    if scope['path'] != WEBSOCKET_PATH:
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+
+    query = parse_qs(scope.get('query_string', b'').decode())
+    user  = await authenticate_token(query.get('token', [None])[0])
+    if user is None:
+        await send({'type': 'websocket.close', 'code': 4401})
+        return
+
+    await send({'type': 'websocket.accept'})
+    subscription = hub.subscribe(
+        user_channel(user.pk),
+        *(battle_channel(pk) for pk in battle_ids(query.get('battles', [''])[0])),
+    )
+
+    async def forward():
+        while True:
+            _, text = await subscription.get()
+            await send({'type': 'websocket.send', 'text': text})
+
+    forwarder = asyncio.create_task(forward())
+    try:
+        while True:
+            event = await receive()
+            if event['type'] == 'websocket.disconnect':
+                break
+            if event['type'] == 'websocket.receive':
+                _handle_command(subscription, event.get('text'))
+    finally:
+        forwarder.cancel()
+        subscription.close()
+
+
+def _handle_command(subscription, text):
+    try:
+        command = json.loads(text or '')
+    except ValueError:
+        return
+    if not isinstance(command, dict):
+        return
+    if 'subscribe' in command:
+        following = sum(1 for channel in subscription.channels if channel.startswith('battle.'))
+        ids = battle_ids(command['subscribe'])[:max(MAX_BATTLES - following, 0)]
+        subscription.subscribe(*(battle_channel(pk) for pk in ids))
+    if 'unsubscribe' in command:
+        subscription.unsubscribe(*(battle_channel(pk) for pk in battle_ids(command['unsubscribe'])))
+
+
+@require_GET
+async def event_stream(request):
+    """The gateway over Server-Sent Events; see the module docstring"""
+    raw_token = request.GET.get('token')
+    if raw_token is None:
+        header    = JWTAuthentication().get_header(request)
+        raw_token = header and JWTAuthentication().get_raw_token(header)
+    user = await authenticate_token(raw_token)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    channels = [user_channel(user.pk), *(battle_channel(pk) for pk in battle_ids(request.GET.get('battles', '')))]
+    response = StreamingHttpResponse(_events(channels), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no' # Don't let a proxy hold events back
+    return response
+
+
+async def _events(channels):
+    subscription = hub.subscribe(*channels)
+    try:
+        yield ': connected\n\n'
+        while True:
+            try:
+                event, text = await asyncio.wait_for(subscription.get(), KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield f"event: {event}\ndata: {text}\n\n"
+    finally:
+        subscription.close()
@@ -0,0 +1,329 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import httpx
+from django.conf import settings
+from django.core.cache import cache
+from groq import (
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    AsyncGroq,
+    DefaultAsyncHttpxClient,
+    DefaultHttpxClient,
+    Groq,
+    InternalServerError,
+    RateLimitError,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "llama-3.3-70b-versatile"
+
+# Transport failures and provider overload are worth another attempt;
+# anything else (bad request, auth) will fail the same way again.
+RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError)
+
+
+class LLMUnavailable(Exception):
+    """The provider could not produce a completion within the call's budget"""
+
+
+class CircuitOpen(LLMUnavailable):
+    """The provider has been failing; calls are short-circuited until it recovers"""
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds, then lets a single trial call through
+    (half-open). A success closes it again; a failure re-opens it.
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30.0):
+        self.threshold     = threshold
+        self.reset_timeout = reset_timeout
+        self.failures      = 0
+        self.opened_at     = None
+        self.half_open     = False
+        self._lock         = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.half_open or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.half_open = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures  = 0
+            self.opened_at = None
+            self.half_open = False
+
+    def release(self):
+        """The call ended without a verdict (e.g. it was cancelled): let the next one be the trial"""
+        with self._lock:
+            self.half_open = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.half_open or self.failures >= self.threshold:
+                if self.opened_at is None or self.half_open:
+                    logger.warning(f"LLM circuit opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+                self.half_open = False
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+
+class ResponseCache:
+    """
+    Completion contents keyed by a hash of the model, messages and sampling
+    parameters. A small in-process LRU answers repeats without leaving the
+    process; the shared Django cache lets other workers reuse them.
+    """
+
+    def __init__(self, max_entries=1024, ttl=60 * 60 * 24):
+        self.max_entries = max_entries
+        self.ttl         = ttl
+        self._entries    = OrderedDict()
+        self._lock       = threading.Lock()
+
+    def key(self, model, messages, params):
+        payload = json.dumps([model, messages, params], sort_keys=True, default=str)
+        return 'llm:' + hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+
+        value = cache.get(key)
+        if value is not None:
+            self._remember(key, value)
+        return value
+
+    def set(self, key, value):
+        self._remember(key, value)
+        cache.set(key, value, self.ttl)
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class LLMGateway:
+    """
+    Process-wide entry point for chat completions.
+
+    Holds one Groq client over a keep-alive connection pool, bounds every
+    call by a total deadline, retries transient failures with jittered
+    exponential backoff inside that deadline, and trips a circuit breaker
+    when the provider keeps failing so callers can fall back immediately.
+    """
+
+    def __init__(self, api_key=None, deadline=20.0, attempt_timeout=10.0, max_retries=2,
+                 backoff_base=0.25, backoff_cap=2.0, breaker=None, pool_size=20, response_cache=None):
+        self.api_key         = api_key
+        self.deadline        = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_retries     = max_retries
+        self.backoff_base    = backoff_base
+        self.backoff_cap     = backoff_cap
+        self.breaker         = breaker or CircuitBreaker()
+        self.cache           = response_cache or ResponseCache()
+        self.limits          = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=60.0,
+        )
+
+        # Retries are ours (deadline-aware), not the SDK's
+        self.client = Groq(
+            api_key=api_key or '',
+            http_client=DefaultHttpxClient(limits=self.limits),
+            max_retries=0,
+            timeout=attempt_timeout,
+        )
+        # Async connections belong to the event loop that opened them
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def complete(self, messages, model=DEFAULT_MODEL, deadline=None, cache=False, **params):
+        """
+        Run a chat completion and return the message content.
+        With cache=True an identical earlier request is answered from the
+        response cache without spending tokens.
+        Raises CircuitOpen while the breaker is open and LLMUnavailable when
+        the deadline or retry budget runs out.
+        """
+        if cache:
+            key = self.cache.key(model, messages, params)
+            content = self.cache.get(key)
+            if content is not None:
+                return content
+
+        response = self._call(model=model, messages=messages, deadline=deadline, **params)
+        content  = response.choices[0].message.content
+
+        if cache and content:
+            self.cache.set(key, content)
+        return content
+
+    async def astream(self, messages, model=DEFAULT_MODEL, deadline=None, **params):
+        """
+        Stream a chat completion, yielding content deltas as they arrive.
+
+        The whole stream is bounded by the deadline. There are no retries:
+        once tokens have reached the caller a retry would repeat them.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpen("LLM provider circuit is open")
+
+        budget = deadline if deadline is not None else self.deadline
+        client = self._get_async_client()
+        try:
+            # asyncio.wait_for per step rather than asyncio.timeout, which needs Python 3.11
+            loop   = asyncio.get_running_loop()
+            ends   = loop.time() + budget
+            stream = await asyncio.wait_for(
+                client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    stream=True,
+                    timeout=self.attempt_timeout,
+                    **params
+                ),
+                budget,
+            )
+            chunks = stream.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), max(ends - loop.time(), 0))
+                except StopAsyncIteration:
+                    break
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield delta
+        except asyncio.TimeoutError as e:
+            self.breaker.record_failure()
+            raise LLMUnavailable(f"LLM stream exceeded its {budget}s deadline") from e
+        except RETRYABLE_ERRORS as e:
+            self.breaker.record_failure()
+            raise LLMUnavailable(f"LLM stream failed: {e}") from e
+        except (APIStatusError, GeneratorExit):
+            # Provider answered (or the consumer went away): it is up
+            self.breaker.record_success()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled (client gone, or a caller's wait_for): a half-open trial must not stay taken
+            self.breaker.release()
+            raise
+        else:
+            self.breaker.record_success()
+
+    def _get_async_client(self):
+        loop   = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = AsyncGroq(
+                api_key=self.api_key or '',
+                http_client=DefaultAsyncHttpxClient(limits=self.limits),
+                max_retries=0,
+                timeout=self.attempt_timeout,
+            )
+            self._async_clients[loop] = client
+        return client
+
+    def _call(self, deadline=None, **params):
+        if not self.breaker.allow():
+            raise CircuitOpen("LLM provider circuit is open")
+
+        budget  = deadline if deadline is not None else self.deadline
+        expires = time.monotonic() + budget
+        attempt = 0
+
+        while True:
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                self.breaker.record_failure()
+                raise LLMUnavailable(f"LLM deadline of {budget}s exceeded")
+
+            try:
+                response = self.client.chat.completions.create(
+                    timeout=min(self.attempt_timeout, remaining),
+                    **params
+                )
+            except RETRYABLE_ERRORS as e:
+                attempt += 1
+                delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+                if attempt > self.max_retries or time.monotonic() + delay >= expires:
+                    self.breaker.record_failure()
+                    raise LLMUnavailable(f"LLM call failed after {attempt} attempt(s): {e}") from e
+                logger.info(f"LLM attempt {attempt} failed ({type(e).__name__}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+            except APIStatusError:
+                # The provider is up and answered; the request itself was rejected
+                self.breaker.record_success()
+                raise
+            except Exception:
+                self.breaker.record_failure()
+                raise
+            except BaseException:
+                self.breaker.release() # Interrupted, as astream() when cancelled
+                raise
+
+            self.breaker.record_success()
+            return response
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """The shared LLMGateway for this process, built from settings on first use"""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway(
+                    api_key=getattr(settings, 'GROQ_API_KEY', os.environ.get('GROQ_API_KEY')),
+                    deadline=settings.LLM_DEADLINE,
+                    attempt_timeout=settings.LLM_ATTEMPT_TIMEOUT,
+                    max_retries=settings.LLM_MAX_RETRIES,
+                    breaker=CircuitBreaker(
+                        threshold=settings.LLM_BREAKER_THRESHOLD,
+                        reset_timeout=settings.LLM_BREAKER_RESET,
+                    ),
+                    response_cache=ResponseCache(
+                        max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+                        ttl=settings.LLM_CACHE_TTL,
+                    ),
+                )
+    return _gateway
@@ -0,0 +1,153 @@
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class Cursor:
+    """Position of a keyset page: the (ordering value, id) pair and scan direction"""
+
+    def __init__(self, value, pk, reverse=False):
+        self.value   = value
+        self.pk      = pk
+        self.reverse = reverse
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination over a ``(ordering_field, id)`` pair, newest first.
+
+    Instead of OFFSET, each page filters on the key of the last row seen, so
+    page 1000 costs the same index range scan as page 1. Only the sliced page
+    is evaluated, which also keeps ``prefetch_related`` lookups to one page.
+    """
+    ordering_field        = 'timestamp'
+    page_size             = 20
+    max_page_size         = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param    = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request   = request
+        self.base_url  = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.cursor    = self.decode_cursor(request)
+
+        reverse  = self.cursor is not None and self.cursor.reverse
+        queryset = self.bound(queryset, self.cursor)
+        results  = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_previous = has_more
+            self.has_next     = True
+        else:
+            self.has_previous = self.cursor is not None
+            self.has_next     = has_more
+
+        return self.page
+
+    def bound(self, queryset, cursor):
+        """`queryset` ordered and filtered to the rows from `cursor` on"""
+        reverse = cursor is not None and cursor.reverse
+        field   = self.ordering_field
+
+        if reverse:
+            queryset = queryset.order_by(field, 'id')
+        else:
+            queryset = queryset.order_by(f'-{field}', '-id')
+
+        if cursor is not None:
+            op = 'gt' if reverse else 'lt'
+            # The inclusive bound on the leading column keeps the predicate
+            # sargable; the OR only breaks ties inside a single timestamp.
+            queryset = queryset.filter(**{f'{field}__{op}e': cursor.value}).filter(
+                Q(**{f'{field}__{op}': cursor.value}) | Q(**{f'id__{op}': cursor.pk})
+            )
+        return queryset
+
+    def page_keys(self, queryset, request, fields=()):
+        """
+        (pk, ordering value, *fields) of the rows the page for `request`
+        holds, plus the one after it (whether there is a next page): the
+        same index range scan, without loading the rows.
+        """
+        rows = self.bound(queryset, self.decode_cursor(request)).values_list('pk', self.ordering_field, *fields)
+        return list(rows[:self.get_page_size(request) + 1])
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        last = self.page[-1]
+        return self.encode_cursor(Cursor(getattr(last, self.ordering_field), last.pk))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        first = self.page[0]
+        return self.encode_cursor(Cursor(getattr(first, self.ordering_field), first.pk, reverse=True))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens  = parse.parse_qs(querystring, keep_blank_values=True)
+            value   = parse_datetime(tokens['v'][0])
+            pk      = int(tokens['i'][0])
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+        except (TypeError, ValueError, KeyError, IndexError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(value, pk, reverse)
+
+    def encode_cursor(self, cursor):
+        tokens = {'v': cursor.value.isoformat(), 'i': cursor.pk}
+        if cursor.reverse:
+            tokens['r'] = '1'
+
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
@@ -0,0 +1,249 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 100 # Messages buffered per connection; a slower client loses the oldest
+
+
+def battle_channel(battle_id):
+    return f'battle.{battle_id}'
+
+
+def user_channel(user_id):
+    return f'user.{user_id}'
+
+
+class LocalBroker:
+    """Delivers within this process only: enough for one worker or development"""
+
+    def __init__(self):
+        self._listener = None
+
+    def listen(self, callback):
+        self._listener = callback
+
+    def publish(self, channel, envelope):
+        if self._listener is not None:
+            self._listener(channel, envelope)
+
+
+class RedisBroker:
+    """
+    Redis pub/sub shared by every process. Each process holds one
+    subscriber connection and fans messages out to its own clients.
+    """
+    prefix = 'realtime:'
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def listen(self, callback):
+        def handle(message):
+            try:
+                callback(message['channel'].decode()[len(self.prefix):], json.loads(message['data']))
+            except Exception:
+                logger.exception("Dropped a malformed realtime message")
+
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(**{f'{self.prefix}*': handle})
+        self._thread = pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def publish(self, channel, envelope):
+        self.client.publish(f'{self.prefix}{channel}', json.dumps(envelope, cls=JSONEncoder))
+
+
+class Subscription:
+    """One client's channels and its queue of (event type, JSON text) messages"""
+
+    def __init__(self, hub, loop):
+        self.hub      = hub
+        self.loop     = loop
+        self.channels = set()
+        self.queue    = asyncio.Queue(QUEUE_SIZE)
+        self.dropped  = 0
+
+    def subscribe(self, *channels):
+        self.hub._add(self, channels)
+
+    def unsubscribe(self, *channels):
+        self.hub._remove(self, channels)
+
+    def close(self):
+        self.hub._remove(self, list(self.channels))
+
+    def put(self, item):
+        # Runs on the subscriber's loop
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(item)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class _Throttle:
+    __slots__ = ('sent_at', 'seq', 'pending', 'timer')
+
+    def __init__(self):
+        self.sent_at = 0.0
+        self.seq     = None
+        self.pending = None
+        self.timer   = None
+
+
+class Hub:
+    """
+    Pub/sub between the code that changes things and connected clients.
+
+    `publish()` can be called from any thread (typically in on_commit) and
+    goes through the broker, so every process sees it; each process then
+    fans it out to its local subscriptions, encoding the message once.
+
+    Coalesced messages (vote tallies, rolling notifications) are throttled
+    per channel and coalescing key to REALTIME_VOTE_RATE per second: the
+    first one goes out at once, the rest of the interval collapses into a
+    single trailing message carrying the latest state. A `seq` (e.g. the
+    vote total) drops messages that arrive after a newer one.
+    """
+
+    def __init__(self, broker=None, rate=None):
+        self._broker        = broker
+        self._rate          = rate
+        self._lock          = threading.Lock()
+        self._subscriptions = defaultdict(set)  # channel -> {Subscription}
+        self._throttles     = defaultdict(dict) # channel -> {coalescing key: _Throttle}
+
+    @property
+    def broker(self):
+        if self._broker is None:
+            with self._lock:
+                if self._broker is None:
+                    if settings.REALTIME_BACKEND == 'redis':
+                        broker = RedisBroker(settings.REALTIME_REDIS_URL)
+                    else:
+                        broker = LocalBroker()
+                    broker.listen(self._deliver)
+                    self._broker = broker
+        return self._broker
+
+    @property
+    def interval(self):
+        return 1 / (self._rate or settings.REALTIME_VOTE_RATE)
+
+    def publish(self, channel, message, coalesce=False, seq=None):
+        """
+        Send `message` to the channel's subscribers on every process.
+        `coalesce` is True, or a key when one channel carries several
+        independently coalesced streams.
+        """
+        try:
+            self.broker.publish(channel, {'message': message, 'coalesce': coalesce, 'seq': seq})
+        except Exception:
+            # Best effort: clients fall back to polling, the change itself is committed
+            logger.exception(f"Could not publish to {channel}")
+
+    def subscribe(self, *channels):
+        """A new subscription bound to the running event loop"""
+        self.broker # Start listening before the first message can be missed
+        subscription = Subscription(self, asyncio.get_running_loop())
+        subscription.subscribe(*channels)
+        return subscription
+
+    def _add(self, subscription, channels):
+        with self._lock:
+            for channel in channels:
+                self._subscriptions[channel].add(subscription)
+                subscription.channels.add(channel)
+
+    def _remove(self, subscription, channels):
+        with self._lock:
+            for channel in channels:
+                subscription.channels.discard(channel)
+                subscribers = self._subscriptions.get(channel)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[channel]
+                    for throttle in self._throttles.pop(channel, {}).values():
+                        if throttle.timer is not None:
+                            throttle.timer.cancel()
+
+    def _deliver(self, channel, envelope):
+        if channel not in self._subscriptions:
+            return # Nobody here is listening
+        key = envelope.get('coalesce')
+        if key:
+            self._coalesce(channel, key, envelope['message'], envelope.get('seq'))
+        else:
+            # Anything held back goes first, so clients see messages in order
+            for key in list(self._throttles.get(channel, ())):
+                self._flush(channel, key, cancel=True)
+            self._fan_out(channel, envelope['message'])
+
+    def _coalesce(self, channel, key, message, seq):
+        with self._lock:
+            throttles = self._throttles[channel]
+            throttle  = throttles.get(key)
+            if throttle is None:
+                self._prune(throttles)
+                throttle = throttles[key] = _Throttle()
+            if seq is not None:
+                if throttle.seq is not None and seq <= throttle.seq:
+                    return
+                throttle.seq = seq
+
+            if throttle.timer is not None:
+                throttle.pending = message # Replaces whatever was waiting
+                return
+            wait = throttle.sent_at + self.interval - time.monotonic()
+            if wait > 0:
+                throttle.pending = message
+                throttle.timer   = threading.Timer(wait, self._flush, (channel, key))
+                throttle.timer.daemon = True
+                throttle.timer.start()
+                return
+            throttle.sent_at = time.monotonic()
+        self._fan_out(channel, message)
+
+    def _prune(self, throttles):
+        # Forget keys that are idle past their interval, or a long-lived channel collects one per key forever
+        idle = time.monotonic() - self.interval
+        for key in [key for key, t in throttles.items() if t.timer is None and t.sent_at < idle]:
+            del throttles[key]
+
+    def _flush(self, channel, key, cancel=False):
+        with self._lock:
+            throttle = self._throttles.get(channel, {}).get(key)
+            if throttle is None or throttle.pending is None:
+                return
+            if cancel and throttle.timer is not None:
+                throttle.timer.cancel()
+            message, throttle.pending, throttle.timer = throttle.pending, None, None
+            throttle.sent_at = time.monotonic()
+        self._fan_out(channel, message)
+
+    def _fan_out(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscriptions.get(channel, ()))
+        if not subscribers:
+            return
+        item = (message.get('type', 'message'), json.dumps(message, cls=JSONEncoder))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, item)
+            except RuntimeError:
+                subscription.close() # Its event loop is gone
+
+
+hub = Hub()
@@ -36,6 +36,16 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    # orjson when installed, stdlib json otherwise (see thoughty.renderers)
+    'DEFAULT_RENDERER_CLASSES': (
+        'thoughty.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'thoughty.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
 DJOSER = {
@@ -63,6 +73,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     #3rd party
     'rest_framework',
@@ -79,6 +90,8 @@ INSTALLED_APPS = [
     'mentor',
     'gamification',
     'notifications',
+    'search',
+    'outbox',
 ]
 
 MIDDLEWARE = [
@@ -187,6 +200,64 @@ CSRF_COOKIE_SAMESITE = 'Lax'
 # AI Integration Settings
 GROQ_API_KEY = os.environ.get('GROQ_API_KEY', '')  # Set via environment variable
 
+# Shared LLM gateway (thoughty/llm.py): seconds, attempts and breaker thresholds
+LLM_DEADLINE          = float(os.environ.get('LLM_DEADLINE', 20))  # Total budget per call, retries included
+LLM_ATTEMPT_TIMEOUT   = float(os.environ.get('LLM_ATTEMPT_TIMEOUT', 10))
+LLM_MAX_RETRIES       = int(os.environ.get('LLM_MAX_RETRIES', 2))
+LLM_BREAKER_THRESHOLD = int(os.environ.get('LLM_BREAKER_THRESHOLD', 5))  # Consecutive failures before opening
+LLM_BREAKER_RESET     = float(os.environ.get('LLM_BREAKER_RESET', 30))  # Seconds before a trial call
+LLM_CACHE_TTL         = int(os.environ.get('LLM_CACHE_TTL', 60 * 60 * 24))  # Identical requests reuse the answer
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_MAX_ENTRIES', 1024))  # Per-process LRU size
+
+
+# Pre-generated AI variations kept ready per prompt (brainstorm/pool.py)
+VARIATION_POOL_SIZE      = int(os.environ.get('VARIATION_POOL_SIZE', 5))
+VARIATION_POOL_LOW_WATER = int(os.environ.get('VARIATION_POOL_LOW_WATER', 2))
+
+# Background tasks (thoughty/tasks.py): 'local' thread pool or 'celery'
+TASK_BACKEND       = os.environ.get('TASK_BACKEND', 'local')
+LOCAL_TASK_WORKERS = int(os.environ.get('LOCAL_TASK_WORKERS', 4))
+
+# Event outbox (outbox/events.py): events per dispatch transaction, deliveries before giving up,
+# days a dispatched event is kept (for inspection and redelivery) before it is purged
+OUTBOX_BATCH_SIZE     = int(os.environ.get('OUTBOX_BATCH_SIZE', 100))
+OUTBOX_MAX_ATTEMPTS   = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 10))
+OUTBOX_RETENTION_DAYS = int(os.environ.get('OUTBOX_RETENTION_DAYS', 7))
+
+# Token leaderboard (gamification/leaderboard.py): 'redis' sorted sets shared by all
+# processes, or 'local' in-process sets for tests and single-process development
+LEADERBOARD_BACKEND   = os.environ.get('LEADERBOARD_BACKEND', 'local')
+LEADERBOARD_REDIS_URL = os.environ.get('LEADERBOARD_REDIS_URL', 'redis://localhost:6379/0')
+
+# Real-time push (thoughty/realtime.py): 'redis' pub/sub shared by all processes, or
+# 'local' delivery inside one process; live vote tallies sent per battle per second
+REALTIME_BACKEND   = os.environ.get('REALTIME_BACKEND', 'local')
+REALTIME_REDIS_URL = os.environ.get('REALTIME_REDIS_URL', 'redis://localhost:6379/1')
+REALTIME_VOTE_RATE = float(os.environ.get('REALTIME_VOTE_RATE', 2))
+
+# Tiered cache (thoughty/cache.py): a per-process LRU in front of the shared cache, which is
+# 'redis' shared by all processes or 'local' memory for tests and single-process development
+CACHE_BACKEND    = os.environ.get('CACHE_BACKEND', 'local')
+CACHE_REDIS_URL  = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/2')
+CACHE_TTL        = int(os.environ.get('CACHE_TTL', 300))  # Default entry lifetime, seconds
+CACHE_LOCAL_SIZE = int(os.environ.get('CACHE_LOCAL_SIZE', 1000))  # Entries per process
+CACHE_LOCAL_TTL  = float(os.environ.get('CACHE_LOCAL_TTL', 5))  # Seconds a local entry is trusted before rechecking its tags
+
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+    }
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -0,0 +1,171 @@
+"""
+Sparse fieldsets: ?fields= and ?expand= on read endpoints.
+
+    GET /api/pods/?fields=id,title,stage
+    GET /api/pods/42/?expand=history
+
+``fields`` keeps only the named fields (an expandable field is included
+when named), ``expand`` adds fields a serializer leaves out by default.
+Writes always validate and answer with the default representation.
+
+SparseFieldsMixin prunes the serializer; SparseQuerysetMixin builds the
+view's queryset from the fields that are left, so a field that is not
+sent is not joined, prefetched, annotated or even selected.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def requested(request, param):
+    """Names listed in a comma-separated query parameter, or None if it is absent or empty"""
+    if request is None:
+        return None
+    names = {name.strip() for name in request.query_params.get(param, '').split(',')}
+    return (names - {''}) or None
+
+
+def expanded(request):
+    """Names listed in the request's ?expand= parameter"""
+    return requested(request, 'expand') or set()
+
+
+class Load:
+    """
+    What a serializer field reads beyond its own source: `only` columns,
+    `select` (select_related) and `prefetch` (prefetch_related) lookups,
+    and `annotate`, a function of the queryset returning it annotated.
+    Paths are relative to the serializer's model.
+    """
+
+    def __init__(self, only=(), select=(), prefetch=(), annotate=None):
+        self.only     = tuple(only)
+        self.select   = tuple(select)
+        self.prefetch = tuple(prefetch)
+        self.annotate = annotate
+
+
+class SparseFieldsMixin:
+    """
+    ModelSerializer mixin honouring ?fields= and ?expand=.
+
+    ``Meta.expandable_fields``: fields left out unless expanded.
+    ``Meta.loads``: {field name: Load} for fields whose needs can't be
+    read off their source (method fields, properties, annotations).
+    Only the top-level serializer (or a list's child) is pruned.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request    = self.context.get('request')
+        expand     = expanded(request)
+        expandable = getattr(self.Meta, 'expandable_fields', ())
+        wanted     = None
+        if request is not None and request.method in SAFE_METHODS:
+            wanted = requested(request, 'fields')
+
+        for name in list(self.fields):
+            if wanted is not None:
+                keep = name in wanted
+            else:
+                keep = name not in expandable or name in expand
+            if not keep:
+                self.fields.pop(name)
+
+
+class _Plan:
+    def __init__(self):
+        self.only      = set()
+        self.select    = set()
+        self.prefetch  = set()
+        self.annotate  = []
+        self.complete  = True # False: some field reads columns we can't name, so load them all
+
+    def add(self, serializer, model, prefix=''):
+        loads = getattr(getattr(serializer, 'Meta', None), 'loads', {})
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            load = loads.get(name)
+            if load is not None:
+                self.only.update(prefix + path for path in load.only)
+                self.select.update(prefix + path for path in load.select)
+                self.prefetch.update(prefix + path for path in load.prefetch)
+                if load.annotate is not None:
+                    self.annotate.append(load.annotate)
+                continue
+            if field.source == '*':
+                self.complete = False
+                continue
+            self.add_source(field, model, field.source_attrs, prefix)
+
+    def add_source(self, field, model, attrs, prefix):
+        try:
+            model_field = model._meta.get_field(attrs[0])
+        except FieldDoesNotExist:
+            self.complete = False # A property or method
+            return
+        path = prefix + attrs[0]
+
+        if not model_field.is_relation:
+            self.only.add(path)
+        elif model_field.many_to_many or model_field.one_to_many:
+            self.prefetch.add(path)
+        elif isinstance(field, serializers.BaseSerializer):
+            # A nested object: join it and select what its own fields read
+            self.only.add(path)
+            self.select.add(path)
+            self.add(field, model_field.related_model, f'{path}__')
+        elif len(attrs) > 1:
+            # A dotted source such as 'user.username'
+            self.only.add(path)
+            self.select.add(path)
+            self.add_source(field, model_field.related_model, attrs[1:], f'{path}__')
+        else:
+            self.only.add(path) # The foreign key column, serialized as a pk
+
+    def apply(self, queryset, required=(), columns=True):
+        if self.select:
+            queryset = queryset.select_related(*sorted(self.select))
+        if self.prefetch:
+            queryset = queryset.prefetch_related(*sorted(self.prefetch))
+        for annotate in self.annotate:
+            queryset = annotate(queryset)
+        if columns and self.complete:
+            queryset = queryset.only(queryset.model._meta.pk.name, *sorted(self.only | set(required)))
+        return queryset
+
+
+def prune_queryset(queryset, serializer, required=(), columns=True):
+    """
+    `queryset` loading what `serializer`'s fields read: their relations
+    joined or prefetched, their annotations, and (with `columns`) only
+    their columns plus `required`.
+    """
+    plan = _Plan()
+    plan.add(serializer, queryset.model)
+    return plan.apply(queryset, required, columns)
+
+
+class SparseQuerysetMixin:
+    """
+    Generic view mixin: the queryset loads only what the (pruned)
+    serializer will read. The view's own queryset should filter, not
+    select_related or prefetch_related; that is derived here.
+
+    `sparse_required`: columns the view itself reads (permissions and
+    the like); the paginator's ordering field is added automatically.
+    Columns are only narrowed on reads, so saves see whole rows.
+    """
+    sparse_required = ()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        required = set(self.sparse_required)
+        ordering = getattr(self.pagination_class, 'ordering_field', None)
+        if ordering:
+            required.add(ordering)
+        return prune_queryset(
+            queryset, self.get_serializer(), required,
+            columns=self.request.method in SAFE_METHODS,
+        )
@@ -0,0 +1,58 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.LOCAL_TASK_WORKERS,
+                    thread_name_prefix='thoughty-task',
+                )
+    return _executor
+
+
+def _run_local(task, args):
+    close_old_connections()
+    try:
+        task(*args)
+    except Exception:
+        logger.exception(f"Local task {task.name} failed")
+    finally:
+        # Worker threads keep their own connections; don't leak them
+        connections.close_all()
+
+
+def enqueue(task, *args, countdown=None):
+    """
+    Run a Celery `shared_task` in the background once the current
+    transaction commits, or `countdown` seconds after that.
+
+    TASK_BACKEND = 'celery' hands it to the broker with `.apply_async()`;
+    'local' (the default) runs it on an in-process thread pool so no
+    broker is needed in development. Local delayed tasks wait on a timer
+    and are lost if the process exits first.
+    """
+    if settings.TASK_BACKEND == 'celery':
+        transaction.on_commit(lambda: task.apply_async(args, countdown=countdown))
+    elif countdown:
+        transaction.on_commit(lambda: _start_timer(countdown, task, args))
+    else:
+        transaction.on_commit(lambda: _get_executor().submit(_run_local, task, args))
+
+
+def _start_timer(countdown, task, args):
+    timer = threading.Timer(countdown, lambda: _get_executor().submit(_run_local, task, args))
+    timer.daemon = True
+    timer.start()
@@ -17,6 +17,9 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from .cache import stats_view as cache_stats
+from .gateway import event_stream
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('djoser.urls')),
@@ -26,4 +29,9 @@ urlpatterns = [
     path('api/', include('pods.urls')),
     path('api/', include('battles.urls')),
     path('api/brainstorm/', include('brainstorm.urls')),
+    path('api/search/', include('search.urls')),
+    path('api/gamification/', include('gamification.urls')),
+    path('api/', include('notifications.urls')),
+    path('api/realtime/', event_stream, name='realtime-stream'),
+    path('api/cache/stats/', cache_stats, name='cache-stats'),
 ] 